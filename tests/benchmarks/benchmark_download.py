@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  benchmark_download.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Benchmark the throughput of 'tuf.download.safe_download()' and
+  'unsafe_download()', so that the download path can be tuned without real
+  mirrors.  Files of every size of '--sizes' are downloaded with every chunk
+  size of '--chunk-sizes' (see 'tuf.conf.CHUNK_SIZE') from an HTTP server of
+  this process, which generates their bytes rather than reading them from
+  disk, so files of several gigabytes need no space but that of the
+  downloaded copy.  The server may add '--latency' seconds before every
+  response, and limit its '--bandwidth'.
+
+  Every download is compared with a 'raw' download of the same file: the same
+  reads of CHUNK_SIZE bytes into a 'tuf.util.TempFile', from the plain socket
+  file object of urllib2, so that the 'overhead' of SaferSocketFileObject,
+  and of the checks of the download functions, is the ratio of their
+  durations, minus one.
+
+  For every size, chunk size and method, the results have the durations of
+  the '--repeat' downloads, the median throughput in MB/s (2**20 bytes per
+  second), and the median processor time per MB.  The processor time is that
+  of the whole process, and so includes the server's; it is the same for all
+  the methods.  A download that fails, e.g., with tuf.SlowRetrievalError
+  because of a low '--bandwidth', has its 'error' instead; raw downloads are
+  not protected against slow retrieval, and take as long as the server does.
+
+<Usage>
+  $ python benchmark_download.py --sizes 1K,1M,1G --chunk-sizes 8K,64K \
+      --bandwidth 10M --latency 0.05 --output results.json
+
+"""
+
+import BaseHTTPServer
+import logging
+import optparse
+import os
+import time
+import urllib2
+
+import tuf
+import tuf.conf
+import tuf.download
+import tuf.log
+import tuf.util
+
+import benchmark_tools
+
+# The size of the blocks of data written by the server.
+BLOCK_SIZE = 65536
+
+# The multipliers of the suffixes of sizes.
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+
+
+
+
+
+class _SyntheticFileHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Serve '/<length>' as a file of 'length' bytes, after the 'latency' of
+  the server, and at most at its 'bandwidth' in bytes per second, if any."""
+
+  def do_GET(self):
+    try:
+      length = int(self.path.strip('/'))
+    except ValueError:
+      self.send_error(404)
+      return
+
+    if self.server.latency:
+      time.sleep(self.server.latency)
+
+    self.send_response(200)
+    self.send_header('Content-Length', str(length))
+    self.end_headers()
+
+    # Write small enough blocks that a limited bandwidth is kept smoothly.
+    block = self.server.block
+    if self.server.bandwidth:
+      block = block[:max(self.server.bandwidth // 20, 1)]
+
+    sent_length = 0
+    start_time = time.time()
+    while sent_length < length:
+      data = block[:length-sent_length]
+      self.wfile.write(data)
+      sent_length += len(data)
+      if self.server.bandwidth:
+        delay = sent_length / float(self.server.bandwidth) - \
+                (time.time() - start_time)
+        if delay > 0:
+          time.sleep(delay)
+
+  def log_message(self, format, *args):
+    pass
+
+
+
+
+
+def raw_download(url, required_length):
+  """
+  <Purpose>
+    Download 'url' as tuf.download does, but from the plain socket file object
+    of urllib2, without the checks of SaferSocketFileObject and of the
+    download functions.
+
+  <Arguments>
+    url:
+      The URL of the file.
+
+    required_length:
+      The number of bytes to download.
+
+  <Exceptions>
+    Any error of urllib2.
+
+  <Side Effects>
+    A temporary file is created.
+
+  <Returns>
+    A 'tuf.util.TempFile' of the downloaded bytes.
+
+  """
+
+  connection = urllib2.urlopen(url, timeout=tuf.conf.SOCKET_TIMEOUT)
+  temp_file = tuf.util.TempFile()
+  try:
+    total_downloaded = 0
+    while total_downloaded < required_length:
+      data = connection.read(min(tuf.conf.CHUNK_SIZE,
+                                 required_length-total_downloaded))
+      if not data:
+        break
+      temp_file.write(data, auto_flush=False)
+      total_downloaded += len(data)
+    temp_file.flush(fsync=tuf.conf.FSYNC_DOWNLOADS)
+
+  except:
+    temp_file.close_temp_file()
+    raise
+
+  finally:
+    connection.close()
+
+  return temp_file
+
+
+
+
+
+DOWNLOAD_METHODS = {'raw': raw_download,
+                    'safe': tuf.download.safe_download,
+                    'unsafe': tuf.download.unsafe_download}
+
+
+
+
+
+def parse_size(size):
+  """
+  Return the number of bytes of 'size', an integer with an optional 'K', 'M'
+  or 'G' suffix (e.g., '64K').  Raise ValueError if 'size' is invalid.
+  """
+
+  size = size.strip().upper()
+  multiplier = SIZE_SUFFIXES.get(size[-1:], 1)
+  if size[-1:] in SIZE_SUFFIXES:
+    size = size[:-1]
+  return int(float(size) * multiplier)
+
+
+
+
+
+def time_download(method, url, length):
+  """
+  <Purpose>
+    Download 'url' with 'method', and measure how long it takes, in wall and
+    processor seconds.
+
+  <Arguments>
+    method:
+      A function of DOWNLOAD_METHODS.
+
+    url:
+      The URL of the file.
+
+    length:
+      The length of the file.
+
+  <Exceptions>
+    Any error of 'method'.
+
+  <Side Effects>
+    The file is downloaded to a temporary file, which is closed.
+
+  <Returns>
+    A (seconds, processor seconds) tuple.
+
+  """
+
+  start_time = time.time()
+  start_clock = time.clock()
+  temp_file = method(url, length)
+  processor_seconds = time.clock() - start_clock
+  seconds = time.time() - start_time
+  temp_file.close_temp_file()
+  return seconds, processor_seconds
+
+
+
+
+
+def run_benchmark(options):
+  """
+  <Purpose>
+    Serve synthetic files, and time their downloads with every size, chunk
+    size and method of 'options'.
+
+  <Arguments>
+    options:
+      The options parsed by parse_options().
+
+  <Exceptions>
+    None.  The errors of downloads are part of the results.
+
+  <Side Effects>
+    Sets 'tuf.conf.CHUNK_SIZE' during the benchmark.
+
+  <Returns>
+    The results of the benchmark, ready to be written as JSON.
+
+  """
+
+  original_chunk_size = tuf.conf.CHUNK_SIZE
+  server = benchmark_tools.start_server(_SyntheticFileHandler,
+                                        block=os.urandom(BLOCK_SIZE),
+                                        latency=options.LATENCY,
+                                        bandwidth=options.BANDWIDTH)
+
+  results = {'parameters': {'sizes': options.SIZES,
+                            'chunk_sizes': options.CHUNK_SIZES,
+                            'methods': options.METHODS,
+                            'latency': options.LATENCY,
+                            'bandwidth': options.BANDWIDTH,
+                            'repeat': options.REPEAT},
+             'downloads': []}
+
+  try:
+    # Warm up every method, so that the first timed download does not pay
+    # for the imports and connections of the first download.
+    for method_name in options.METHODS:
+      DOWNLOAD_METHODS[method_name](server.url+'1', 1).close_temp_file()
+
+    for size in options.SIZES:
+      url = server.url+str(size)
+      for chunk_size in options.CHUNK_SIZES:
+        tuf.conf.CHUNK_SIZE = chunk_size
+        medians = {}
+
+        for method_name in options.METHODS:
+          result = {'size': size, 'chunk_size': chunk_size,
+                    'method': method_name}
+          samples = []
+          processor_samples = []
+          try:
+            for run in range(options.REPEAT):
+              seconds, processor_seconds = \
+                time_download(DOWNLOAD_METHODS[method_name], url, size)
+              samples.append(seconds)
+              processor_samples.append(processor_seconds)
+
+          except Exception, exception:
+            result['error'] = repr(exception)
+
+          else:
+            megabytes = size / float(1024**2)
+            result['seconds'] = benchmark_tools.summarize(samples)
+            median_seconds = result['seconds']['median']
+            medians[method_name] = median_seconds
+            if median_seconds > 0:
+              result['megabytes_per_second'] = megabytes / median_seconds
+            processor_median = \
+              benchmark_tools.summarize(processor_samples)['median']
+            if megabytes > 0:
+              result['processor_seconds_per_megabyte'] = \
+                processor_median / megabytes
+
+          results['downloads'].append(result)
+
+        # The overhead of the download functions over a raw download.
+        for result in results['downloads'][-len(options.METHODS):]:
+          if result['method'] != 'raw' and result['method'] in medians and \
+             medians.get('raw'):
+            result['overhead'] = \
+              medians[result['method']] / medians['raw'] - 1
+
+  finally:
+    tuf.conf.CHUNK_SIZE = original_chunk_size
+    benchmark_tools.stop_server(server)
+
+  return results
+
+
+
+
+
+def parse_options():
+  """
+  <Purpose>
+    Parse the command-line options and set the logging level as specified by
+    the user through the --verbose option.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    Sets the logging level for TUF logging.
+
+  <Returns>
+    The parsed options, with the sizes in bytes.
+
+  """
+
+  parser = optparse.OptionParser()
+
+  parser.add_option('--verbose', dest='VERBOSE', type=int, default=3,
+                    help='Set the verbosity level of logging messages.'
+                         'The lower the setting, the greater the verbosity.')
+
+  parser.add_option('--sizes', dest='SIZES', type='string',
+                    default='1K,1M,64M',
+                    help='Specify the comma-separated sizes of the files, '
+                    'with an optional K, M or G suffix.')
+
+  parser.add_option('--chunk-sizes', dest='CHUNK_SIZES', type='string',
+                    default='1K,8K,64K',
+                    help='Specify the comma-separated values of '
+                    'tuf.conf.CHUNK_SIZE.')
+
+  parser.add_option('--methods', dest='METHODS', type='string',
+                    default='raw,safe,unsafe',
+                    help='Specify the comma-separated download methods, '
+                    'among '+', '.join(sorted(DOWNLOAD_METHODS))+'.')
+
+  parser.add_option('--latency', dest='LATENCY', type=float, default=0,
+                    help='Specify the seconds the server waits before every '
+                    'response.')
+
+  parser.add_option('--bandwidth', dest='BANDWIDTH', type='string',
+                    default='0',
+                    help='Specify the bytes per second the server sends at '
+                    'most, with an optional K, M or G suffix, or 0 for no '
+                    'limit.')
+
+  parser.add_option('--repeat', dest='REPEAT', type=int, default=3,
+                    help='Specify the number of downloads of every file.')
+
+  parser.add_option('--output', dest='OUTPUT', type='string',
+                    help='Specify the file the JSON results are written to, '
+                    'instead of the standard output.')
+
+  options, args = parser.parse_args()
+
+  # Set the logging level.
+  if options.VERBOSE == 5:
+    tuf.log.set_log_level(logging.CRITICAL)
+  elif options.VERBOSE == 4:
+    tuf.log.set_log_level(logging.ERROR)
+  elif options.VERBOSE == 3:
+    tuf.log.set_log_level(logging.WARNING)
+  elif options.VERBOSE == 2:
+    tuf.log.set_log_level(logging.INFO)
+  elif options.VERBOSE == 1:
+    tuf.log.set_log_level(logging.DEBUG)
+  else:
+    tuf.log.set_log_level(logging.NOTSET)
+
+  try:
+    options.SIZES = [parse_size(size) for size in options.SIZES.split(',')]
+    options.CHUNK_SIZES = [parse_size(chunk_size) for chunk_size in
+                           options.CHUNK_SIZES.split(',')]
+    options.BANDWIDTH = parse_size(options.BANDWIDTH)
+  except ValueError, exception:
+    parser.error('Invalid size: '+str(exception))
+
+  options.METHODS = options.METHODS.split(',')
+  for method_name in options.METHODS:
+    if method_name not in DOWNLOAD_METHODS:
+      parser.error('Unknown download method: '+repr(method_name))
+
+  if min(options.CHUNK_SIZES) < 1 or options.REPEAT < 1:
+    parser.error('"--chunk-sizes" and "--repeat" must be positive.')
+
+  return options
+
+
+
+
+
+if __name__ == '__main__':
+  options = parse_options()
+  benchmark_tools.write_results(run_benchmark(options), options.OUTPUT)
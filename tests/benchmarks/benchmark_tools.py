@@ -0,0 +1,190 @@
+"""
+<Program Name>
+  benchmark_tools.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Provide the helpers shared by the benchmarks of this directory: an
+  in-process HTTP server for a local directory, the timing of a function over
+  several runs, and the output of the results as JSON.
+
+"""
+
+import BaseHTTPServer
+import SimpleHTTPServer
+import SocketServer
+import os
+import posixpath
+import socket
+import sys
+import threading
+import time
+import urllib
+
+import tuf.util
+
+json = tuf.util.import_json()
+
+
+
+
+
+class _QuietHTTPRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+  """Serve the files of the 'directory' of the server, without logging every
+  request to stderr."""
+
+  def translate_path(self, path):
+    path = posixpath.normpath(urllib.unquote(path.split('?', 1)[0]))
+    relative_path = path.lstrip('/')
+    return os.path.join(self.server.directory, *relative_path.split('/'))
+
+  def log_message(self, format, *args):
+    pass
+
+
+
+
+
+class HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """A threaded HTTP server on an unused port of the local host."""
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, handler_class):
+    BaseHTTPServer.HTTPServer.__init__(self, ('localhost', 0), handler_class)
+    self.url = 'http://localhost:'+str(self.server_address[1])+'/'
+
+  def handle_error(self, request, client_address):
+    # Clients may give up on a response, e.g., on a slow retrieval.
+    if not isinstance(sys.exc_info()[1], socket.error):
+      BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+
+
+
+def start_server(handler_class=_QuietHTTPRequestHandler, **attributes):
+  """
+  <Purpose>
+    Serve HTTP requests with 'handler_class', on an unused port of the local
+    host, from a background thread.
+
+  <Arguments>
+    handler_class:
+      The request handler class of the server.  By default, the files of the
+      'directory' attribute are served.
+
+    attributes:
+      The attributes of the server, for its handlers; e.g., the absolute
+      'directory' whose files are served.
+
+  <Exceptions>
+    socket.error, if the server cannot listen.
+
+  <Side Effects>
+    A thread serves the requests until the server is shut down.
+
+  <Returns>
+    The HTTPServer; its 'url' attribute is its root URL.
+
+  """
+
+  server = HTTPServer(handler_class)
+  for name, value in attributes.items():
+    setattr(server, name, value)
+  server_thread = threading.Thread(target=server.serve_forever)
+  server_thread.daemon = True
+  server_thread.start()
+  return server
+
+
+
+
+
+def stop_server(server):
+  server.shutdown()
+  server.server_close()
+
+
+
+
+
+def summarize(samples):
+  """
+  <Purpose>
+    Summarize the measurements of several runs.
+
+  <Arguments>
+    samples:
+      A non-empty list of numbers.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    None.
+
+  <Returns>
+    A dictionary with the 'samples', and their 'min', 'median', 'mean' and
+    'max'.
+
+  """
+
+  ordered_samples = sorted(samples)
+  middle = len(ordered_samples) // 2
+  if len(ordered_samples) % 2:
+    median = ordered_samples[middle]
+  else:
+    median = (ordered_samples[middle-1] + ordered_samples[middle]) / 2.0
+
+  return {'samples': list(samples),
+          'min': ordered_samples[0],
+          'median': median,
+          'mean': sum(ordered_samples) / float(len(ordered_samples)),
+          'max': ordered_samples[-1]}
+
+
+
+
+
+def time_call(function, *args, **kwargs):
+  """
+  <Purpose>
+    Call 'function' with the given arguments, and measure how long it takes.
+
+  <Returns>
+    A (seconds, result) tuple, where 'result' is the return value of the call.
+
+  """
+
+  start_time = time.time()
+  result = function(*args, **kwargs)
+  return time.time() - start_time, result
+
+
+
+
+
+def write_results(results, output_filename=None):
+  """
+  <Purpose>
+    Write 'results' as indented JSON to 'output_filename', or to standard
+    output if it is None.
+
+  """
+
+  json_results = json.dumps(results, indent=1, sort_keys=True)
+  if output_filename is None:
+    sys.stdout.write(json_results+'\n')
+  else:
+    output_file = open(output_filename, 'w')
+    try:
+      output_file.write(json_results+'\n')
+    finally:
+      output_file.close()
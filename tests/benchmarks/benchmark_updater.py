@@ -0,0 +1,567 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  benchmark_updater.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Benchmark the client against synthetic repositories of a configurable size,
+  so that changes to 'tuf/client/updater.py' can be judged by numbers.
+
+  The repository has '--targets' target files of '--target-size' bytes.  The
+  top-level targets role delegates to a tree of '--depth' levels of
+  delegated roles, each of which delegates to '--fanout' roles, and the
+  targets are spread evenly across the roles at the bottom of the tree.  With
+  '--hashed-bins', each of these roles instead delegates its targets to that
+  many hashed bins (roles delegated by 'path_hash_prefixes').  Every role is
+  signed with '--keys' keys, all of which must sign it.
+
+  The repository is served by an HTTP server of this process.  The benchmark
+  times refresh(), target() for '--lookups' targets, all_targets(),
+  updated_targets(), and the download_target() of every updated target:
+
+    cold: a new client that only has the root metadata, downloading into an
+      empty directory.
+    warm: a new Updater over the metadata and targets of the cold client, as
+      on the next run of a client; the metadata and targets are up to date.
+
+  Every phase is run '--repeat' times, and the results are written as JSON.
+  With '--stats', the statistics of the updaters (see Updater.stats()) of the
+  last run of each phase are included as well.
+
+<Usage>
+  $ python benchmark_updater.py --targets 10000 --depth 2 --fanout 4 \
+      --hashed-bins 16 --repeat 3 --output results.json
+
+"""
+
+import hashlib
+import logging
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+import tuf
+import tuf.client.updater
+import tuf.conf
+import tuf.formats
+import tuf.log
+import tuf.repo.keystore as keystore
+import tuf.repo.signerlib as signerlib
+import tuf.rsa_key
+import tuf.util
+
+import benchmark_tools
+
+# The password of the keys of the synthetic repositories.
+PASSWORD = 'benchmark'
+
+# Keys of synthetic repositories need not be hard to guess, but quick to
+# decrypt.
+keystore._PBKDF2_ITERATIONS = 1000
+
+
+
+
+
+def _make_delegation_tree(depth, fanout):
+  """
+  Return the (rolename, target directory, children) tuples of the roles of a
+  tree of delegations of 'depth' levels below 'targets', and the roles at its
+  bottom.
+  """
+
+  roles = []
+  top_role = ('targets', '', [])
+  roles.append(top_role)
+  level = [top_role]
+  for index in range(depth):
+    next_level = []
+    for rolename, directory, children in level:
+      for child_index in range(fanout):
+        child_name = 'r'+str(child_index)
+        child = (rolename+'/'+child_name, directory+child_name+'/', [])
+        children.append(child)
+        next_level.append(child)
+    roles.extend(next_level)
+    level = next_level
+
+  return roles, level
+
+
+
+
+
+def _get_prefix_length(bin_count):
+  """Return the length of the path hash prefixes of 'bin_count' bins."""
+
+  return len('%x' % max(bin_count-1, 1))
+
+
+
+
+
+def _make_hashed_bins(rolename, bin_count):
+  """
+  Return the (rolename, path hash prefixes) of 'bin_count' hashed bins
+  delegated by 'rolename', which share the hexadecimal prefixes of a length
+  that gives every bin at least one.
+  """
+
+  prefix_length = _get_prefix_length(bin_count)
+  prefix_count = 16 ** prefix_length
+  hashed_bins = []
+  for index in range(bin_count):
+    prefixes = ['%0*x' % (prefix_length, prefix) for prefix in
+                range(index*prefix_count // bin_count,
+                      (index+1)*prefix_count // bin_count)]
+    hashed_bins.append((rolename+'/bin_'+prefixes[0], prefixes))
+
+  return hashed_bins
+
+
+
+
+
+def build_repository(repository_directory, target_count, depth, fanout,
+                     hashed_bins, key_count, target_size, key_bits):
+  """
+  <Purpose>
+    Generate a synthetic repository in 'repository_directory', as described
+    in the purpose of this module.
+
+  <Arguments>
+    repository_directory:
+      An empty directory, where the 'metadata', 'targets' and 'keystore'
+      directories of the repository are created.
+
+    target_count, depth, fanout, hashed_bins, key_count, target_size:
+      The dimensions of the repository.
+
+    key_bits:
+      The size of the RSA keys.
+
+  <Exceptions>
+    tuf.Error, if the repository cannot be generated.
+
+  <Side Effects>
+    The repository is written, and its keys are loaded in the keystore.
+
+  <Returns>
+    A dictionary with the relative paths of the 'targets', and the number of
+    'roles' and 'metadata_bytes' of the repository.
+
+  """
+
+  metadata_directory = os.path.join(repository_directory, 'metadata')
+  targets_directory = os.path.join(repository_directory, 'targets')
+  keystore_directory = os.path.join(repository_directory, 'keystore')
+  for directory in [metadata_directory, targets_directory, keystore_directory]:
+    os.mkdir(directory)
+
+  expiration_date = tuf.formats.format_time(time.time()+86400)
+  version = 1
+
+  # Every role is signed by all the keys.
+  keys = []
+  for index in range(key_count):
+    keys.append(signerlib.generate_and_save_rsa_key(keystore_directory,
+                                                   PASSWORD, bits=key_bits))
+  keyids = [key['keyid'] for key in keys]
+  metadata_keys = {}
+  for key in keys:
+    metadata_keys[key['keyid']] = \
+      tuf.rsa_key.create_in_metadata_format(key['keyval'])
+
+  role_info = {}
+  for rolename in ['root', 'targets', 'release', 'timestamp']:
+    role_info[rolename] = {'keyids': keyids, 'threshold': key_count}
+  config_filepath = signerlib.build_config_file(metadata_directory, 365,
+                                                role_info)
+  signerlib.build_root_file(config_filepath, keyids, metadata_directory,
+                            version)
+
+  # The delegations: rolename: [role metadata, ...]
+  delegations = {}
+  roles, bottom_roles = _make_delegation_tree(depth, fanout)
+  for rolename, directory, children in roles:
+    delegations[rolename] = []
+    for child_name, child_directory, grandchildren in children:
+      delegations[rolename].append(
+        tuf.formats.make_role_metadata(keyids, key_count, name=child_name,
+                                       paths=[child_directory]))
+
+  # The roles that sign for targets: rolename: (directory, path hash prefixes)
+  signing_roles = {}
+  for rolename, directory, children in bottom_roles:
+    if hashed_bins:
+      for bin_name, prefixes in _make_hashed_bins(rolename, hashed_bins):
+        delegations[rolename].append(
+          tuf.formats.make_role_metadata(keyids, key_count, name=bin_name,
+                                         path_hash_prefixes=prefixes))
+        delegations[bin_name] = []
+        signing_roles[bin_name] = (directory, prefixes)
+    else:
+      signing_roles[rolename] = (directory, None)
+
+  # Spread the targets across the bottom roles, and then across their bins by
+  # the hashes of their paths.
+  signed_targets = dict((rolename, []) for rolename in delegations)
+  bins_by_prefix = {}
+  for bin_name, (directory, prefixes) in signing_roles.items():
+    for prefix in prefixes or []:
+      bins_by_prefix[(directory, prefix)] = bin_name
+  target_paths = []
+  for index in range(target_count):
+    rolename, directory, children = bottom_roles[index % len(bottom_roles)]
+    target_path = directory+'target_'+str(index)+'.txt'
+    target_paths.append(target_path)
+
+    target_filepath = os.path.join(targets_directory, target_path)
+    tuf.util.ensure_parent_dir(target_filepath)
+    target_file = open(target_filepath, 'wb')
+    target_file.write(os.urandom(target_size))
+    target_file.close()
+
+    if hashed_bins:
+      target_hash = hashlib.sha256(target_path).hexdigest()
+      prefix = target_hash[:_get_prefix_length(hashed_bins)]
+      rolename = bins_by_prefix[(directory, prefix)]
+    signed_targets[rolename].append(os.path.join('targets', target_path))
+
+  # The updater rejects the metadata of a hashed bin without targets, so the
+  # bins that no target falls into are not delegated.
+  if hashed_bins:
+    for bin_name in signing_roles:
+      if not signed_targets[bin_name]:
+        del delegations[bin_name]
+  for rolename in delegations:
+    delegations[rolename] = [role for role in delegations[rolename]
+                             if role['name'] in delegations]
+
+  # Sign and write the metadata of the targets roles.
+  for rolename in delegations:
+    metadata = signerlib.generate_targets_metadata(repository_directory,
+                                                   signed_targets[rolename],
+                                                   version, expiration_date)
+    if delegations[rolename]:
+      metadata['signed']['delegations'] = {'keys': metadata_keys,
+                                           'roles': delegations[rolename]}
+    metadata_filepath = os.path.join(metadata_directory, rolename+'.txt')
+    tuf.util.ensure_parent_dir(metadata_filepath)
+    signable = signerlib.sign_metadata(metadata['signed'], keyids,
+                                       metadata_filepath)
+    signerlib.write_metadata_file(signable, metadata_filepath)
+
+  signerlib.build_release_file(keyids, metadata_directory, version,
+                               expiration_date)
+  signerlib.build_timestamp_file(keyids, metadata_directory, version,
+                                 expiration_date)
+  keystore.clear_keystore()
+
+  metadata_bytes = 0
+  for directory, subdirectories, filenames in os.walk(metadata_directory):
+    for filename in filenames:
+      metadata_bytes += os.path.getsize(os.path.join(directory, filename))
+
+  return {'targets': target_paths, 'roles': len(delegations) + 3,
+          'metadata_bytes': metadata_bytes}
+
+
+
+
+
+def create_client(client_directory, repository_directory):
+  """
+  Create a client repository in 'client_directory' that only has the root
+  metadata of the repository in 'repository_directory'.
+  """
+
+  for metadata_set in ['current', 'previous']:
+    metadata_set_directory = os.path.join(client_directory, 'metadata',
+                                          metadata_set)
+    os.makedirs(metadata_set_directory)
+    shutil.copy(os.path.join(repository_directory, 'metadata', 'root.txt'),
+                metadata_set_directory)
+
+
+
+
+
+def run_phase(client_directory, mirrors, target_paths, lookup_count,
+              destination_directory):
+  """
+  <Purpose>
+    Time the target methods of a new Updater over 'client_directory'.
+
+  <Arguments>
+    client_directory:
+      The client repository.
+
+    mirrors:
+      The mirrors of the repository.
+
+    target_paths:
+      The relative paths of all the targets of the repository.
+
+    lookup_count:
+      The number of targets, evenly spread across 'target_paths', that are
+      looked up with target().
+
+    destination_directory:
+      The directory where the updated targets are downloaded.
+
+  <Exceptions>
+    Any error of the Updater.
+
+  <Side Effects>
+    The metadata of the client and the targets of 'destination_directory' are
+    updated.
+
+  <Returns>
+    A (seconds, counts, updater) tuple, where 'seconds' maps every timed
+    operation to its duration, and 'counts' to the number of targets it
+    handled.
+
+  """
+
+  tuf.conf.repository_directory = client_directory
+  seconds = {}
+  counts = {}
+
+  seconds['init'], updater = \
+    benchmark_tools.time_call(tuf.client.updater.Updater, 'repository',
+                              mirrors)
+  seconds['refresh'], result = benchmark_tools.time_call(updater.refresh)
+
+  step = max(len(target_paths) // max(lookup_count, 1), 1)
+  lookup_paths = target_paths[::step][:lookup_count]
+  def look_up_targets():
+    for target_path in lookup_paths:
+      updater.target(target_path)
+  seconds['target'], result = benchmark_tools.time_call(look_up_targets)
+  counts['target'] = len(lookup_paths)
+
+  seconds['all_targets'], all_targets = \
+    benchmark_tools.time_call(updater.all_targets)
+  counts['all_targets'] = len(all_targets)
+
+  seconds['updated_targets'], updated_targets = \
+    benchmark_tools.time_call(updater.updated_targets, all_targets,
+                              destination_directory)
+  counts['updated_targets'] = len(updated_targets)
+
+  def download_targets():
+    for target in updated_targets:
+      updater.download_target(target, destination_directory)
+  seconds['download_target'], result = \
+    benchmark_tools.time_call(download_targets)
+  counts['download_target'] = len(updated_targets)
+
+  return seconds, counts, updater
+
+
+
+
+
+def run_benchmark(options):
+  """
+  <Purpose>
+    Generate the repository described by 'options', serve it, and run the
+    cold and warm phases of the benchmark '--repeat' times each.
+
+  <Arguments>
+    options:
+      The options parsed by parse_options().
+
+  <Exceptions>
+    Any error of the repository tools or of the Updater.
+
+  <Side Effects>
+    A temporary directory is created, and removed.
+
+  <Returns>
+    The results of the benchmark, ready to be written as JSON.
+
+  """
+
+  work_directory = tempfile.mkdtemp()
+  original_repository_directory = tuf.conf.repository_directory
+  original_updater_stats = tuf.conf.UPDATER_STATS
+  tuf.conf.UPDATER_STATS = options.STATS
+  server = None
+
+  try:
+    repository_directory = os.path.join(work_directory, 'repository')
+    os.mkdir(repository_directory)
+    start_time = time.time()
+    repository = build_repository(repository_directory, options.TARGETS,
+                                  options.DEPTH, options.FANOUT,
+                                  options.HASHED_BINS, options.KEYS,
+                                  options.TARGET_SIZE, options.KEY_BITS)
+    build_seconds = time.time() - start_time
+
+    server = benchmark_tools.start_server(directory=repository_directory)
+    mirrors = {'mirror1': {'url_prefix': server.url.rstrip('/'),
+                           'metadata_path': 'metadata',
+                           'targets_path': 'targets',
+                           'confined_target_dirs': ['']}}
+
+    results = {'parameters': {'targets': options.TARGETS,
+                              'depth': options.DEPTH,
+                              'fanout': options.FANOUT,
+                              'hashed_bins': options.HASHED_BINS,
+                              'keys': options.KEYS,
+                              'key_bits': options.KEY_BITS,
+                              'target_size': options.TARGET_SIZE,
+                              'lookups': options.LOOKUPS,
+                              'repeat': options.REPEAT},
+               'repository': {'roles': repository['roles'],
+                              'metadata_bytes': repository['metadata_bytes'],
+                              'build_seconds': build_seconds}}
+
+    for phase in ['cold', 'warm']:
+      phase_seconds = {}
+      for run in range(options.REPEAT):
+        # Every cold run starts over from the root metadata; the warm runs
+        # reuse the client of the last cold run.
+        if phase == 'cold':
+          client_directory = os.path.join(work_directory,
+                                          'client_'+str(run))
+          destination_directory = os.path.join(client_directory, 'targets')
+          create_client(client_directory, repository_directory)
+
+        seconds, counts, updater = \
+          run_phase(client_directory, mirrors, repository['targets'],
+                    options.LOOKUPS, destination_directory)
+        for operation, operation_seconds in seconds.items():
+          phase_seconds.setdefault(operation, []).append(operation_seconds)
+
+      results[phase] = {}
+      for operation, samples in phase_seconds.items():
+        results[phase][operation] = benchmark_tools.summarize(samples)
+        results[phase][operation]['count'] = counts.get(operation, 1)
+      if options.STATS:
+        results[phase]['stats'] = updater.stats()
+
+    return results
+
+  finally:
+    if server is not None:
+      benchmark_tools.stop_server(server)
+    tuf.conf.repository_directory = original_repository_directory
+    tuf.conf.UPDATER_STATS = original_updater_stats
+    shutil.rmtree(work_directory)
+
+
+
+
+
+def parse_options():
+  """
+  <Purpose>
+    Parse the command-line options and set the logging level as specified by
+    the user through the --verbose option.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    Sets the logging level for TUF logging.
+
+  <Returns>
+    The parsed options.
+
+  """
+
+  parser = optparse.OptionParser()
+
+  parser.add_option('--verbose', dest='VERBOSE', type=int, default=3,
+                    help='Set the verbosity level of logging messages.'
+                         'The lower the setting, the greater the verbosity.')
+
+  parser.add_option('--targets', dest='TARGETS', type=int, default=1000,
+                    help='Specify the number of target files.')
+
+  parser.add_option('--target-size', dest='TARGET_SIZE', type=int,
+                    default=1024,
+                    help='Specify the size of every target file, in bytes.')
+
+  parser.add_option('--depth', dest='DEPTH', type=int, default=1,
+                    help='Specify the number of levels of delegated roles.')
+
+  parser.add_option('--fanout', dest='FANOUT', type=int, default=2,
+                    help='Specify the number of roles every role delegates '
+                    'to.')
+
+  parser.add_option('--hashed-bins', dest='HASHED_BINS', type=int, default=0,
+                    help='Specify the number of hashed bins of every role at '
+                    'the bottom of the delegations, or 0 for none.')
+
+  parser.add_option('--keys', dest='KEYS', type=int, default=1,
+                    help='Specify the number of keys that sign every role.')
+
+  parser.add_option('--key-bits', dest='KEY_BITS', type=int,
+                    default=signerlib.DEFAULT_RSA_KEY_BITS,
+                    help='Specify the size of the RSA keys, at least 2048 '
+                    'bits.')
+
+  parser.add_option('--lookups', dest='LOOKUPS', type=int, default=100,
+                    help='Specify the number of targets looked up with '
+                    'target().')
+
+  parser.add_option('--repeat', dest='REPEAT', type=int, default=3,
+                    help='Specify the number of runs of every phase.')
+
+  parser.add_option('--stats', dest='STATS', action='store_true',
+                    default=False,
+                    help='Include the statistics of the updaters.')
+
+  parser.add_option('--output', dest='OUTPUT', type='string',
+                    help='Specify the file the JSON results are written to, '
+                    'instead of the standard output.')
+
+  options, args = parser.parse_args()
+
+  # Set the logging level.
+  if options.VERBOSE == 5:
+    tuf.log.set_log_level(logging.CRITICAL)
+  elif options.VERBOSE == 4:
+    tuf.log.set_log_level(logging.ERROR)
+  elif options.VERBOSE == 3:
+    tuf.log.set_log_level(logging.WARNING)
+  elif options.VERBOSE == 2:
+    tuf.log.set_log_level(logging.INFO)
+  elif options.VERBOSE == 1:
+    tuf.log.set_log_level(logging.DEBUG)
+  else:
+    tuf.log.set_log_level(logging.NOTSET)
+
+  if options.TARGETS < 1 or options.REPEAT < 1 or options.KEYS < 1:
+    parser.error('"--targets", "--repeat" and "--keys" must be positive.')
+  if options.DEPTH < 0 or options.FANOUT < 1 or options.HASHED_BINS < 0:
+    parser.error('"--depth" and "--hashed-bins" must not be negative, and '
+                 '"--fanout" must be positive.')
+  if not tuf.formats.RSAKEYBITS_SCHEMA.matches(options.KEY_BITS):
+    parser.error('"--key-bits" must be at least 2048.')
+
+  return options
+
+
+
+
+
+if __name__ == '__main__':
+  options = parse_options()
+  benchmark_tools.write_results(run_benchmark(options), options.OUTPUT)
@@ -37,7 +37,7 @@ keystore._PBKDF2_ITERATIONS = 1000
 class TestDelegationFunctions(unittest.TestCase):
 
 
-  def do_update(self):
+  def do_update(self, resolve_together=False):
     # Client side repository.
     tuf_client = os.path.join(self.root_repo, 'tuf_client')
     downloads_dir = os.path.join(self.root_repo, 'downloads')
@@ -53,10 +53,17 @@ class TestDelegationFunctions(unittest.TestCase):
     updater.refresh()
 
     # Obtain a list of available targets.
+    # With 'resolve_together', the targets are resolved by a single walk of
+    # the delegations, which refreshes sibling roles at the same time.
     targets = []
     relative_target_filepaths = self.relpath_from_targets(self.target_filepaths)
+    if resolve_together:
+      found_targets = updater.targets(relative_target_filepaths)
     for target_filepath in relative_target_filepaths:
-      target_info = updater.target(target_filepath)
+      if resolve_together:
+        target_info = found_targets[target_filepath]
+      else:
+        target_info = updater.target(target_filepath)
       targets.append(target_info)
 
     # Download each of these updated targets and save them locally.
@@ -534,6 +541,16 @@ class TestConservationOfTargetDelegation(TestDelegationFunctions):
       self.assertIn(target_filepath, targets_metadata)
 
 
+  def test_that_initial_update_works_with_sibling_roles_refreshed_together(self):
+    # Both targets are delegated to both T1 and T2, so resolving them together
+    # on a new client refreshes the sibling roles T1 and T2 at the same time,
+    # and both store their metadata in the client's 'targets' directory.
+    relative_target_filepaths = self.relpath_from_targets(self.target_filepaths)
+    targets_metadata = self.do_update(resolve_together=True)
+    for target_filepath in relative_target_filepaths:
+      self.assertIn(target_filepath, targets_metadata)
+
+
 
 
 
@@ -13,7 +13,10 @@
 
 <Purpose>
   This is a basic server that was designed to be used in conjunction with 
-  test_download.py to test download.py module. 
+  test_download.py to test download.py module.  Unlike SimpleHTTPServer, it
+  honours single byte-range requests (e.g., 'Range: bytes=1024-'), so that
+  resumed downloads can be tested, and conditional requests ('If-None-Match'),
+  so that conditional downloads can be tested.
 
 <Referencesi>
   SimpleHTTPServer:
@@ -21,11 +24,14 @@
 
 """
 
+import os
 import sys
 import random
 import SimpleHTTPServer
 import SocketServer
 
+from StringIO import StringIO
+
 PORT = 0
 
 def _port_gen():
@@ -41,7 +47,65 @@ if len(sys.argv) > 1:
 else:
   PORT = _port_gen()
 
-Handler = SimpleHTTPServer.SimpleHTTPRequestHandler
+
+class RangeRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+
+  etag = None
+
+  def end_headers(self):
+    if self.etag is not None:
+      self.send_header('ETag', self.etag)
+    SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+  def send_head(self):
+    # The ETag of a file changes with its length or modification time.
+    path = self.translate_path(self.path)
+    if os.path.isfile(path):
+      stat = os.stat(path)
+      self.etag = '"%d-%d"' % (stat.st_size, int(stat.st_mtime * 1000))
+      if self.headers.get('If-None-Match') == self.etag:
+        self.send_response(304)
+        self.end_headers()
+        return None
+
+    range_header = self.headers.get('Range')
+    if range_header is None or not range_header.startswith('bytes='):
+      return SimpleHTTPServer.SimpleHTTPRequestHandler.send_head(self)
+
+    path = self.translate_path(self.path)
+    try:
+      fileobj = open(path, 'rb')
+    except IOError:
+      self.send_error(404, 'File not found')
+      return None
+
+    # Only a single range, 'bytes=first-' or 'bytes=first-last', is supported.
+    file_length = os.fstat(fileobj.fileno()).st_size
+    first, last = range_header[len('bytes='):].split('-')
+    first = int(first)
+    if last:
+      last = min(int(last), file_length-1)
+    else:
+      last = file_length-1
+    if first > last:
+      fileobj.close()
+      self.send_error(416, 'Requested range not satisfiable')
+      return None
+
+    fileobj.seek(first)
+    data = fileobj.read(last-first+1)
+    fileobj.close()
+
+    self.send_response(206)
+    self.send_header('Content-type', self.guess_type(path))
+    self.send_header('Content-Range',
+                     'bytes %d-%d/%d' % (first, last, file_length))
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    return StringIO(data)
+
+
+Handler = RangeRequestHandler
 httpd = SocketServer.TCPServer(("", PORT), Handler)
 
 #print "PORT: ", PORT
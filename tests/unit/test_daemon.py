@@ -0,0 +1,250 @@
+"""
+<Program Name>
+  test_daemon.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Unit test for 'daemon.py'.
+
+"""
+
+import os
+import socket
+import threading
+import unittest
+import logging
+
+import tuf
+import tuf.client.daemon as daemon
+import tuf.conf
+import tuf.formats
+import tuf.log
+import tuf.roledb
+import tuf.tests.repository_setup as setup
+import tuf.tests.unittest_toolbox as unittest_toolbox
+import tuf.util
+
+logger = logging.getLogger('tuf.test_daemon')
+
+
+TARGET = {'filepath': 'file1.txt',
+          'fileinfo': {'length': 10, 'hashes': {'sha256': 'aa'}}}
+
+# The target information of 'file1.txt' in the updated metadata, which the
+# snapshot of the updater has not caught up with.
+UPDATED_TARGET = {'filepath': 'file1.txt',
+                  'fileinfo': {'length': 12, 'hashes': {'sha256': 'cc'}}}
+
+
+
+class _Snapshot(object):
+  """A snapshot that only has 'file1.txt', and lacks the metadata of the role
+  of 'delegated.txt'."""
+
+  def target(self, target_filepath):
+    if target_filepath == TARGET['filepath']:
+      return TARGET
+    raise tuf.UnknownTargetError(target_filepath)
+
+
+
+class _Updater(object):
+  """An updater that records the calls the daemon makes."""
+
+  def __init__(self):
+    self.calls = []
+
+  def snapshot(self):
+    return _Snapshot()
+
+  def target(self, target_filepath):
+    self.calls.append(('target', target_filepath))
+    if target_filepath == UPDATED_TARGET['filepath']:
+      return UPDATED_TARGET
+    if target_filepath == 'delegated.txt':
+      return {'filepath': target_filepath, 'fileinfo': TARGET['fileinfo']}
+    raise tuf.UnknownTargetError(target_filepath)
+
+  def targets(self, target_filepaths):
+    self.calls.append(('targets', target_filepaths))
+    return dict.fromkeys(target_filepaths)
+
+  def download_target(self, target, destination_directory):
+    self.calls.append(('download_target', target, destination_directory))
+    if target['filepath'] != TARGET['filepath']:
+      raise tuf.DownloadTargetsError({target['filepath']: 'failed'})
+
+
+
+class TestDaemon(unittest_toolbox.Modified_TestCase):
+  def setUp(self):
+    unittest_toolbox.Modified_TestCase.setUp(self)
+
+    self.updater = _Updater()
+    self.socket_path = os.path.join(self.make_temp_directory(), 'tuf.sock')
+    self.destination_directory = self.make_temp_directory()
+    self.daemon = daemon.UpdateDaemon(self.socket_path,
+                                      {'repository': self.updater},
+                                      {'repository':
+                                       self.destination_directory})
+    self.daemon_thread = threading.Thread(target=self.daemon.serve_forever)
+    self.daemon_thread.daemon = True
+    self.daemon_thread.start()
+    self.client = daemon.UpdateDaemonClient(self.socket_path, 'repository')
+
+
+
+  def tearDown(self):
+    self.client.close()
+    self.daemon.shutdown()
+    self.daemon.server_close()
+    self.daemon_thread.join()
+    unittest_toolbox.Modified_TestCase.tearDown(self)
+
+
+
+  def test_target(self):
+    # Test: the target is found in the snapshot of the updater.
+    self.assertEqual(self.client.target('file1.txt'), TARGET)
+    self.assertEqual(self.updater.calls, [])
+
+    # Test: the updater is asked for the targets the snapshot does not have,
+    # or whose roles it lacks.
+    target = self.client.target('delegated.txt')
+    self.assertTrue(tuf.formats.TARGETFILE_SCHEMA.matches(target))
+    self.assertEqual(self.updater.calls, [('target', 'delegated.txt')])
+    self.assertRaises(tuf.UnknownTargetError, self.client.target,
+                      'missing.txt')
+
+    # Test: several targets at once.
+    self.assertEqual(self.client.targets(['file1.txt', 'missing.txt']),
+                     {'file1.txt': None, 'missing.txt': None})
+
+    # Test: invalid arguments.
+    self.assertRaises(tuf.FormatError, self.client.target, 3)
+    self.assertRaises(tuf.FormatError, self.client.targets, 'file1.txt')
+
+
+
+  def test_download_target(self):
+    # Setup
+    destination_directory = os.path.realpath(self.destination_directory)
+
+    # Test: the daemon downloads to the configured destination directory, with
+    # the target information of the updated metadata rather than that of the
+    # snapshot.
+    self.client.download_target(TARGET, self.destination_directory)
+    self.assertEqual(self.updater.calls,
+                     [('target', 'file1.txt'),
+                      ('download_target', UPDATED_TARGET,
+                       destination_directory)])
+
+    # Test: the daemon downloads the target with its own target information,
+    # not the client's.
+    del self.updater.calls[:]
+    target = {'filepath': 'file1.txt',
+              'fileinfo': {'length': 1000, 'hashes': {'sha256': 'bb'}}}
+    self.client.download_target(target, self.destination_directory)
+    self.assertEqual(self.updater.calls,
+                     [('target', 'file1.txt'),
+                      ('download_target', UPDATED_TARGET,
+                       destination_directory)])
+
+    # Test: targets the daemon does not find are not downloaded.
+    del self.updater.calls[:]
+    target = {'filepath': 'missing.txt', 'fileinfo': TARGET['fileinfo']}
+    self.assertRaises(tuf.UnknownTargetError, self.client.download_target,
+                      target, self.destination_directory)
+    self.assertEqual(self.updater.calls, [('target', 'missing.txt')])
+
+    # Test: other destination directories, including links to them, are
+    # refused.
+    del self.updater.calls[:]
+    other_directory = self.make_temp_directory()
+    link_directory = os.path.join(self.destination_directory, 'link')
+    os.symlink(other_directory, link_directory)
+    for destination in ['targets', other_directory, link_directory,
+                        os.path.join(self.destination_directory, '..')]:
+      self.assertRaises(tuf.Error, self.client.download_target, TARGET,
+                        destination)
+    self.assertEqual(self.updater.calls, [])
+
+    # Test: errors that do not take a single message.
+    target = {'filepath': 'delegated.txt', 'fileinfo': TARGET['fileinfo']}
+    try:
+      self.client.download_target(target, self.destination_directory)
+    except tuf.UpdateDaemonError, exception:
+      self.assertEqual(exception.error_type, 'DownloadTargetsError')
+    else:
+      self.fail('Expected tuf.UpdateDaemonError.')
+
+    # Test: invalid arguments.
+    self.assertRaises(tuf.FormatError, self.client.download_target,
+                      {'filepath': 'file1.txt'}, self.destination_directory)
+    self.assertRaises(tuf.FormatError, daemon.UpdateDaemon,
+                      self.socket_path+'2', {'repository': self.updater}, {})
+
+
+
+  def test_invalid_requests(self):
+    # Test: unknown repository and method.
+    client = daemon.UpdateDaemonClient(self.socket_path, 'unknown')
+    self.assertRaises(tuf.RepositoryError, client.target, 'file1.txt')
+    client.close()
+    self.assertRaises(tuf.FormatError, self.client._request, 'refresh')
+    self.assertRaises(tuf.FormatError, self.client._request, 'target',
+                      filepath='file1.txt')
+
+    # Test: a request that is not JSON.
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(self.socket_path)
+    connection_file = connection.makefile('rwb')
+    connection_file.write('{]\n')
+    connection_file.flush()
+    response = tuf.util.load_json_string(connection_file.readline())
+    self.assertEqual(response['error']['type'], 'FormatError')
+    connection_file.close()
+    connection.close()
+
+    # Test: the daemon cannot be reached.
+    client = daemon.UpdateDaemonClient(self.socket_path+'.missing',
+                                       'repository')
+    self.assertRaises(tuf.UpdateDaemonError, client.target, 'file1.txt')
+
+
+
+  def test_create_updaters(self):
+    # Setup
+    repositories = setup.create_repositories()
+    client_repository_dir = repositories['client_repository']
+    original_repository_directory = tuf.conf.repository_directory
+
+    try:
+      # Test: normal case.
+      updaters = daemon.create_updaters({'repository':
+        {'repository_directory': client_repository_dir,
+         'repository_mirrors': self.mirrors,
+         'destination_directory': self.make_temp_directory()}})
+      self.assertEqual(updaters.keys(), ['repository'])
+      self.assertEqual(updaters['repository'].name, 'repository')
+      self.assertEqual(tuf.conf.repository_directory,
+                       original_repository_directory)
+
+      # Test: invalid arguments.
+      self.assertRaises(tuf.FormatError, daemon.create_updaters,
+                        {'repository': {'mirrors': self.mirrors}})
+
+    finally:
+      setup.remove_all_repositories(repositories['main_repository'])
+      tuf.roledb.clear_roledb()
+
+
+
+# Run unit test.
+if __name__ == '__main__':
+  unittest.main()
@@ -37,6 +37,7 @@ import tuf
 import tuf.conf as conf
 import tuf.download as download
 import tuf.log
+import tuf.util
 import tuf.tests.unittest_toolbox as unittest_toolbox
 
 logger = logging.getLogger('tuf.test_download')
@@ -126,6 +127,66 @@ class TestDownload(unittest_toolbox.Modified_TestCase):
     temp_fileobj.close_temp_file()
 
 
+  # Test: Resume a download from the bytes already downloaded.
+  def test_download_url_to_tempfileobj_and_resume(self):
+    half = self.target_data_length // 2
+    temp_fileobj = tuf.util.TempFile()
+    temp_fileobj.write(self.target_data[:half])
+
+    returned_fileobj = download.safe_download(self.url,
+                                              self.target_data_length,
+                                              temp_file=temp_fileobj)
+    self.assertTrue(returned_fileobj is temp_fileobj)
+    self.assertEquals(self.target_data, temp_fileobj.read())
+
+    # A failed download does not close a temporary file given by the caller,
+    # nor does it discard the bytes received so far.
+    temp_fileobj.truncate(half)
+    self.assertRaises(urllib2.HTTPError, download.safe_download,
+                      'http://localhost:'+str(self.PORT)+'/'+
+                      self.random_string(), self.target_data_length,
+                      temp_file=temp_fileobj)
+    self.assertEquals(self.target_data[:half], temp_fileobj.read())
+
+    # A complete file is downloaded again from its first byte.
+    temp_fileobj.seek(0)
+    temp_fileobj.write(self.target_data)
+    download.safe_download(self.url, self.target_data_length,
+                           temp_file=temp_fileobj)
+    self.assertEquals(self.target_data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+
+
+  # Test: Download a file only if it has changed.
+  def test_download_url_to_tempfileobj_and_validators(self):
+    validators = {}
+    temp_fileobj = download.unsafe_download(self.url, self.target_data_length,
+                                            validators=validators)
+    self.assertEquals(self.target_data, temp_fileobj.read())
+    self.assertTrue(validators['etag'] is not None)
+    self.assertTrue(validators['last-modified'] is not None)
+    temp_fileobj.close_temp_file()
+
+    self.assertRaises(tuf.NotModifiedError, download.unsafe_download,
+                      self.url, self.target_data_length,
+                      validators=dict(validators))
+
+    # The file has changed.
+    target_filepath = self.target_fileobj.name
+    new_data = self.target_data + self.random_string()
+    target_fileobj = open(target_filepath, 'wb')
+    target_fileobj.write(new_data)
+    target_fileobj.close()
+    new_validators = dict(validators)
+    temp_fileobj = download.unsafe_download(self.url, len(new_data),
+                                            validators=new_validators)
+    self.assertEquals(new_data, temp_fileobj.read())
+    self.assertNotEquals(validators['etag'], new_validators['etag'])
+    temp_fileobj.close_temp_file()
+
+
+
   def test_download_url_to_tempfileobj_and_performance(self):
 
     """
@@ -151,6 +212,75 @@ class TestDownload(unittest_toolbox.Modified_TestCase):
     """
 
 
+  # Test: Download in concurrent segments, spread across mirrors.
+  def test_safe_segmented_download(self):
+    urls = [self.url, self.url]
+    for segment_count in [1, 3, self.target_data_length+1]:
+      temp_fileobj = download.safe_segmented_download(urls,
+                                                      self.target_data_length,
+                                                      segment_count)
+      self.assertEquals(self.target_data, temp_fileobj.read())
+      temp_fileobj.close_temp_file()
+
+    # The segments of a mirror that fails are downloaded from the others.
+    bad_url = 'http://localhost:'+str(self.PORT)+'/'+self.random_string()
+    temp_fileobj = download.safe_segmented_download([bad_url, self.url],
+                                                    self.target_data_length, 4)
+    self.assertEquals(self.target_data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    self.assertRaises(tuf.NoWorkingMirrorError,
+                      download.safe_segmented_download,
+                      [bad_url], self.target_data_length, 2)
+    self.assertRaises(tuf.FormatError, download.safe_segmented_download,
+                      urls, self.target_data_length, 0)
+
+
+
+  # Test: The hooks of the downloads are called with their payloads.
+  def test_download_url_to_tempfileobj_and_hooks(self):
+    events = []
+    def record_event(event):
+      def hook(**payload):
+        events.append((event, payload))
+      return hook
+    hooks = dict((event, record_event(event)) for event in
+                 ['download_started', 'chunk_received', 'download_finished'])
+    for event, hook in hooks.items():
+      download.hooks.register(event, hook)
+
+    try:
+      temp_fileobj = download.safe_download(self.url, self.target_data_length)
+      temp_fileobj.close_temp_file()
+
+      self.assertEquals(events[0], ('download_started',
+                                    {'url': self.url, 'offset': 0,
+                                     'required_length':
+                                       self.target_data_length}))
+      chunks = [payload for event, payload in events[1:-1]]
+      self.assertTrue(chunks)
+      self.assertEquals(sum(chunk['length'] for chunk in chunks),
+                        self.target_data_length)
+      self.assertEquals(chunks[-1]['downloaded_length'],
+                        self.target_data_length)
+      event, payload = events[-1]
+      self.assertEquals(event, 'download_finished')
+      self.assertEquals(payload['length'], self.target_data_length)
+      self.assertTrue(payload['seconds'] >= 0)
+
+      # A failed download is not finished.
+      del events[:]
+      self.assertRaises(urllib2.HTTPError, download.safe_download,
+                        self.url+self.random_string(), self.target_data_length)
+      self.assertEquals([event for event, payload in events],
+                        ['download_started'])
+
+    finally:
+      for event, hook in hooks.items():
+        download.hooks.unregister(event, hook)
+
+
+
   # Test: Incorrect/Unreachable URLs.
   def test_download_url_to_tempfileobj_and_urls(self):
 
@@ -521,6 +521,9 @@ class TestFormats(unittest.TestCase):
     make_fileinfo = tuf.formats.make_fileinfo
     self.assertTrue(FILEINFO_SCHEMA.matches(make_fileinfo(length, hashes, custom)))
     self.assertTrue(FILEINFO_SCHEMA.matches(make_fileinfo(length, hashes)))
+    compressions = {'gzip': {'length': 512}, 'xz': {'length': 256}}
+    self.assertTrue(FILEINFO_SCHEMA.matches(make_fileinfo(length, hashes,
+                                              compressions=compressions)))
 
     # Test conditions for invalid arguments.
     bad_length = 'bad'
@@ -532,6 +535,8 @@ class TestFormats(unittest.TestCase):
     self.assertRaises(tuf.FormatError, make_fileinfo, length, hashes, bad_custom)
     self.assertRaises(tuf.FormatError, make_fileinfo, bad_length, hashes)
     self.assertRaises(tuf.FormatError, make_fileinfo, length, bad_hashes)
+    self.assertRaises(tuf.FormatError, make_fileinfo, length, hashes,
+                      compressions={'gzip': bad_length})
 
 
 
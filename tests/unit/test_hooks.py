@@ -0,0 +1,100 @@
+"""
+<Program Name>
+  test_hooks.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Unit test for 'hooks.py'.
+
+"""
+
+import logging
+import unittest
+
+import tuf
+import tuf.hooks
+import tuf.log
+
+logger = logging.getLogger('tuf.test_hooks')
+
+
+
+class TestHookRegistry(unittest.TestCase):
+  def setUp(self):
+    self.hooks = tuf.hooks.HookRegistry(['started', 'finished'])
+    self.calls = []
+
+
+
+  def _hook(self, **payload):
+    self.calls.append(('hook', payload))
+
+
+
+  def _other_hook(self, **payload):
+    self.calls.append(('other_hook', payload))
+
+
+
+  def test_dispatch(self):
+    # Test: events without hooks.
+    self.assertFalse(self.hooks.registered('started'))
+    self.hooks.dispatch('started', length=1)
+    self.assertEqual(self.calls, [])
+
+    # Test: hooks are called in the order they were registered.
+    self.hooks.register('started', self._hook)
+    self.hooks.register('started', self._other_hook)
+    self.assertTrue(self.hooks.registered('started'))
+    self.assertFalse(self.hooks.registered('finished'))
+    self.hooks.dispatch('started', length=1)
+    self.assertEqual(self.calls, [('hook', {'length': 1}),
+                                  ('other_hook', {'length': 1})])
+
+    # Test: a failing hook does not stop the others.
+    def failing_hook(**payload):
+      raise ValueError('failed')
+    self.hooks.register('finished', failing_hook)
+    self.hooks.register('finished', self._hook)
+    del self.calls[:]
+    self.hooks.dispatch('finished', seconds=0.5)
+    self.assertEqual(self.calls, [('hook', {'seconds': 0.5})])
+
+
+
+  def test_unregister(self):
+    self.hooks.register('started', self._hook)
+    self.hooks.register('started', self._other_hook)
+
+    # Test: only the unregistered hook is no longer called.
+    self.hooks.unregister('started', self._hook)
+    self.hooks.dispatch('started')
+    self.assertEqual(self.calls, [('other_hook', {})])
+
+    # Test: an event without hooks is no longer registered.
+    self.hooks.unregister('started', self._other_hook)
+    self.assertFalse(self.hooks.registered('started'))
+
+    # Test: hooks that are not registered.
+    self.hooks.unregister('started', self._hook)
+    self.hooks.unregister('finished', self._hook)
+
+
+
+  def test_invalid_arguments(self):
+    self.assertRaises(tuf.FormatError, self.hooks.register, 'unknown',
+                      self._hook)
+    self.assertRaises(tuf.FormatError, self.hooks.register, 'started', 3)
+    self.assertRaises(tuf.FormatError, self.hooks.unregister, 'unknown',
+                      self._hook)
+
+
+
+# Run unit test.
+if __name__ == '__main__':
+  unittest.main()
@@ -222,6 +222,25 @@ class TestKeydb(unittest.TestCase):
 
 
 
+  def test_keydb_instances(self):
+    # Test condition ensuring every KeyDB is separate from the others and from
+    # the default key database.
+    keydb = tuf.keydb.KeyDB()
+    keydb2 = tuf.keydb.KeyDB()
+    rsakey = KEYS[0]
+    keyid = KEYS[0]['keyid']
+    keydb.add_rsakey(rsakey)
+    self.assertEqual(rsakey, keydb.get_key(keyid))
+    self.assertRaises(tuf.UnknownKeyError, keydb2.get_key, keyid)
+    self.assertRaises(tuf.UnknownKeyError, tuf.keydb.get_key, keyid)
+
+    tuf.keydb.add_rsakey(rsakey)
+    keydb.clear_keydb()
+    self.assertRaises(tuf.UnknownKeyError, keydb.get_key, keyid)
+    self.assertEqual(rsakey, tuf.keydb.get_key(keyid))
+
+
+
 # Run unit test.
 if __name__ == '__main__':
   unittest.main()
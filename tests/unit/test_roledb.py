@@ -381,6 +381,31 @@ class TestRoledb(unittest.TestCase):
 
 
 
+  def test_roledb_instances(self):
+    # Test condition ensuring every RoleDB is separate from the others and from
+    # the default role database.
+    roledb = tuf.roledb.RoleDB()
+    roledb2 = tuf.roledb.RoleDB()
+    roleinfo = {'keyids': ['123'], 'threshold': 1}
+    roleinfo2 = {'keyids': ['456'], 'threshold': 2}
+    roledb.add_role('targets', roleinfo)
+    roledb2.add_role('targets', roleinfo2)
+    self.assertEqual(['123'], roledb.get_role_keyids('targets'))
+    self.assertEqual(2, roledb2.get_role_threshold('targets'))
+    self.assertEqual(False, tuf.roledb.role_exists('targets'))
+
+    roledb.add_role('targets/role1', roleinfo)
+    self.assertEqual(['targets/role1'],
+                     roledb.get_delegated_rolenames('targets'))
+    self.assertEqual([], roledb2.get_delegated_rolenames('targets'))
+    self.assertRaises(tuf.Error, roledb2.add_role, 'targets/role1/role2',
+                      roleinfo)
+    roledb.remove_role('targets')
+    self.assertEqual([], roledb.get_rolenames())
+    self.assertEqual(['targets'], roledb2.get_rolenames())
+
+
+
   def _test_rolename(self, test_function):
     # Private function that tests the 'rolename' argument of 'test_function'
     # for format, invalid name, and unknown role exceptions.
@@ -226,6 +226,27 @@ class TestSignerlib(unit_tbox):
     #  Test: Validate input.
     self.assertTrue(formats.SIGNABLE_SCHEMA.matches(target_signable_obj))
 
+    #  Test: a compressed version of a target is listed in the fileinfo of the
+    #  target, rather than as a target of its own.
+    target_file = target_files[0]
+    compressed_file = target_file+'.gz'
+    compressed_path = os.path.join(repo_dir, compressed_file)
+    gzip_fileobj = gzip.open(compressed_path, 'wb')
+    gzip_fileobj.write(open(os.path.join(repo_dir, target_file), 'rb').read())
+    gzip_fileobj.close()
+    target_signable_obj = generate_targets_meta(repo_dir,
+                                                target_files+[compressed_file],
+                                                version, expiration_date,
+                                                compressions=('gz',))
+    targets = target_signable_obj['signed']['targets']
+    relative_targetpath = os.path.sep.join(target_file.split(os.path.sep)[1:])
+    self.assertEqual(len(targets), len(target_files))
+    self.assertEqual(targets[relative_targetpath]['compressions'],
+                     {'gzip': {'length': os.path.getsize(compressed_path)}})
+    os.remove(compressed_path)
+    self.assertRaises(tuf.FormatError, generate_targets_meta, repo_dir,
+                      target_files, version, expiration_date, ('zip',))
+
     #  Test: Incorrect arguments.
     self.assertRaises(tuf.FormatError, generate_targets_meta,
                                        self.random_string(), expiration_date,
@@ -302,6 +323,17 @@ class TestSignerlib(unit_tbox):
     #  from the file - 'stored_signable_dict'?
     self.assertEqual(signable_dict, stored_signable_dict)
 
+    #  Test: compressed metadata files.
+    for compression in ['gz', 'bz2']:
+      compressed_filepath = signerlib.write_metadata_file(signable_dict,
+                                                          meta_file,
+                                                          compression)
+      self.assertEqual(compressed_filepath, meta_file+'.'+compression)
+      self.assertEqual(signable_dict,
+                       tuf.util.load_json_file(compressed_filepath))
+    self.assertRaises(tuf.FormatError, signerlib.write_metadata_file,
+                      signable_dict, meta_file, 'zip')
+
     #  Test: Incorrect arguments.
     self.assertRaises(tuf.FormatError, signerlib.write_metadata_file,'','')
     self.assertRaises(tuf.FormatError, signerlib.write_metadata_file,
@@ -566,6 +598,24 @@ class TestSignerlib(unit_tbox):
     targets_metadata = file_content['signed']
     self.assertTrue(tuf.formats.TARGETS_SCHEMA.matches(targets_metadata))
 
+    #  Test: the delta from the current targets file to the new one.
+    old_targets_data = open(targets_filepath, 'rb').read()
+    old_fileinfo = signerlib.get_metadata_file_info(targets_filepath)
+    targets_filepath = signerlib.build_targets_file([targets_dir],
+                                                    targets_keyids, meta_dir,
+                                                    version+1, expiration_date,
+                                                    write_delta=True)
+    delta = tuf.util.load_json_file(targets_filepath+'.delta')
+    self.assertTrue(tuf.formats.DELTA_SCHEMA.matches(delta))
+    self.assertEqual(delta['base'], old_fileinfo)
+    self.assertEqual(tuf.util.apply_delta(old_targets_data, delta['edits']),
+                     open(targets_filepath, 'rb').read())
+
+    #  Test: the stale delta is removed.
+    signerlib.build_targets_file([targets_dir], targets_keyids, meta_dir,
+                                 version+2, expiration_date)
+    self.assertFalse(os.path.exists(targets_filepath+'.delta'))
+
     #  Test: various exceptions.
     self.assertRaises(tuf.FormatError, signerlib.build_targets_file,
         [targets_dir], self.random_string(), meta_dir, version, expiration_date)
@@ -656,6 +706,20 @@ class TestSignerlib(unit_tbox):
     self.assertTrue(tuf.formats.SIGNABLE_SCHEMA.matches(file_content))
     release_metadata = file_content['signed']
     self.assertTrue(tuf.formats.RELEASE_SCHEMA.matches(release_metadata))
+
+    #  Test: compressed versions are written, and removed once they are no
+    #  longer wanted.
+    signerlib.build_release_file(release_keyids, meta_dir, version,
+                                 expiration_date, compress=True,
+                                 compressions=('gz', 'bz2'))
+    file_content = tuf.util.load_json_file(release_filepath)
+    for extension in ['gz', 'bz2']:
+      self.assertEqual(file_content,
+                       tuf.util.load_json_file(release_filepath+'.'+extension))
+    signerlib.build_release_file(release_keyids, meta_dir, version,
+                                 expiration_date)
+    for extension in ['gz', 'bz2']:
+      self.assertFalse(os.path.exists(release_filepath+'.'+extension))
     
     #  Test: exceptions.
     self.assertRaises(tuf.Error, signerlib.build_release_file, release_keyids,
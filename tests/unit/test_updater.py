@@ -36,9 +36,12 @@
 """
 
 import os
+import copy
 import gzip
 import time
+import threading
 import shutil
+import StringIO
 import tempfile
 import logging
 import unittest
@@ -49,6 +52,7 @@ import tuf.client.updater as updater
 import tuf.conf
 import tuf.log
 import tuf.formats
+import tuf.hash
 import tuf.keydb
 import tuf.repo.keystore as keystore
 import tuf.repo.signerlib as signerlib
@@ -69,6 +73,7 @@ DEFAULT_TIMESTAMP_FILEINFO = {
 
 original_safe_download = tuf.download.safe_download
 original_unsafe_download = tuf.download.unsafe_download
+original_safe_segmented_download = tuf.download.safe_segmented_download
 
 class TestUpdater_init_(unittest_toolbox.Modified_TestCase):
 
@@ -215,15 +220,18 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
     """
 
-    def _mock_download(url, length):
+    def _mock_download(url, length, temp_file=None, validators=None):
       if isinstance(output, (str, unicode)):
         file_path = output
       elif isinstance(output, list):
         file_path = output.pop(0)
       file_obj = open(file_path, 'rb')
-      temp_fileobj = tuf.util.TempFile()
-      temp_fileobj.write(file_obj.read())
-      return temp_fileobj
+      if temp_file is None:
+        temp_file = tuf.util.TempFile()
+      temp_file.seek(0)
+      temp_file.truncate()
+      temp_file.write(file_obj.read())
+      return temp_file
 
     # Patch tuf.download functions.
     tuf.download.unsafe_download = _mock_download
@@ -391,18 +399,37 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     # Test: normal case.
     self.Repository._rebuild_key_and_role_db()
     
-    #  Verify tuf.roledb._roledb_dict and tuf.keydb._keydb_dict dictionaries
-    #  are populated.  'top_level_role_info' is a unittest_toolbox's dict
+    #  Verify the role and key databases of the updater are populated.  'top_level_role_info' is a unittest_toolbox's dict
     #  that contains top level role information it corresponds to a
     #  ROLEDICT_SCHEMA where roles are keys and role information their values.
-    self.assertEqual(tuf.roledb._roledb_dict, self.top_level_role_info)
-    self.assertEqual(len(tuf.keydb._keydb_dict), 4)
+    self.assertEqual(self.Repository.roledb._roledb_dict, self.top_level_role_info)
+    self.assertEqual(len(self.Repository.keydb._keydb_dict), 4)
 
     #  Verify that keydb dictionary was updated.
     for role in self.role_list:
       keyids = self.top_level_role_info[role]['keyids']
       for keyid in keyids:
-        self.assertTrue(keyid in tuf.keydb._keydb_dict)
+        self.assertTrue(keyid in self.Repository.keydb._keydb_dict)
+
+
+
+  def test_1__key_and_role_db_per_updater(self):
+    # Setup: a second updater, with the same repository directory.
+    other_updater = updater.Updater('Other_Repo_Name', self.mirrors)
+
+    # Test: the updaters have separate key and role databases, which are
+    # also separate from the default ones.
+    self.assertFalse(other_updater.roledb is self.Repository.roledb)
+    self.assertFalse(other_updater.keydb is self.Repository.keydb)
+    self.assertEqual(tuf.roledb.get_rolenames(), [])
+
+    other_updater.roledb.remove_role('targets')
+    other_updater.keydb.clear_keydb()
+    self.assertTrue(self.Repository.roledb.role_exists('targets'))
+    self.assertFalse(other_updater.roledb.role_exists('targets'))
+    self.Repository._rebuild_key_and_role_db()
+    self.assertEqual(len(self.Repository.keydb._keydb_dict), 4)
+    self.assertEqual(len(other_updater.keydb._keydb_dict), 0)
 
 
 
@@ -445,22 +472,22 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
     #  Verify that there was no change in roledb and keydb dictionaries
     #  by checking the number of elements in the dictionaries.
-    self.assertEqual(len(tuf.roledb._roledb_dict), 5)       
-    self.assertEqual(len(tuf.keydb._keydb_dict), 5)
+    self.assertEqual(len(self.Repository.roledb._roledb_dict), 5)       
+    self.assertEqual(len(self.Repository.keydb._keydb_dict), 5)
 
     # Test: normal case, first level delegation.
     self.Repository._import_delegations('targets/delegated_role1')
 
-    self.assertEqual(len(tuf.roledb._roledb_dict), 6)
-    self.assertEqual(len(tuf.keydb._keydb_dict), 6)
+    self.assertEqual(len(self.Repository.roledb._roledb_dict), 6)
+    self.assertEqual(len(self.Repository.keydb._keydb_dict), 6)
 
     #  Verify that roledb dictionary was updated.
-    self.assertTrue('targets/delegated_role1' in tuf.roledb._roledb_dict)
+    self.assertTrue('targets/delegated_role1' in self.Repository.roledb._roledb_dict)
     
     #  Verify that keydb dictionary was updated.
     keyids = self.semi_roledict['targets/delegated_role1']['keyids']
     for keyid in keyids:
-      self.assertTrue(keyid in tuf.keydb._keydb_dict)
+      self.assertTrue(keyid in self.Repository.keydb._keydb_dict)
 
 
 
@@ -508,6 +535,107 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_2__paths_are_consistent_with_hash_prefixes(self):
+    # Setup
+    paths_are_consistent = \
+      self.Repository._paths_are_consistent_with_hash_prefixes
+    path = 'file1.txt'
+    path_hash = self.Repository._get_target_hash(path)
+    other_prefix = '0' if path_hash[0] != '0' else '1'
+
+    # Test: paths whose hashes do or do not start with one of the prefixes.
+    self.assertTrue(paths_are_consistent([path], [other_prefix,
+                                                  path_hash[:2]]))
+    self.assertFalse(paths_are_consistent([path], [other_prefix]))
+    self.assertFalse(paths_are_consistent([path], []))
+
+    # Test: no paths are not consistent with any prefixes.
+    self.assertFalse(paths_are_consistent([], [other_prefix]))
+
+
+
+
+
+  def test_2__get_target_hashes(self):
+    # Setup
+    memo = updater._TARGET_PATH_HASH_MEMO
+    original_memo_size = tuf.conf.TARGET_PATH_HASH_MEMO_SIZE
+    paths = ['file1.txt', 'file2.txt', u'file\u00e9.txt', 'file1.txt']
+    expected_hashes = [updater._hash_target_path(path, 'sha256')
+                       for path in paths]
+    memo.clear()
+
+    try:
+      # Test: the hashes are computed once, in the order of the paths.
+      self.assertEqual(self.Repository._get_target_hashes(paths),
+                       expected_hashes)
+      self.assertEqual(len(memo), 3)
+      self.assertEqual(self.Repository._get_target_hash(paths[1]),
+                       expected_hashes[1])
+      self.assertEqual(self.Repository._get_target_hashes([]), [])
+
+      # Test: the memo is bounded, and forgets the first paths first.
+      tuf.conf.TARGET_PATH_HASH_MEMO_SIZE = 2
+      memo.clear()
+      self.Repository._get_target_hashes(paths[:3])
+      self.assertEqual(len(memo), 2)
+      self.assertEqual(memo.get(('sha256', paths[0])), None)
+      self.assertEqual(memo.get(('sha256', paths[2])), expected_hashes[2])
+
+      # Test: hashes are not remembered if the memo is disabled.
+      tuf.conf.TARGET_PATH_HASH_MEMO_SIZE = 0
+      memo.clear()
+      self.assertEqual(self.Repository._get_target_hash(paths[0]),
+                       expected_hashes[0])
+      self.assertEqual(len(memo), 0)
+
+    finally:
+      tuf.conf.TARGET_PATH_HASH_MEMO_SIZE = original_memo_size
+      memo.clear()
+
+
+
+
+
+  def test_2__release_rolenames(self):
+    # Setup
+    current_metadata = self.Repository.metadata['current']
+    release_metadata = copy.deepcopy(current_metadata['release'])
+    fileinfo = release_metadata['meta']['root.txt']
+    release_metadata['meta'] = {}
+    for metadata_path in ['root.txt', 'targets.txt', 'targets.txt.gz',
+                          'targets/a.txt', 'targets/a/b.txt',
+                          'targets/a-b.txt', 'targets/a/b/c.txt',
+                          'targets/ab.txt']:
+      release_metadata['meta'][metadata_path] = fileinfo
+    current_metadata['release'] = release_metadata
+
+    # Test: the roles are sorted, and compressed metadata is not a role.
+    rolenames = self.Repository._release_rolenames()
+    self.assertEqual(rolenames, ['root', 'targets', 'targets/a',
+                                 'targets/a-b', 'targets/a/b',
+                                 'targets/a/b/c', 'targets/ab'])
+
+    # Test: the delegated roles that follow a role.
+    delegated_rolenames = self.Repository._delegated_release_rolenames
+    self.assertEqual(delegated_rolenames('targets'), rolenames[2:])
+    self.assertEqual(delegated_rolenames('targets/a'),
+                     ['targets/a/b', 'targets/a/b/c'])
+    self.assertEqual(delegated_rolenames('targets/a/b/c'), [])
+    self.assertEqual(delegated_rolenames('targets/unknown'), [])
+
+    # Test: the index is built once per release version.
+    self.assertTrue(self.Repository._release_rolenames() is rolenames)
+    release_metadata = copy.deepcopy(release_metadata)
+    release_metadata['version'] = release_metadata['version'] + 1
+    del release_metadata['meta']['targets/a/b/c.txt']
+    current_metadata['release'] = release_metadata
+    self.assertEqual(delegated_rolenames('targets/a'), ['targets/a/b'])
+
+
+
+
+
   def test_2__fileinfo_has_changed(self):
     #  Verify that the method returns 'False' if file info was not changed.
     for role in self.role_list:
@@ -653,7 +781,8 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
       'length': compressed_fileinfo['length'],
       'hashes': uncompressed_fileinfo['hashes']
     }
-    _update_metadata('targets', mixed_fileinfo, compression='gzip')
+    _update_metadata('targets', mixed_fileinfo, compression='gzip',
+                     uncompressed_file_length=uncompressed_fileinfo['length'])
     list_of_targets = self.Repository.metadata['current']['targets']['targets']
 
     #  Verify that the added target's path is listed in target's metadata.
@@ -771,6 +900,94 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_3__update_metadata_if_changed_compression(self):
+    # Setup: list two compressed versions of the targets metadata in release.
+    release_meta = self.Repository.metadata['current']['release']['meta']
+    saved_release_meta = release_meta.copy()
+    uncompressed_fileinfo = release_meta['targets.txt']
+    gzip_fileinfo = {'length': 300, 'hashes': {'sha256': 'a'*64}}
+    bzip2_fileinfo = {'length': 200, 'hashes': {'sha256': 'b'*64}}
+    release_meta['targets.txt.gz'] = gzip_fileinfo
+    release_meta['targets.txt.bz2'] = bzip2_fileinfo
+    self.Repository.fileinfo['targets.txt'] = None
+
+    updates = []
+    def _mock_update_metadata(metadata_role, fileinfo, compression=None,
+                              delta_fileinfo=None,
+                              uncompressed_file_length=None):
+      updates.append((metadata_role, fileinfo, compression))
+    self.Repository._update_metadata = _mock_update_metadata
+
+    # Test: the smallest compressed version is downloaded, and verified with
+    # the hashes of the uncompressed file.
+    try:
+      self.Repository._update_metadata_if_changed('targets')
+    finally:
+      del self.Repository._update_metadata
+      release_meta.clear()
+      release_meta.update(saved_release_meta)
+
+    expected_fileinfo = {'length': bzip2_fileinfo['length'],
+                         'hashes': uncompressed_fileinfo['hashes']}
+    self.assertEqual(updates, [('targets', expected_fileinfo, 'bzip2')])
+
+
+
+
+  def test_3__update_metadata_from_delta(self):
+    # Setup: rebuild the targets metadata on the server, and write the delta
+    # from the client's current targets metadata to the new one.
+    targets_keyids = setup.role_keyids['targets']
+    old_targets_data = open(self.targets_filepath, 'rb').read()
+    base_fileinfo = signerlib.get_metadata_file_info(self.targets_filepath)
+    added_target = self._add_target_to_targets_dir(targets_keyids)
+    new_targets_data = open(self.targets_filepath, 'rb').read()
+    uncompressed_fileinfo = \
+      signerlib.get_metadata_file_info(self.targets_filepath)
+
+    def _write_delta(base):
+      delta = {'base': base,
+               'edits': tuf.util.make_delta(old_targets_data,
+                                            new_targets_data)}
+      delta_filepath = self.make_temp_data_file(data=tuf.util.json.dumps(delta))
+      return delta_filepath, signerlib.get_metadata_file_info(delta_filepath)
+
+    delta_filepath, delta_fileinfo = _write_delta(base_fileinfo)
+    _update_metadata = self.Repository._update_metadata
+
+
+    # Test: only the delta is downloaded.
+    downloads = [delta_filepath]
+    self._mock_download_url_to_tempfileobj(downloads)
+    _update_metadata('targets', uncompressed_fileinfo,
+                     delta_fileinfo=delta_fileinfo)
+    self.assertEqual(downloads, [])
+    list_of_targets = self.Repository.metadata['current']['targets']['targets']
+    self.assertTrue(added_target in list_of_targets)
+    current_targets_filepath = os.path.join(self.client_current_dir,
+                                            'targets.txt')
+    self.assertEqual(open(current_targets_filepath, 'rb').read(),
+                     new_targets_data)
+
+
+    # Test: a delta that was not made from the current version of the
+    # metadata is ignored, and the whole file is downloaded.
+    bad_delta_filepath, bad_delta_fileinfo = _write_delta(base_fileinfo)
+    downloads = [bad_delta_filepath, self.targets_filepath]
+    self._mock_download_url_to_tempfileobj(downloads)
+    _update_metadata('targets', uncompressed_fileinfo,
+                     delta_fileinfo=bad_delta_fileinfo)
+    self.assertEqual(downloads, [])
+    self.assertEqual(open(current_targets_filepath, 'rb').read(),
+                     new_targets_data)
+
+    # Restoring server's repository to the initial state.
+    self._remove_target_from_targets_dir(added_target)
+
+
+
+
+
   def test_3__targets_of_role(self):
     # Setup
     targets_dir_content = os.listdir(self.targets_dir)
@@ -828,6 +1045,62 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_4_refresh_not_modified(self):
+    # Setup: a mirror that replies that the timestamp has not changed when
+    # it is asked with the validators of the timestamp it served before.
+    validators_sent = []
+    def _mock_unsafe_download(url, length, temp_file=None, validators=None):
+      validators_sent.append(dict(validators))
+      if validators:
+        raise tuf.NotModifiedError(url)
+      validators['etag'] = '"1"'
+      temp_file.write(open(self.timestamp_filepath, 'rb').read())
+      return temp_file
+    tuf.download.unsafe_download = _mock_unsafe_download
+
+    updates = []
+    def _mock_update_metadata_if_changed(metadata_role,
+                                         referenced_metadata='release'):
+      updates.append(metadata_role)
+    expiration_checks = []
+    def _mock_ensure_not_expired(metadata_role):
+      expiration_checks.append(metadata_role)
+    self.Repository._update_metadata_if_changed = \
+      _mock_update_metadata_if_changed
+    self.Repository._ensure_not_expired = _mock_ensure_not_expired
+
+    try:
+      # Test: the timestamp has changed, so the other roles are updated.
+      self.Repository.refresh()
+      self.assertEqual(validators_sent, [{}])
+      self.assertEqual(updates, ['release', 'root', 'targets'])
+      self.assertTrue(self.Repository.refresh_completed)
+
+      # Test: the timestamp has not changed, and the other roles are not
+      # updated, but their expiration is still checked.
+      updates = []
+      expiration_checks = []
+      self.Repository.refresh()
+      self.assertEqual(validators_sent[-1], {'etag': '"1"'})
+      self.assertEqual(updates, [])
+      self.assertEqual(sorted(expiration_checks),
+                       ['release', 'root', 'targets', 'timestamp'])
+
+      # Test: the last refresh failed midway, so the other roles are updated
+      # even though the timestamp has not changed.
+      self.Repository.refresh_completed = False
+      self.Repository.refresh()
+      self.assertEqual(updates, ['release', 'root', 'targets'])
+
+    finally:
+      del self.Repository._update_metadata_if_changed
+      del self.Repository._ensure_not_expired
+      self._mock_download_url_to_tempfileobj(self.timestamp_filepath)
+
+
+
+
+
   def test_4__refresh_targets_metadata(self):
     
     # To test this method a target file would be added to a delegated role,
@@ -836,9 +1109,9 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     targets_deleg_dir2 = os.path.join(targets_deleg_dir1, 'delegated_level2')
     shutil.rmtree(self.server_meta_dir)
     shutil.rmtree(os.path.join(self.server_repo_dir, 'keystore'))
-    tuf.roledb._roledb_dict['targets/delegated_role1'] = \
+    self.Repository.roledb._roledb_dict['targets/delegated_role1'] = \
         self.semi_roledict['targets/delegated_role1'] 
-    tuf.roledb._roledb_dict['targets/delegated_role1/delegated_role2'] = \
+    self.Repository.roledb._roledb_dict['targets/delegated_role1/delegated_role2'] = \
         self.semi_roledict['targets/delegated_role1/delegated_role2']
 
     #  Delegated roles paths.
@@ -888,9 +1161,92 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_4__refresh_targets_metadata_release_deltas(self):
+    # Release metadata also lists the deltas and the compressed versions of
+    # delegated metadata, which are not roles.
+    current_metadata = self.Repository.metadata['current']
+    release_metadata = copy.deepcopy(current_metadata['release'])
+    fileinfo = release_metadata['meta']['root.txt']
+    role1 = 'targets/delegated_role1'
+    role2 = 'targets/delegated_role1/delegated_role2'
+    for metadata_path in [role1+'.txt', role1+'.txt.delta',
+                          role1+'.txt.gz', role2+'.txt', role2+'.txt.delta']:
+      release_metadata['meta'][metadata_path] = fileinfo
+    current_metadata['release'] = release_metadata
+
+    updated_rolenames = []
+    def _mock_update_metadata_if_changed(metadata_role, **kwargs):
+      updated_rolenames.append(metadata_role)
+
+    self.Repository._load_metadata_from_file = lambda set, rolename: None
+    self.Repository._update_metadata_if_changed = \
+      _mock_update_metadata_if_changed
+    self.Repository._ensure_not_expired = lambda rolename: None
+
+    # Test: only the delegated roles are refreshed.
+    try:
+      self.Repository._refresh_targets_metadata(include_delegations=True)
+    finally:
+      del self.Repository._load_metadata_from_file
+      del self.Repository._update_metadata_if_changed
+      del self.Repository._ensure_not_expired
+    self.assertEqual(updated_rolenames, [role1, role2])
+
+
+
+
+
+  def test_4__refresh_targets_metadata_concurrently(self):
+    # The metadata of a role may be refreshed by several threads at once
+    # (e.g., by a prefetch and by the walk of the delegations).
+    role1 = 'targets/delegated_role1'
+    role2 = 'targets/delegated_role1/delegated_role2'
+    active_refreshes = {role1: 0, role2: 0}
+    concurrent_refreshes = {role1: 0, role2: 0}
+    counter_lock = threading.Lock()
+    def _mock_update_metadata_if_changed(metadata_role, **kwargs):
+      with counter_lock:
+        active_refreshes[metadata_role] += 1
+        concurrent_refreshes[metadata_role] = \
+          max(concurrent_refreshes[metadata_role],
+              active_refreshes[metadata_role])
+      time.sleep(0.05)
+      with counter_lock:
+        active_refreshes[metadata_role] -= 1
+
+    self.Repository._load_metadata_from_file = lambda set, rolename: None
+    self.Repository._update_metadata_if_changed = \
+      _mock_update_metadata_if_changed
+    self.Repository._ensure_not_expired = lambda rolename: None
+
+    # Test: the refreshes of the same role are serialized, and those of
+    # different roles are not.
+    refresh_threads = []
+    for rolename in [role1, role1, role1, role2]:
+      refresh_thread = threading.Thread(
+        target=self.Repository._refresh_targets_metadata, args=(rolename,))
+      refresh_thread.start()
+      refresh_threads.append(refresh_thread)
+    try:
+      for refresh_thread in refresh_threads:
+        refresh_thread.join()
+    finally:
+      del self.Repository._load_metadata_from_file
+      del self.Repository._update_metadata_if_changed
+      del self.Repository._ensure_not_expired
+    self.assertEqual(concurrent_refreshes, {role1: 1, role2: 1})
+    self.assertTrue(self.Repository._role_lock(role1) is
+                    self.Repository._role_lock(role1))
+    self.assertFalse(self.Repository._role_lock(role1) is
+                     self.Repository._role_lock(role2))
+
+
+
+
+
   def test_5_all_targets(self):
    
-   # As with '_refresh_targets_metadata()', tuf.roledb._roledb_dict
+   # As with '_refresh_targets_metadata()', the role database of the updater
    # has to be populated.  The 'tuf.download.safe_download' method
    # should be patched.  The 'self.all_role_paths' argument is passed so that
    # the top-level roles and delegations may be all "downloaded" when
@@ -973,6 +1329,176 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_6_target_prefetch(self):
+    # Setup
+    target_filepaths = [target_filepath for target_filepath in
+                        os.listdir(self.targets_dir)
+                        if target_filepath.endswith('.txt')]
+    original_prefetch_window = tuf.conf.DELEGATION_PREFETCH_WINDOW
+    tuf.conf.DELEGATION_PREFETCH_WINDOW = 2
+
+    try:
+      # Test: the same targets are found when prefetching.
+      for target_filepath in target_filepaths:
+        target_info = self.Repository.target(target_filepath)
+        self.assertTrue(tuf.formats.TARGETFILE_SCHEMA.matches(target_info))
+      self.assertRaises(tuf.UnknownTargetError, self.Repository.target,
+                        self.random_path())
+
+      # Test: the next roles to visit, at the top of the stack, are
+      # prefetched, up to the window, and each role only once.
+      prefetched_roles = []
+      def _mock_refresh_targets_metadata(rolename, include_delegations=False,
+                                         speculative=False):
+        self.assertTrue(speculative)
+        prefetched_roles.append(rolename)
+        raise tuf.RepositoryError(rolename)
+      self.Repository._refresh_targets_metadata = \
+        _mock_refresh_targets_metadata
+      prefetch_threads = {}
+      role_names = ['targets/role1', 'targets/role2', 'targets/role3']
+      self.Repository._prefetch_delegated_roles(role_names, prefetch_threads)
+      for prefetch_thread in prefetch_threads.values():
+        prefetch_thread.join()
+      self.assertEqual(sorted(prefetched_roles),
+                       ['targets/role2', 'targets/role3'])
+
+      #  Visit 'targets/role3'.
+      prefetch_threads.pop(role_names.pop(-1))
+      self.Repository._prefetch_delegated_roles(role_names, prefetch_threads)
+      for prefetch_thread in prefetch_threads.values():
+        prefetch_thread.join()
+      self.assertEqual(sorted(prefetched_roles),
+                       ['targets/role1', 'targets/role2', 'targets/role3'])
+
+      # Test: nothing is prefetched if the window is 0.
+      tuf.conf.DELEGATION_PREFETCH_WINDOW = 0
+      prefetched_roles = []
+      self.Repository._prefetch_delegated_roles(role_names, {})
+      self.assertEqual(prefetched_roles, [])
+
+      # Test: a role whose metadata could not be prefetched is left in the
+      # metadata store and the role database.
+      del self.Repository._refresh_targets_metadata
+      tuf.conf.DELEGATION_PREFETCH_WINDOW = 2
+      role_name = 'targets/delegated_role1'
+      current_metadata = \
+        tuf.util.load_json_file(self.delegated_filepath1)['signed']
+      self.Repository.metadata['current'][role_name] = current_metadata
+      self.Repository.roledb._roledb_dict[role_name] = \
+        self.semi_roledict[role_name]
+      self.assertTrue(role_name+'.txt' in
+                      self.Repository.metadata['current']['release']['meta'])
+      def _mock_update_metadata(metadata_role, **kwargs):
+        raise tuf.NoWorkingMirrorError({})
+      self.Repository._fileinfo_has_changed = lambda filename, fileinfo: True
+      self.Repository._update_metadata = _mock_update_metadata
+      prefetch_threads = {}
+      self.Repository._prefetch_delegated_roles([role_name], prefetch_threads)
+      prefetch_threads[role_name].join()
+      self.assertTrue(self.Repository.roledb.role_exists(role_name))
+      self.assertEqual(self.Repository.metadata['current'][role_name],
+                       current_metadata)
+
+      # Test: a prefetch and a refresh of the same role by the caller do not
+      # change its metadata at the same time.
+      del self.Repository._fileinfo_has_changed
+      del self.Repository._update_metadata
+      active_refreshes = []
+      refresh_modes = []
+      def _mock_update_metadata_if_changed(metadata_role, **kwargs):
+        refresh_modes.append(kwargs.get('speculative', False))
+        active_refreshes.append(metadata_role)
+        self.assertEqual(active_refreshes, [metadata_role])
+        time.sleep(0.05)
+        active_refreshes.remove(metadata_role)
+      self.Repository._update_metadata_if_changed = \
+        _mock_update_metadata_if_changed
+      prefetch_threads = {}
+      self.Repository._prefetch_delegated_roles([role_name], prefetch_threads)
+      self.Repository._refresh_targets_metadata(role_name)
+      prefetch_threads[role_name].join()
+      self.assertEqual(sorted(refresh_modes), [False, True])
+      self.assertEqual(active_refreshes, [])
+
+    finally:
+      tuf.conf.DELEGATION_PREFETCH_WINDOW = original_prefetch_window
+      for method_name in ['_refresh_targets_metadata', '_fileinfo_has_changed',
+                          '_update_metadata', '_update_metadata_if_changed']:
+        if method_name in self.Repository.__dict__:
+          delattr(self.Repository, method_name)
+
+
+
+
+
+  def test_6_targets(self):
+    # Setup
+    target_filepaths = [target_filepath for target_filepath in
+                        os.listdir(self.targets_dir)
+                        if target_filepath.endswith('.txt')]
+    missing_filepath = self.random_path()
+
+
+    # Test: normal case.
+    found_targets = self.Repository.targets(target_filepaths+[missing_filepath])
+    self.assertEqual(sorted(found_targets),
+                     sorted(target_filepaths+[missing_filepath]))
+    for target_filepath in target_filepaths:
+      self.assertEqual(found_targets[target_filepath],
+                       self.Repository.target(target_filepath))
+    self.assertEqual(found_targets[missing_filepath], None)
+    self.assertEqual(self.Repository.targets([]), {})
+
+    # Test: the metadata of several roles is refreshed together, and the
+    # error of the first role that failed is raised.
+    refreshed_roles = []
+    def _mock_refresh_targets_metadata(rolename):
+      refreshed_roles.append(rolename)
+      if rolename != 'targets/role1':
+        raise tuf.RepositoryError(rolename)
+    self.Repository._refresh_targets_metadata = _mock_refresh_targets_metadata
+    try:
+      self.Repository._refresh_delegated_roles(['targets/role1'])
+      self.assertRaises(tuf.RepositoryError,
+                        self.Repository._refresh_delegated_roles,
+                        ['targets/role1', 'targets/role2', 'targets/role3'])
+      self.assertEqual(sorted(refreshed_roles), ['targets/role1',
+                       'targets/role1', 'targets/role2', 'targets/role3'])
+      try:
+        self.Repository._refresh_delegated_roles(['targets/role3',
+                                                  'targets/role2'])
+      except tuf.RepositoryError, exception:
+        self.assertEqual(str(exception), 'targets/role3')
+
+    finally:
+      del self.Repository._refresh_targets_metadata
+
+    # Test: target() and targets() both raise an error if the metadata of a
+    # role they must interrogate is missing from the release metadata.
+    current_metadata = self.Repository.metadata['current']
+    original_release_metadata = current_metadata['release']
+    release_metadata = copy.deepcopy(original_release_metadata)
+    del release_metadata['meta']['targets/delegated_role1.txt']
+    current_metadata['release'] = release_metadata
+    current_metadata.pop('targets/delegated_role1', None)
+    delegated_filepath = 'delegated_level1/'+self.random_string()
+    try:
+      self.assertRaises(tuf.RepositoryError, self.Repository.target,
+                        delegated_filepath)
+      self.assertRaises(tuf.RepositoryError, self.Repository.targets,
+                        [delegated_filepath])
+    finally:
+      current_metadata['release'] = original_release_metadata
+
+    # Test: invalid arguments.
+    self.assertRaises(tuf.FormatError, self.Repository.targets,
+                      self.random_path())
+
+
+
+
+
 
   def test_6_download_target(self):
     
@@ -1027,11 +1553,374 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+
+  def test_6_download_target_from_cache(self):
+    # Setup: an updater with a target cache.
+    original_target_cache_size = tuf.conf.TARGET_CACHE_SIZE
+    original_target_cache_hardlinks = tuf.conf.TARGET_HARDLINKS
+    tuf.conf.TARGET_CACHE_SIZE = 1024 * 1024
+    repository = updater.Updater('Client_Repository', self.mirrors)
+    file_path = self._get_list_of_target_paths(self.targets_dir)[0]
+    target_info = repository.target(file_path)
+    dest_dir1 = self.make_temp_directory()
+    dest_dir2 = self.make_temp_directory()
+    dest_dir3 = self.make_temp_directory()
+
+    try:
+      # Test: the first download adds the target to the cache.
+      self._mock_download_url_to_tempfileobj(os.path.join(self.targets_dir,
+                                                          file_path))
+      repository.download_target(target_info, dest_dir1)
+      digest = target_info['fileinfo']['hashes']['sha256']
+      cached_filepath = os.path.join(repository.target_cache.directory,
+                                     digest[:2], digest)
+      self.assertTrue(os.path.exists(cached_filepath))
+
+      # Test: the next downloads are served from the cache, by hardlink or
+      # copy, without downloading anything.
+      self._mock_download_url_to_tempfileobj([])
+      repository.download_target(target_info, dest_dir2)
+      destination2 = os.path.join(dest_dir2, file_path)
+      self.assertEqual(os.stat(destination2).st_ino,
+                       os.stat(cached_filepath).st_ino)
+
+      tuf.conf.TARGET_HARDLINKS = False
+      repository.download_target(target_info, dest_dir3)
+      destination3 = os.path.join(dest_dir3, file_path)
+      self.assertNotEqual(os.stat(destination3).st_ino,
+                          os.stat(cached_filepath).st_ino)
+      self.assertEqual(open(destination3, 'rb').read(),
+                       open(os.path.join(self.targets_dir, file_path),
+                            'rb').read())
+
+      # Test: a cached file that was modified is removed, and the target
+      # downloaded again.
+      cached_file = open(destination2, 'ab')
+      cached_file.write('modified')
+      cached_file.close()
+      self.assertRaises(tuf.NoWorkingMirrorError, repository.download_target,
+                        target_info, dest_dir3)
+      self.assertFalse(os.path.exists(cached_filepath))
+
+      # Test: the least recently used files are evicted.
+      target_cache_directory = self.make_temp_directory()
+      target_cache = updater.TargetCache(target_cache_directory, 20)
+      all_hashes = []
+      for index, data in enumerate(['a' * 10, 'b' * 10, 'c' * 10]):
+        filepath = self.make_temp_data_file(data=data)
+        hashes = tuf.util.get_file_details(filepath)[1]
+        all_hashes.append(hashes)
+        target_cache.add(hashes, filepath)
+        os.utime(target_cache._get_cached_filepath(hashes),
+                 (index, index))
+        if index == 1:
+          # Use the first file, so that the second is evicted instead.
+          self.assertTrue(target_cache.get(10, all_hashes[0],
+                                           self.make_temp_file()))
+      self.assertTrue(target_cache.get(10, all_hashes[0],
+                                       self.make_temp_file()))
+      self.assertFalse(target_cache.get(10, all_hashes[1],
+                                        self.make_temp_file()))
+      self.assertEqual(sum(len(filenames) for dirpath, dirnames, filenames in
+                           os.walk(target_cache.directory)), 2)
+      self.assertEqual(target_cache._total_size, 20)
+
+      # Test: a new cache indexes the cached files by modification time, and
+      # files are not looked for on disk when another is added.
+      os.utime(target_cache._get_cached_filepath(all_hashes[0]), (0, 0))
+      target_cache = updater.TargetCache(target_cache_directory, 20)
+      self.assertEqual(target_cache._total_size, 20)
+      original_walk = os.walk
+      def _mock_walk(*args, **kwargs):
+        raise AssertionError('The target cache directory was walked.')
+      os.walk = _mock_walk
+      try:
+        target_cache.add(all_hashes[1],
+                         self.make_temp_data_file(data='b' * 10))
+      finally:
+        os.walk = original_walk
+      self.assertFalse(target_cache.get(10, all_hashes[0],
+                                        self.make_temp_file()))
+      self.assertTrue(target_cache.get(10, all_hashes[2],
+                                       self.make_temp_file()))
+
+      # Test: only the sha256 digest of a cached file is verified.
+      hashes = dict(all_hashes[2], md7='0' * 32)
+      self.assertTrue(target_cache.get(10, hashes, self.make_temp_file()))
+
+      # Test: a cached file that cannot be removed is a cache miss.
+      cached_filepath = target_cache._get_cached_filepath(all_hashes[2])
+      os.remove(cached_filepath)
+      os.mkdir(cached_filepath)
+      self.assertFalse(target_cache.get(10, all_hashes[2],
+                                        self.make_temp_file()))
+      self.assertEqual(target_cache._total_size, 10)
+
+    finally:
+      tuf.conf.TARGET_CACHE_SIZE = original_target_cache_size
+      tuf.conf.TARGET_HARDLINKS = original_target_cache_hardlinks
+
+
+
+
+  def test_6_download_targets(self):
+    # Setup: every target is served from the server's targets directory.
+    target_rel_paths_src = self._get_list_of_target_paths(self.targets_dir)
+    targets = [self.Repository.target(file_path)
+               for file_path in target_rel_paths_src]
+    dest_dir = self.make_temp_directory()
+
+    def _mock_download(url, length, temp_file=None, validators=None):
+      file_path = url.split('/targets/', 1)[1]
+      temp_file.write(open(os.path.join(self.targets_dir, file_path),
+                           'rb').read())
+      return temp_file
+    tuf.download.safe_download = _mock_download
+
+
+    # Test: normal case.
+    self.Repository.download_targets(targets, dest_dir, concurrency=3)
+    self.assertEqual(sorted(self._get_list_of_target_paths(dest_dir)),
+                     sorted(target_rel_paths_src))
+
+
+    # Test: a target that fails does not stop the others.
+    bad_target = {'filepath': self.random_path(),
+                  'fileinfo': {'length': 1, 'hashes': {'sha256': 'a'*64}}}
+    dest_dir = self.make_temp_directory()
+    try:
+      self.Repository.download_targets(targets + [bad_target], dest_dir)
+    except tuf.DownloadTargetsError, exception:
+      self.assertEqual(exception.target_errors.keys(),
+                       [bad_target['filepath']])
+    else:
+      self.fail('Expected tuf.DownloadTargetsError.')
+    self.assertEqual(sorted(self._get_list_of_target_paths(dest_dir)),
+                     sorted(target_rel_paths_src))
+
+    self.assertRaises(tuf.FormatError, self.Repository.download_targets,
+                      [bad_target['filepath']], dest_dir)
+
+
+    # Test: targets with the same content are downloaded once, and hardlinked
+    # to their other paths.
+    downloaded_urls = []
+    def _mock_recorded_download(url, length, temp_file=None, validators=None):
+      downloaded_urls.append(url)
+      return _mock_download(url, length, temp_file, validators)
+    tuf.download.safe_download = _mock_recorded_download
+    target = targets[0]
+    alias_target = {'filepath': os.path.join('aliases', target['filepath']),
+                    'fileinfo': target['fileinfo']}
+    dest_dir = self.make_temp_directory()
+    self.Repository.download_targets([target, alias_target], dest_dir)
+    self.assertEqual(len(downloaded_urls), 1)
+    destination = os.path.join(dest_dir, target['filepath'])
+    alias_destination = os.path.join(dest_dir, alias_target['filepath'])
+    self.assertEqual(os.stat(destination).st_ino,
+                     os.stat(alias_destination).st_ino)
+
+    #  Removing a target (e.g., by remove_obsolete_targets()) leaves the
+    #  others with the same content.
+    os.remove(destination)
+    self.assertEqual(open(alias_destination, 'rb').read(),
+                     open(os.path.join(self.targets_dir, target['filepath']),
+                          'rb').read())
+
+
+
+
+
+  def test_6_download_compressed_target(self):
+    # Setup: a target that is also served compressed with gzip.  The mocked
+    # downloads serve a compressible target in its stead.
+    target_filepath = self._get_list_of_target_paths(self.targets_dir)[0]
+    target_info = self.Repository.target(target_filepath)
+    target_data = self.random_string() * 100
+    digest_object = tuf.hash.digest('sha256')
+    digest_object.update(target_data)
+    compressed_data = StringIO.StringIO()
+    gzip_fileobj = gzip.GzipFile(fileobj=compressed_data, mode='wb')
+    gzip_fileobj.write(target_data)
+    gzip_fileobj.close()
+    compressed_data = compressed_data.getvalue()
+    target_info['fileinfo'] = \
+      tuf.formats.make_fileinfo(len(target_data),
+                                {'sha256': digest_object.hexdigest()},
+                                compressions={'gzip':
+                                                {'length': len(compressed_data)},
+                                              'zip': {'length': 1}})
+
+    downloaded_urls = []
+    def _mock_download(compressed_output):
+      def _download(url, length, temp_file=None):
+        downloaded_urls.append(url)
+        temp_file.seek(0)
+        temp_file.truncate()
+        if url.endswith('.gz'):
+          temp_file.write(compressed_output)
+        else:
+          temp_file.write(target_data)
+        return temp_file
+      tuf.download.safe_download = _download
+
+    dest_dir = self.make_temp_directory()
+    dest_path = os.path.join(dest_dir, target_filepath)
+
+    # Test: the compressed version is downloaded, and stored decompressed.
+    _mock_download(compressed_data)
+    self.Repository.download_target(target_info, dest_dir)
+    self.assertEqual(len(downloaded_urls), 1)
+    self.assertTrue(downloaded_urls[0].endswith(target_filepath+'.gz'))
+    self.assertEqual(target_data, open(dest_path, 'rb').read())
+
+    # Test: an invalid compressed version is rejected, and the target is
+    # downloaded uncompressed instead.
+    del downloaded_urls[:]
+    os.remove(dest_path)
+    # Corrupt the CRC-32 in the gzip trailer.
+    _mock_download(compressed_data[:-8]+chr(ord(compressed_data[-8]) ^ 1)+
+                   compressed_data[-7:])
+    self.Repository.download_target(target_info, dest_dir)
+    self.assertTrue(downloaded_urls[-1].endswith(target_filepath))
+    self.assertEqual(target_data, open(dest_path, 'rb').read())
+
+    # Test: a compressed version that decompresses to more than the length
+    # of the target is rejected while it is downloaded.
+    del downloaded_urls[:]
+    os.remove(dest_path)
+    bomb_data = StringIO.StringIO()
+    gzip_fileobj = gzip.GzipFile(fileobj=bomb_data, mode='wb')
+    gzip_fileobj.write(target_data * 1000)
+    gzip_fileobj.close()
+    _mock_download(bomb_data.getvalue())
+    self.Repository.download_target(target_info, dest_dir)
+    self.assertTrue(downloaded_urls[0].endswith(target_filepath+'.gz'))
+    self.assertTrue(downloaded_urls[-1].endswith(target_filepath))
+    self.assertEqual(target_data, open(dest_path, 'rb').read())
+
+
+
+
+
+  def test_6_get_target_file(self):
+    # Setup: a second mirror, and a target that the first mirror fails to
+    # deliver in full.
+    target_filepath = self._get_list_of_target_paths(self.targets_dir)[0]
+    target_info = self.Repository.target(target_filepath)
+    target_length = target_info['fileinfo']['length']
+    target_hashes = target_info['fileinfo']['hashes']
+    target_fileobj = open(os.path.join(self.targets_dir, target_filepath), 'rb')
+    target_data = target_fileobj.read()
+    target_fileobj.close()
+    half = len(target_data) // 2
+
+    mirrors = {}
+    for mirror_name in ['mirror1', 'mirror2']:
+      mirrors[mirror_name] = self.mirrors['mirror1'].copy()
+      mirrors[mirror_name]['url_prefix'] = 'http://'+mirror_name+'.com'
+    self.Repository.mirrors = mirrors
+
+    def _mock_download_with_interruption(prefix):
+      # Every call records the offset it was asked to resume from.  The first
+      # call delivers 'prefix' and then drops the transfer.
+      offsets = []
+      def _mock_download(url, length, temp_file=None):
+        offset = temp_file.get_compressed_length()
+        offsets.append(offset)
+        temp_file.seek(offset)
+        if len(offsets) == 1:
+          temp_file.write(prefix)
+          raise tuf.SlowRetrievalError(0)
+        temp_file.write(target_data[offset:])
+        return temp_file
+      tuf.download.safe_download = _mock_download
+      return offsets
+
+
+    # Test: the second mirror resumes where the first one stopped.
+    offsets = _mock_download_with_interruption(target_data[:half])
+    file_object = self.Repository.get_target_file(target_filepath,
+                                                  target_length, target_hashes)
+    self.assertEquals(offsets, [0, half])
+    self.assertEquals(file_object.read(), target_data)
+    file_object.close_temp_file()
+
+    # Test: a bad prefix from the first mirror spoils the resumed file, which
+    # is then downloaded again, from the first byte, from the second mirror.
+    offsets = _mock_download_with_interruption('x'*half)
+    file_object = self.Repository.get_target_file(target_filepath,
+                                                  target_length, target_hashes)
+    self.assertEquals(offsets, [0, half, 0])
+    self.assertEquals(file_object.read(), target_data)
+    file_object.close_temp_file()
+
+
+
+
+
+  def test_6_get_target_file_in_segments(self):
+    target_filepath = self._get_list_of_target_paths(self.targets_dir)[0]
+    target_info = self.Repository.target(target_filepath)
+    target_length = target_info['fileinfo']['length']
+    target_hashes = target_info['fileinfo']['hashes']
+    target_path = os.path.join(self.targets_dir, target_filepath)
+    segmented_downloads = []
+
+    def _mock_segmented_download(output):
+      def _mock_download(urls, length, segment_count):
+        segmented_downloads.append(segment_count)
+        temp_fileobj = tuf.util.TempFile()
+        temp_fileobj.write(output)
+        return temp_fileobj
+      tuf.download.safe_segmented_download = _mock_download
+
+    original_threshold = tuf.conf.SEGMENTED_DOWNLOAD_THRESHOLD
+    tuf.conf.SEGMENTED_DOWNLOAD_THRESHOLD = target_length
+    try:
+      # Test: a target at the threshold is downloaded in segments.
+      target_fileobj = open(target_path, 'rb')
+      _mock_segmented_download(target_fileobj.read())
+      target_fileobj.close()
+      self._mock_download_url_to_tempfileobj(self.random_path())
+      file_object = self.Repository.get_target_file(target_filepath,
+                                                    target_length,
+                                                    target_hashes)
+      self.assertEquals(segmented_downloads,
+                        [tuf.conf.SEGMENTED_DOWNLOAD_COUNT])
+      file_object.close_temp_file()
+
+      # Test: an invalid assembled file is downloaded in a single stream.
+      _mock_segmented_download(self.random_string())
+      self._mock_download_url_to_tempfileobj(target_path)
+      file_object = self.Repository.get_target_file(target_filepath,
+                                                    target_length,
+                                                    target_hashes)
+      self.assertEquals(len(segmented_downloads), 2)
+      self.assertEquals(file_object.read(), open(target_path, 'rb').read())
+      file_object.close_temp_file()
+
+      # Test: a target below the threshold is never downloaded in segments.
+      tuf.conf.SEGMENTED_DOWNLOAD_THRESHOLD = target_length+1
+      file_object = self.Repository.get_target_file(target_filepath,
+                                                    target_length,
+                                                    target_hashes)
+      self.assertEquals(len(segmented_downloads), 2)
+      file_object.close_temp_file()
+
+    finally:
+      tuf.conf.SEGMENTED_DOWNLOAD_THRESHOLD = original_threshold
+      tuf.download.safe_segmented_download = original_safe_segmented_download
+
+
+
+
+
   def test_7_updated_targets(self):
     
     # In this test, client will have two target files.  Server will modify 
-    # one of them.  As with 'all_targets' function, tuf.roledb._roledb_dict
-    # has to be populated.  'tuf.download.safe_download' method
+    # one of them.  As with 'all_targets' function, the role database of the
+    # updater has to be populated.  'tuf.download.safe_download' method
     # should be patched.
     target_rel_paths_src = self._get_list_of_target_paths(self.targets_dir)
 
@@ -1125,23 +2014,461 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     all_targets = self.Repository.all_targets()
     
 
+    # Test: a dry run reports the obsolete files, but does not remove them.
+    obsolete_targets = sorted([target_rel_paths_src[0],
+                               target_rel_paths_src[3]])
+    report = self.Repository.remove_obsolete_targets(dest_dir, dry_run=True)
+    self.assertEqual(report, {'removed': obsolete_targets, 'missing': [],
+                              'errors': {}})
+    for target_path in obsolete_targets:
+      self.assertTrue(os.path.exists(os.path.join(dest_dir, target_path)))
+
     # Test: normal case.
     #  Verify number of target files in the 'dest_dir' (should be 4),
     #  and execute 'remove_obsolete_targets' function.
     self.assertTrue(os.listdir(dest_dir), 4)
-    self.Repository.remove_obsolete_targets(dest_dir)
+    report = self.Repository.remove_obsolete_targets(dest_dir)
+    self.assertEqual(report['removed'], obsolete_targets)
 
     #  Verify that number of target files in the 'dest_dir' is now 2, since
     #  two files were previously removed.
     self.assertTrue(os.listdir(dest_dir), 2)
     self.assertTrue(os.path.join(dest_dir), target_rel_paths_src[1])
     self.assertTrue(os.path.join(dest_dir), target_rel_paths_src[2])
+    for target_path in obsolete_targets:
+      self.assertFalse(os.path.exists(os.path.join(dest_dir, target_path)))
 
     #  Verify that if there are no obsolete files, the number of files,
     #  in the 'dest_dir' remains the same.
-    self.Repository.remove_obsolete_targets(dest_dir)
+    report = self.Repository.remove_obsolete_targets(dest_dir)
+    self.assertEqual(report['removed'], [])
+    self.assertEqual(report['missing'], obsolete_targets)
     self.assertTrue(os.listdir(dest_dir), 2)    
 
+    # Test: a target that moved to another role is not obsolete.
+    current_metadata = self.Repository.metadata['current']
+    previous_metadata = self.Repository.metadata['previous']
+    moved_target = target_rel_paths_src[1]
+    for role in self.Repository.roledb.get_rolenames():
+      if moved_target in current_metadata.get(role, {}).get('targets', {}):
+        break
+    other_role = [rolename for rolename in current_metadata
+                  if rolename.startswith('targets') and rolename != role][0]
+    previous_metadata[role] = copy.deepcopy(current_metadata[role])
+    previous_metadata[other_role] = copy.deepcopy(current_metadata[other_role])
+    current_metadata[other_role]['targets'][moved_target] = \
+      current_metadata[role]['targets'].pop(moved_target)
+    report = self.Repository.remove_obsolete_targets(dest_dir)
+    self.assertEqual(report['removed'], [])
+    self.assertTrue(os.path.exists(os.path.join(dest_dir, moved_target)))
+
+    # Test: the targets of a delegated role removed from the repository are
+    # obsolete, while those of a role that could not be updated, or whose
+    # metadata has expired, are kept.
+    removed_role = 'targets/delegated_role1/removed_role'
+    failed_role = 'targets/delegated_role1'
+    expired_role = 'targets/delegated_role1/delegated_role2'
+    self.assertFalse(self.Repository._delegation_removed(failed_role))
+    self.assertFalse(self.Repository._delegation_removed(expired_role))
+    self.assertTrue(self.Repository._delegation_removed(removed_role))
+    fileinfo = current_metadata[role]['targets'].values()[0]
+    current_metadata[removed_role] = copy.deepcopy(current_metadata[role])
+    current_metadata[removed_role]['targets'] = {}
+    role_targets = {}
+    for rolename in [removed_role, failed_role, expired_role]:
+      target_path = os.path.basename(self.random_path())
+      open(os.path.join(dest_dir, target_path), 'w').close()
+      previous_metadata[rolename] = copy.deepcopy(current_metadata[rolename])
+      previous_metadata[rolename]['targets'][target_path] = fileinfo
+      role_targets[rolename] = target_path
+    del current_metadata[failed_role]
+    self.Repository.roledb.remove_role(expired_role)
+    report = self.Repository.remove_obsolete_targets(dest_dir)
+    self.assertEqual(report['removed'], [role_targets[removed_role]])
+    self.assertTrue(os.path.exists(os.path.join(dest_dir,
+                                                role_targets[failed_role])))
+    self.assertTrue(os.path.exists(os.path.join(dest_dir,
+                                                role_targets[expired_role])))
+
+    #  The metadata of a removed role that this updater has not loaded is
+    #  read from the client's metadata directory.
+    removed_filepath = os.path.join(self.client_current_dir,
+                                    removed_role+'.txt')
+    tuf.util.ensure_parent_dir(removed_filepath)
+    removed_signable = tuf.formats.make_signable(
+      previous_metadata.pop(removed_role))
+    del current_metadata[removed_role]
+    signerlib.write_metadata_file(removed_signable, removed_filepath)
+    open(os.path.join(dest_dir, role_targets[removed_role]), 'w').close()
+    try:
+      report = self.Repository.remove_obsolete_targets(dest_dir)
+    finally:
+      os.remove(removed_filepath)
+    self.assertEqual(report['removed'], [role_targets[removed_role]])
+
+    # Test: invalid arguments.
+    self.assertRaises(tuf.FormatError,
+                      self.Repository.remove_obsolete_targets, dest_dir,
+                      dry_run='yes')
+
+
+
+
+
+  def test_9_snapshot(self):
+    # Setup: the snapshot of the metadata loaded from disk.
+    old_snapshot = self.Repository.snapshot()
+    self.assertEqual(old_snapshot.epoch, 1)
+
+    #  Publishing unchanged metadata does not create a new snapshot.
+    self.Repository._publish_snapshot()
+    self.assertTrue(self.Repository.snapshot() is old_snapshot)
+
+    #  Add a target on the server and refresh.
+    target_fullpath = self._add_file_to_directory(self.targets_dir)
+    target_relpath = os.path.basename(target_fullpath)
+    self._mock_download_url_to_tempfileobj(self.all_role_paths)
+    setup.build_server_repository(self.server_repo_dir, self.targets_dir)
+
+    try:
+      self.Repository.refresh()
+
+      # Test: the refresh published a new epoch with the new target, while
+      # the previous snapshot is unchanged.
+      snapshot = self.Repository.snapshot()
+      self.assertEqual(snapshot.epoch, 2)
+      target_info = snapshot.target(target_relpath)
+      self.assertTrue(tuf.formats.TARGETFILE_SCHEMA.matches(target_info))
+      self.assertRaises(tuf.UnknownTargetError, old_snapshot.target,
+                        target_relpath)
+
+      # Test: the snapshot is a copy of the updater's metadata.
+      targets_metadata = self.Repository.metadata['current']['targets']
+      self.assertEqual(snapshot.metadata['targets'], targets_metadata)
+      self.assertFalse(snapshot.metadata['targets'] is targets_metadata)
+
+      # Test: delegated roles appear once the updater has loaded them.
+      self.assertEqual(len(snapshot.all_targets()),
+                       len(self.Repository.targets_of_role('targets')))
+      self.assertEqual(len(self.Repository.all_targets()),
+                       len(self.Repository.snapshot().all_targets()))
+      self.assertEqual(self.Repository.snapshot().epoch, 3)
+      self.assertTrue(self.Repository.snapshot().metadata['root'] is
+                      snapshot.metadata['root'])
+
+      # Test: readers do not wait for a refresh in progress.
+      found_targets = []
+      def read_snapshot():
+        found_targets.append(self.Repository.snapshot().target(target_relpath))
+      self.Repository._lock.acquire()
+      try:
+        reader = threading.Thread(target=read_snapshot)
+        reader.start()
+        reader.join(10)
+        self.assertEqual(found_targets, [target_info])
+      finally:
+        self.Repository._lock.release()
+
+      # Test: invalid target path.
+      self.assertRaises(tuf.UnknownTargetError, snapshot.target,
+                        self.random_path())
+
+    finally:
+      # Restore server's repository to initial state.
+      self._remove_filepath(target_fullpath)
+      self._mock_download_url_to_tempfileobj(self.all_role_paths)
+      setup.build_server_repository(self.server_repo_dir, self.targets_dir)
+
+
+
+
+
+  def test_9_snapshot_delegated_roles(self):
+    # Setup: load the delegated roles, and find a target of the last one.
+    role2 = 'targets/delegated_role1/delegated_role2'
+    def _mock_download(url, length, temp_file=None, validators=None):
+      metadata_path = url.split('/metadata/', 1)[1]
+      file_obj = open(os.path.join(self.server_meta_dir, metadata_path), 'rb')
+      if temp_file is None:
+        temp_file = tuf.util.TempFile()
+      temp_file.seek(0)
+      temp_file.truncate()
+      temp_file.write(file_obj.read())
+      file_obj.close()
+      return temp_file
+    tuf.download.unsafe_download = _mock_download
+    tuf.download.safe_download = _mock_download
+
+    def targets_of_role2(target_relpath):
+      return [target for target in
+              self.Repository.snapshot().targets_of_role(role2)
+              if target['filepath'] == target_relpath]
+
+    def sign_again(rolename, metadata_filepath, update_targets):
+      # Sign again the metadata of 'rolename', with its targets updated, and
+      # the release and timestamp metadata that list it.
+      signable = tuf.util.load_json_file(metadata_filepath)
+      update_targets(signable['signed']['targets'])
+      expiration = tuf.formats.format_time(time.time()+86400)
+      keystore._keystore = self.rsa_keystore
+      keystore._derived_keys = self.rsa_passwords
+      try:
+        signable = signerlib.sign_metadata(signable,
+                                           setup.role_keyids[rolename],
+                                           metadata_filepath)
+        signerlib.write_metadata_file(signable, metadata_filepath)
+        signerlib.build_release_file(setup.role_keyids['release'],
+                                     self.server_meta_dir, 1, expiration)
+        signerlib.build_timestamp_file(setup.role_keyids['timestamp'],
+                                       self.server_meta_dir, 1, expiration)
+      finally:
+        keystore._keystore = {}
+        keystore._derived_keys = {}
+
+    #  Add a target to the last delegated role on the server.  setUp() created
+    #  the updater before it copied the server's metadata.
+    targets_deleg_dir2 = os.path.join(self.targets_dir, 'delegated_level1',
+                                      'delegated_level2')
+    target_fullpath = self._add_file_to_directory(targets_deleg_dir2)
+    target_relpath = os.path.relpath(target_fullpath, self.targets_dir)
+
+    try:
+      #  Only the delegated role provides the target, not 'targets'.
+      setup.build_server_repository(self.server_repo_dir, self.targets_dir)
+      sign_again('targets', self.targets_filepath,
+                 lambda targets: targets.pop(target_relpath))
+      self.Repository = updater.Updater('Client_Repository', self.mirrors)
+      self.Repository.refresh()
+      self.Repository.all_targets()
+      old_target = targets_of_role2(target_relpath)[0]
+
+      self.assertEqual(self.Repository.snapshot().target(target_relpath),
+                       old_target)
+
+      #  Change the target on the server, and sign again only the metadata of
+      #  its role.
+      target_file = open(target_fullpath, 'ab')
+      target_file.write(self.random_string())
+      target_file.close()
+      new_fileinfo = signerlib.get_metadata_file_info(target_fullpath)
+      def update_target(targets):
+        targets[target_relpath] = new_fileinfo
+      sign_again(role2, self.delegated_filepath2, update_target)
+
+      # Test: after a refresh, the snapshot does not answer with the metadata
+      # of the role that the new release metadata no longer lists, although
+      # the role is still trusted.
+      self.Repository.refresh()
+      self.assertTrue(self.Repository.roledb.role_exists(role2))
+      snapshot = self.Repository.snapshot()
+      self.assertFalse(role2 in snapshot.metadata)
+      self.assertEqual(snapshot.targets_of_role(role2), [])
+      self.assertRaises(tuf.UnknownTargetError, snapshot.target,
+                        target_relpath)
+
+      #  The updater updates the role, and the snapshot then has it.
+      new_target = self.Repository.target(target_relpath)
+      self.assertEqual(new_target['fileinfo'], new_fileinfo)
+      self.assertEqual(self.Repository.snapshot().target(target_relpath),
+                       new_target)
+
+    finally:
+      # Restore server's repository to initial state.
+      self._remove_filepath(target_fullpath)
+      setup.build_server_repository(self.server_repo_dir, self.targets_dir)
+
+    # Test: a role that was not loaded is not answered for by the roles that
+    # follow it in the order of delegations.
+    fileinfo = old_target['fileinfo']
+    delegations = {'keys': {},
+                   'roles': [{'name': 'targets/a', 'keyids': [],
+                              'threshold': 1, 'paths': ['']},
+                             {'name': 'targets/b', 'keyids': [],
+                              'threshold': 1, 'paths': ['']}]}
+    metadata = {'targets': {'targets': {}, 'delegations': delegations},
+                'targets/b': {'targets': {'file.txt': fileinfo}}}
+    snapshot = updater.MetadataSnapshot(1, metadata, {}, self.Repository)
+    self.assertRaises(tuf.UnknownTargetError, snapshot.target, 'file.txt')
+    metadata['targets/a'] = {'targets': {}}
+    self.assertEqual(snapshot.target('file.txt'),
+                     {'filepath': 'file.txt', 'fileinfo': fileinfo})
+
+
+
+
+
+  def test_9_background_refresher(self):
+    # Setup: an updater whose refresh() is recorded, and fails on request.
+    refreshes = []
+    refresh_errors = []
+    refreshed = threading.Event()
+    def _mock_refresh():
+      refreshes.append(time.time())
+      refreshed.set()
+      if refresh_errors:
+        raise refresh_errors.pop()
+    self.Repository.refresh = _mock_refresh
+    refresher = updater.BackgroundRefresher(self.Repository, interval=100,
+                                            jitter=0)
+
+    try:
+      # Test: a successful and a failed refresh are recorded.
+      self.assertTrue(refresher.refresh())
+      self.assertTrue(refresher.last_success is not None)
+      self.assertEqual(refresher.last_failure, None)
+      refresh_errors.append(tuf.RepositoryError('failed'))
+      self.assertFalse(refresher.refresh())
+      self.assertTrue(refresher.last_failure >= refresher.last_success)
+      self.assertTrue(isinstance(refresher.last_error, tuf.RepositoryError))
+
+      # Test: the next refresh is after the interval, or before the soonest
+      # expiry that is not already past.
+      now = time.time()
+      refresher._expiries = []
+      self.assertEqual(refresher._next_refresh_delay(now), 100)
+      refresher._expiries = [(now + 10, 'timestamp'),
+                             (now + tuf.conf.REFRESH_BEFORE_EXPIRY + 30,
+                              'release'),
+                             (now + 1000, 'root')]
+      self.assertEqual(refresher._next_refresh_delay(now), 30)
+      self.assertEqual(len(refresher._expiries), 2)
+      refresher._expiries = [(now + 1000, 'root')]
+      self.assertEqual(refresher._next_refresh_delay(now), 100)
+
+      #  The expiries are those of the published metadata.
+      refresher.refresh()
+      self.assertEqual(sorted(rolename for expires, rolename in
+                              refresher._expiries),
+                       sorted(self.Repository.snapshot().metadata))
+
+      # Test: the jitter keeps the delay within its fraction of the interval.
+      jittery_refresher = updater.BackgroundRefresher(self.Repository,
+                                                      interval=100, jitter=0.5)
+      for index in range(20):
+        delay = jittery_refresher._next_refresh_delay(now)
+        self.assertTrue(50 <= delay <= 150)
+
+      # Test: the background thread refreshes immediately, then stops.
+      refreshed.clear()
+      refresher.start()
+      self.assertRaises(tuf.Error, refresher.start)
+      refreshed.wait(10)
+      refresher.stop(10)
+      self.assertTrue(refreshed.is_set())
+      self.assertFalse(refresher._thread.is_alive())
+
+      # Test: invalid arguments.
+      self.assertRaises(tuf.FormatError, updater.BackgroundRefresher,
+                        self.Repository, interval='100')
+      self.assertRaises(tuf.FormatError, updater.BackgroundRefresher,
+                        self.Repository, jitter=2)
+
+    finally:
+      refresher.stop()
+      del self.Repository.refresh
+
+
+
+
+
+  def test_9_stats(self):
+    # Setup: an updater that collects statistics.
+    original_updater_stats = tuf.conf.UPDATER_STATS
+    tuf.conf.UPDATER_STATS = True
+    try:
+      repository = updater.Updater('Client_Repository', self.mirrors)
+    finally:
+      tuf.conf.UPDATER_STATS = original_updater_stats
+    self._mock_download_url_to_tempfileobj(list(self.all_role_paths))
+
+    # Test: a refresh records the phases of the timestamp role, the bytes
+    # received from the mirror, and the unchanged metadata.
+    repository.refresh()
+    stats = repository.stats()
+    timestamp_durations = stats['durations']['timestamp']
+    for phase in ['download', 'json_parse', 'schema_check',
+                  'signature_verify', 'install']:
+      self.assertEqual(timestamp_durations[phase]['count'], 1)
+      self.assertTrue(timestamp_durations[phase]['seconds'] >= 0)
+    timestamp_length = os.path.getsize(self.timestamp_filepath)
+    self.assertEqual(sum(stats['mirror_bytes'].values()), timestamp_length)
+    for mirror in stats['mirror_bytes']:
+      self.assertTrue(mirror in ['http://mirror1.com', 'http://mirror2.com',
+                                 'http://mirror3.com'])
+    self.assertTrue(stats['counters']['metadata_unchanged'] >= 1)
+
+    # Test: the statistics are a copy, and may be reset.
+    stats['counters'].clear()
+    self.assertTrue(repository.stats()['counters'])
+    repository.reset_stats()
+    self.assertEqual(repository.stats(),
+                     {'durations': {}, 'mirror_bytes': {}, 'counters': {}})
+
+    # Test: updaters do not collect statistics by default.
+    repository = updater.Updater('Client_Repository', self.mirrors)
+    self._mock_download_url_to_tempfileobj(list(self.all_role_paths))
+    repository.refresh()
+    self.assertEqual(repository.stats(),
+                     {'durations': {}, 'mirror_bytes': {}, 'counters': {}})
+
+
+
+
+
+
+  def test_9_hooks(self):
+    # Setup: hooks that record the events of a new updater.
+    repository = updater.Updater('Client_Repository', self.mirrors)
+    events = []
+    def record_event(event):
+      def hook(**payload):
+        events.append((event, payload))
+      return hook
+    for event in sorted(repository.hooks.events):
+      repository.hooks.register(event, record_event(event))
+
+    # Test: the events of the update of the timestamp role.
+    self._mock_download_url_to_tempfileobj(list(self.all_role_paths))
+    repository.refresh()
+    self.assertEqual([event for event, payload in events],
+                     ['download_started', 'signature_verified',
+                      'download_finished', 'metadata_installed'])
+    timestamp_length = os.path.getsize(self.timestamp_filepath)
+    started, verified, finished, installed = [payload for event, payload in
+                                              events]
+    self.assertEqual(started['filepath'], 'timestamp.txt')
+    self.assertEqual(started['file_type'], 'meta')
+    self.assertEqual(started['offset'], 0)
+    self.assertEqual(finished['mirror'], started['mirror'])
+    self.assertEqual(finished['length'], timestamp_length)
+    self.assertEqual(verified['rolename'], 'timestamp')
+    self.assertTrue(verified['signature_count'] >= 1)
+    self.assertEqual(installed['rolename'], 'timestamp')
+    self.assertEqual(installed['version'],
+                     repository.metadata['current']['timestamp']['version'])
+    self.assertEqual(installed['length'], timestamp_length)
+    for payload in [verified, finished, installed]:
+      self.assertTrue(payload['seconds'] >= 0)
+
+    # Test: every mirror that fails is reported.
+    del events[:]
+    self._mock_download_url_to_tempfileobj([])
+    self.assertRaises(tuf.NoWorkingMirrorError, repository.refresh)
+    failures = [payload for event, payload in events
+                if event == 'mirror_failed']
+    self.assertEqual(len(failures), len(self.mirrors))
+    for payload in failures:
+      self.assertTrue(isinstance(payload['error'], IndexError))
+      self.assertEqual(payload['length'], 0)
+
+    # Test: the hooks of other updaters are not called.
+    del events[:]
+    other_repository = updater.Updater('Client_Repository', self.mirrors)
+    self._mock_download_url_to_tempfileobj(list(self.all_role_paths))
+    other_repository.refresh()
+    self.assertEqual(events, [])
+
+
 
 def tearDownModule():
   # tearDownModule() is called after all the tests have run.
@@ -1150,6 +2477,7 @@ def tearDownModule():
   unittest_toolbox.Modified_TestCase.clear_toolbox()
   tuf.download.safe_download = original_safe_download
   tuf.download.unsafe_download = original_unsafe_download
+  tuf.download.safe_segmented_download = original_safe_segmented_download
 
 if __name__ == '__main__':
   unittest.main()
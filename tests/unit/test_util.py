@@ -20,11 +20,14 @@
 
 import os
 import sys
+import bz2
 import gzip
+import errno
 import shutil
 import logging
 import tempfile
 import unittest
+import StringIO
 
 import tuf
 import tuf.log
@@ -132,6 +135,38 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_A4_tempfile_buffered_write(self):
+    data = self.random_string()
+    for chunk in data:
+      self.temp_fileobj.write(chunk, auto_flush=False)
+
+    # Test: buffered data counts towards the length of the file.
+    self.assertEquals(len(data), self.temp_fileobj.get_compressed_length())
+    self.temp_fileobj.flush(fsync=True)
+    self.assertEquals(data, self.temp_fileobj.read())
+
+    # Test: the write buffer is reused, and data as large as the buffer is
+    # written directly.
+    original_buffer_size = tuf.conf.TEMPFILE_BUFFER_SIZE
+    tuf.conf.TEMPFILE_BUFFER_SIZE = 4
+    try:
+      temp_fileobj = util.TempFile(spool_size=tuf.conf.TEMPFILE_SPOOL_SIZE)
+      write_buffer = temp_fileobj._write_buffer
+      temp_fileobj.write('ab', auto_flush=False)
+      temp_fileobj.write('cd', auto_flush=False)
+      self.assertEquals(temp_fileobj._write_buffer, [])
+      temp_fileobj.write('efghij', auto_flush=False)
+      self.assertEquals(temp_fileobj._write_buffer, [])
+      temp_fileobj.write('k', auto_flush=False)
+      self.assertEquals(temp_fileobj._write_buffer, ['k'])
+      self.assertTrue(temp_fileobj._write_buffer is write_buffer)
+      self.assertEquals('abcdefghijk', temp_fileobj.read())
+      temp_fileobj.close_temp_file()
+    finally:
+      tuf.conf.TEMPFILE_BUFFER_SIZE = original_buffer_size
+
+
+
   def test_A5_tempfile_move(self):
     # Destination directory to save the temporary file in.
     dest_temp_dir = self.make_temp_directory()
@@ -140,6 +175,88 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
     self.temp_fileobj.move(dest_path)
     self.assertTrue(dest_path)
 
+    # Test: the umask of the process is read without changing it.
+    umask = os.umask(0)
+    os.umask(umask)
+    self.assertEquals(util._read_umask(), umask)
+    self.assertEquals(util._umask, umask)
+    current_umask = os.umask(umask)
+    self.assertEquals(current_umask, umask)
+
+    # Test: the temporary file is renamed into place, replacing 'dest_path',
+    # whose permissions are kept.
+    os.chmod(dest_path, 0604)
+    data = self.random_string()
+    temp_fileobj = util.TempFile()
+    temp_fileobj.write(data)
+    temp_filepath = temp_fileobj.temporary_file.name
+    temp_fileobj.move(dest_path)
+    self.assertFalse(os.path.exists(temp_filepath))
+    self.assertEquals(data, open(dest_path, 'rb').read())
+    self.assertEquals(os.stat(dest_path).st_mode & 0777, 0604)
+
+    # Test: a new file gets the permissions of a newly created file.
+    os.remove(dest_path)
+    temp_fileobj = util.TempFile()
+    temp_fileobj.write(data)
+    temp_fileobj.move(dest_path)
+    self.assertEquals(os.stat(dest_path).st_mode & 0777, 0666 & ~umask)
+
+    # Test: the temporary file is copied if it cannot be renamed, e.g., if it
+    # is on another filesystem.
+    def _failing_rename(source, destination):
+      raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    data = self.random_string()
+    temp_fileobj = util.TempFile()
+    temp_fileobj.write(data)
+    temp_filepath = temp_fileobj.temporary_file.name
+    saved_rename = util.os.rename
+    util.os.rename = _failing_rename
+    try:
+      temp_fileobj.move(dest_path)
+    finally:
+      util.os.rename = saved_rename
+    self.assertFalse(os.path.exists(temp_filepath))
+    self.assertEquals(data, open(dest_path, 'rb').read())
+
+
+
+  def test_A7_tempfile_spooled(self):
+    data = self.random_string()
+    temp_fileobj = util.TempFile(spool_size=2*len(data))
+
+    # Test: a small file is kept in memory.
+    temp_fileobj.write(data)
+    self.assertFalse(hasattr(temp_fileobj.temporary_file, 'name'))
+    self.assertEquals(len(data), temp_fileobj.get_compressed_length())
+    self.assertEquals(data, temp_fileobj.read())
+    temp_fileobj.seek(len(data)/2)
+    temp_fileobj.truncate()
+    self.assertEquals(data[:len(data)/2], temp_fileobj.read())
+
+    # Test: a file that outgrows 'spool_size' is moved to disk.
+    temp_fileobj.seek(len(data)/2)
+    temp_fileobj.write(data+data, auto_flush=False)
+    self.assertEquals(data[:len(data)/2]+data+data, temp_fileobj.read())
+    self.assertTrue(os.path.exists(temp_fileobj.temporary_file.name))
+    self.assertEquals(len(data[:len(data)/2]+data+data),
+                      temp_fileobj.get_compressed_length())
+    temp_fileobj.close_temp_file()
+
+    # Test: an in-memory file can be decompressed and moved.
+    filepath = self.make_temp_data_file(data=data)
+    compressed_filepath = self._compress_existing_file(filepath)
+    temp_fileobj = util.TempFile(spool_size=tuf.conf.TEMPFILE_SPOOL_SIZE)
+    temp_fileobj.write(open(compressed_filepath, 'rb').read())
+    os.remove(compressed_filepath)
+    compressed_length = temp_fileobj.get_compressed_length()
+    temp_fileobj.decompress_temp_file_object('gzip')
+    self.assertEquals(data, temp_fileobj.read())
+    self.assertEquals(compressed_length, temp_fileobj.get_compressed_length())
+    dest_path = os.path.join(self.make_temp_directory(), self.random_string())
+    temp_fileobj.move(dest_path)
+    self.assertEquals(data, open(dest_path, 'rb').read())
+
 
 
   def _compress_existing_file(self, filepath):
@@ -160,6 +277,16 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
  
 
 
+  def _gzip_data(self, data):
+    """[Helper] Returns 'data' compressed with gzip."""
+    compressed_fileobj = StringIO.StringIO()
+    gzip_fileobj = gzip.GzipFile(fileobj=compressed_fileobj, mode='wb')
+    gzip_fileobj.write(data)
+    gzip_fileobj.close()
+    return compressed_fileobj.getvalue()
+
+
+
   def _decompress_file(self, compressed_filepath):
     """[Helper]"""
     if os.path.exists(compressed_filepath):
@@ -203,6 +330,72 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
     # Try decompressing once more.
     self.assertRaises(tuf.Error, 
                       self.temp_fileobj.decompress_temp_file_object,'gzip')
+
+    # Test: decompression while the file is written, e.g., downloaded.
+    data = self.random_string() * 100
+    for compression, compress in [('gzip', self._gzip_data),
+                                  ('bzip2', bz2.compress)]:
+      compressed_data = compress(data)
+      temp_fileobj = util.TempFile()
+      temp_fileobj.start_decompression(compression, required_length=len(data))
+      for index in range(0, len(compressed_data), 10):
+        temp_fileobj.write(compressed_data[index:index+10], auto_flush=False)
+      self.assertTrue(temp_fileobj._decompressed_length > 0)
+      temp_fileobj.decompress_temp_file_object(compression)
+      self.assertEquals(data, temp_fileobj.read())
+      self.assertEquals(len(compressed_data),
+                        temp_fileobj.get_compressed_length())
+      temp_fileobj.close_temp_file()
+
+    # Test: a file that is written out of order is decompressed at the end.
+    compressed_data = bz2.compress(data)
+    temp_fileobj = util.TempFile()
+    temp_fileobj.start_decompression('bzip2')
+    temp_fileobj.write(compressed_data[:20])
+    temp_fileobj.seek(10)
+    temp_fileobj.truncate()
+    self.assertEquals(temp_fileobj._decompressor, None)
+    temp_fileobj.write(compressed_data[10:])
+    temp_fileobj.decompress_temp_file_object('bzip2')
+    self.assertEquals(data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    # Test: invalid compressed data.
+    temp_fileobj = util.TempFile()
+    temp_fileobj.start_decompression('gzip')
+    temp_fileobj.write(self.random_string())
+    self.assertRaises(tuf.DecompressionError,
+                      temp_fileobj.decompress_temp_file_object, 'gzip')
+    temp_fileobj.close_temp_file()
+
+    # Test: a small file that decompresses to much more than its required
+    # length is stopped as soon as it does, while it is written or once it is
+    # complete.
+    bomb_data = '\0' * (16 * 1024 * 1024)
+    for compression, compress in [('gzip', self._gzip_data),
+                                  ('bzip2', bz2.compress)]:
+      compressed_bomb = compress(bomb_data)
+      self.assertTrue(len(compressed_bomb) < 65536)
+
+      temp_fileobj = util.TempFile()
+      temp_fileobj.start_decompression(compression, required_length=1024)
+      self.assertRaises(tuf.DownloadLengthMismatchError, temp_fileobj.write,
+                        compressed_bomb)
+      self.assertEquals(temp_fileobj._decompressed_file, None)
+      temp_fileobj.close_temp_file()
+
+      temp_fileobj = util.TempFile()
+      temp_fileobj.write(compressed_bomb)
+      try:
+        temp_fileobj.decompress_temp_file_object(compression, 1024)
+      except tuf.DownloadLengthMismatchError, exception:
+        self.assertEquals(exception.expected_length, 1024)
+        # zlib stops right past the required length.
+        if compression == 'gzip':
+          self.assertEquals(exception.observed_length, 1025)
+      else:
+        self.fail('Expected tuf.DownloadLengthMismatchError.')
+      temp_fileobj.close_temp_file()
     
 
 
@@ -241,6 +434,30 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
         self.assertTrue(os.path.isdir(parent_dir))
       else:
         self.assertRaises(tuf.FormatError, util.ensure_parent_dir, parent_dir)
+
+    # Test: the parent directory is created by someone else between the check
+    # for its existence and its creation (e.g., for a sibling file).
+    raced_parent_dir = os.path.join(existing_parent_dir, 'c')
+    def _mock_exists(path):
+      os.mkdir(raced_parent_dir)
+      return False
+    original_exists = os.path.exists
+    os.path.exists = _mock_exists
+    try:
+      util.ensure_parent_dir(os.path.join(raced_parent_dir, 'a.txt'))
+    finally:
+      os.path.exists = original_exists
+    self.assertTrue(os.path.isdir(raced_parent_dir))
+
+    # Test: a file in place of the parent directory is still an error.
+    file_parent_dir = os.path.join(existing_parent_dir, 'd')
+    open(file_parent_dir, 'wb').close()
+    os.path.exists = lambda path: False
+    try:
+      self.assertRaises(OSError, util.ensure_parent_dir,
+                        os.path.join(file_parent_dir, 'a.txt'))
+    finally:
+      os.path.exists = original_exists
       
 
 
@@ -300,6 +517,53 @@ class TestUtil(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_B7_make_and_apply_delta(self):
+    old_data = '{\n "a": 1,\n "b": 2,\n "c": 3\n}\n'
+    new_data = '{\n "a": 1,\n "b": 20,\n "c": 3,\n "d": 4\n}\n'
+
+    # Test: normal case.  Only the changed lines are in the delta.
+    edits = util.make_delta(old_data, new_data)
+    self.assertEquals(util.apply_delta(old_data, edits), new_data)
+    self.assertEquals(util.make_delta(old_data, old_data), [])
+    changed_lines = []
+    for edit in edits:
+      changed_lines.extend(edit['lines'])
+    self.assertEquals(changed_lines,
+                      [' "b": 20,\n', ' "c": 3,\n', ' "d": 4\n'])
+
+    # Test: lines loaded from JSON are unicode.
+    unicode_edits = util.load_json_string(util.json.dumps(edits))
+    data = util.apply_delta(old_data, unicode_edits)
+    self.assertEquals(data, new_data)
+    self.assertTrue(isinstance(data, str))
+
+    # Test: edits that do not apply.
+    self.assertRaises(tuf.Error, util.apply_delta, old_data,
+                      [{'start': 3, 'end': 10, 'lines': []}])
+    self.assertRaises(tuf.Error, util.apply_delta, old_data,
+                      [{'start': 2, 'end': 3, 'lines': []},
+                       {'start': 1, 'end': 2, 'lines': []}])
+
+
+
+  def test_B8_link_or_copy_file(self):
+    source = self.make_temp_data_file(data='data')
+    destination = os.path.join(self.make_temp_directory(), 'file')
+
+    # Test: the file is hardlinked.
+    util.link_or_copy_file(source, destination)
+    self.assertEquals(os.stat(source).st_ino, os.stat(destination).st_ino)
+
+    # Test: the file is copied, and replaces the hardlink without modifying
+    # the source.
+    open(source+'.new', 'wb').write('new data')
+    util.link_or_copy_file(source+'.new', destination, hardlink=False)
+    self.assertEquals(open(destination, 'rb').read(), 'new data')
+    self.assertEquals(open(source, 'rb').read(), 'data')
+    self.assertNotEquals(os.stat(source).st_ino, os.stat(destination).st_ino)
+
+
+
 # Run unit test.
 if __name__ == '__main__':
   unittest.main()
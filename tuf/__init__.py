@@ -245,6 +245,20 @@ class SlowRetrievalError(DownloadError):
 
 
 
+class NotModifiedError(DownloadError):
+  """Indicate that a conditionally downloaded file has not changed since the
+  copy described by the validators sent with the request (HTTP 304)."""
+
+  def __init__(self, url):
+    self.url = url
+
+  def __str__(self):
+    return repr(self.url)+' has not been modified.'
+
+
+
+
+
 class KeyAlreadyExistsError(Error):
   """Indicate that a key already exists and cannot be added."""
   pass
@@ -312,3 +326,41 @@ class NoWorkingMirrorError(Error):
       all_errors += '\n  '+str(mirror_netloc)+': '+str(mirror_error)
 
     return all_errors
+
+
+
+
+
+class DownloadTargetsError(Error):
+  """Indicate that some of the targets downloaded together could not be
+  downloaded.
+
+  A dictionary of Exception instances indexed by the filepath of every target
+  that failed will also be provided."""
+
+  def __init__(self, target_errors):
+    # Dictionary of target filepaths to Exception instances
+    self.target_errors = target_errors
+
+  def __str__(self):
+    all_errors = 'Some targets could not be downloaded:'
+
+    for target_filepath, target_error in sorted(self.target_errors.items()):
+      all_errors += '\n  '+repr(target_filepath)+': '+str(target_error)
+
+    return all_errors
+
+
+
+
+
+class UpdateDaemonError(Error):
+  """Indicate that a request to the update daemon failed.  'error_type' is the
+  name of the exception raised in the daemon, if any."""
+
+  def __init__(self, error_type, message):
+    self.error_type = error_type
+    self.message = message
+
+  def __str__(self):
+    return str(self.error_type)+': '+str(self.message)
@@ -0,0 +1,818 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  daemon.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Provide a local update daemon that owns one updater per repository, and
+  answers target lookups and target downloads for the other processes of the
+  host over a Unix domain socket.  Without it, every process that imports
+  'tuf.client.updater' loads and refreshes its own copy of the metadata; with
+  it, the metadata of each repository is refreshed once, in the background
+  (see 'tuf.client.updater.BackgroundRefresher'), for all of them.
+
+  The daemon is configured with a JSON file of the repositories it serves,
+  conformant to 'tuf.formats.DAEMON_REPOSITORIES_SCHEMA':
+
+  {"repository": {"repository_directory": "/var/lib/tuf/repository",
+                  "repository_mirrors": {"mirror1": {...}},
+                  "destination_directory": "/var/lib/tuf/targets"}}
+
+  Processes use an 'UpdateDaemonClient', which provides the target methods of
+  'tuf.client.updater.Updater':
+
+  import tuf.client.daemon
+
+  client = tuf.client.daemon.UpdateDaemonClient('/var/run/tuf.sock',
+                                                'repository')
+  target = client.target('file.txt')
+  client.download_target(target, destination_directory)
+
+  The daemon and its clients exchange one JSON object per line.  A request is
+  {"repository": <name>, "method": <name>, "params": {...}}, and a response
+  {"result": ...} or {"error": {"type": <exception name>, "message": ...}}.
+  Targets are downloaded and verified by the daemon.  A client only names the
+  target to download: the daemon looks up its trusted target information
+  itself, with Updater.target(), and only saves targets to the destination directory configured for
+  the repository, which must be writable by it.
+
+<Usage>
+  $ python daemon.py --socket /var/run/tuf.sock --config repositories.json
+
+"""
+
+import logging
+import optparse
+import os
+import socket
+import SocketServer
+import stat
+import threading
+
+import tuf
+import tuf.client.updater
+import tuf.conf
+import tuf.formats
+import tuf.log
+import tuf.util
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.client.daemon')
+
+# The methods of the updaters that clients may call, with their parameters.
+DAEMON_METHODS = {'target': ['target_filepath'],
+                  'targets': ['target_filepaths'],
+                  'download_target': ['target_filepath',
+                                      'destination_directory']}
+
+
+def create_updaters(repositories):
+  """
+  <Purpose>
+    Create an updater for each of 'repositories'.
+
+  <Arguments>
+    repositories:
+      The repositories, by name, conformant to
+      'tuf.formats.DAEMON_REPOSITORIES_SCHEMA'.
+
+  <Exceptions>
+    tuf.FormatError:
+      If 'repositories' is improperly formatted.
+
+    tuf.RepositoryError:
+      If the metadata of a repository could not be loaded.
+
+  <Side Effects>
+    The metadata of the repositories is read from disk.
+
+  <Returns>
+    A dictionary of 'tuf.client.updater.Updater' objects, by repository name.
+
+  """
+
+  # Does 'repositories' have the correct format?
+  # Raise 'tuf.FormatError' if there is a mismatch.
+  tuf.formats.DAEMON_REPOSITORIES_SCHEMA.check_match(repositories)
+
+  updaters = {}
+
+  # Updaters read their repository directory from 'tuf.conf' when they are
+  # created.
+  original_repository_directory = tuf.conf.repository_directory
+  try:
+    for repository_name, repository in repositories.items():
+      tuf.conf.repository_directory = repository['repository_directory']
+      updaters[repository_name] = tuf.client.updater.Updater(repository_name,
+                                              repository['repository_mirrors'])
+  finally:
+    tuf.conf.repository_directory = original_repository_directory
+
+  return updaters
+
+
+
+
+
+class UpdateDaemon(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+  """
+  <Purpose>
+    A server, on a Unix domain socket, of the target methods of several
+    updaters.  Every client connection is handled by its own thread.  Target
+    lookups are answered from the published snapshot of the updater, and only
+    fall back to Updater.target() (which may download the metadata of
+    delegated roles) if the snapshot does not have the target, or lacks the
+    metadata of a role that must be interrogated for it.  Targets to download
+    are always looked up with Updater.target().
+
+  <UpdateDaemon Attributes>
+    self.updaters:
+      The 'tuf.client.updater.Updater' objects served, by repository name.
+
+    self.destination_directories:
+      The directory that the targets of each repository are downloaded to,
+      with symbolic links resolved, by repository name.
+
+    self.refreshers:
+      The 'tuf.client.updater.BackgroundRefresher' objects refreshing the
+      updaters, by repository name, once start_refreshers() is called.
+
+  """
+
+  daemon_threads = True
+
+  def __init__(self, socket_path, updaters, destination_directories):
+    """
+    <Purpose>
+      Constructor.  Bind the Unix domain socket at 'socket_path'.
+
+    <Arguments>
+      socket_path:
+        The path of the Unix domain socket.
+
+      updaters:
+        The updaters to serve, by repository name.
+
+      destination_directories:
+        The directory that the targets of each repository may be downloaded
+        to, by repository name.  Clients may not download targets anywhere
+        else.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'socket_path' or 'destination_directories' is improperly
+        formatted.
+
+      socket.error:
+        If the socket could not be bound.
+
+    <Side Effects>
+      The socket file is created.
+
+    <Returns>
+      None.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.PATH_SCHEMA.check_match(socket_path)
+    for repository_name in updaters:
+      tuf.formats.PATH_SCHEMA.check_match(
+        destination_directories.get(repository_name))
+
+    self.updaters = updaters
+    self.destination_directories = {}
+    for repository_name in updaters:
+      self.destination_directories[repository_name] = \
+        os.path.realpath(destination_directories[repository_name])
+    self.refreshers = {}
+    SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                           _UpdateDaemonRequestHandler)
+
+
+
+
+
+  def start_refreshers(self):
+    """
+    <Purpose>
+      Start refreshing every updater in the background.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      A background thread is started for each updater.
+
+    <Returns>
+      None.
+
+    """
+
+    for repository_name, updater in self.updaters.items():
+      refresher = tuf.client.updater.BackgroundRefresher(updater)
+      refresher.start()
+      self.refreshers[repository_name] = refresher
+
+
+
+
+
+  def server_close(self):
+    """
+    <Purpose>
+      Stop the refreshers, and close and remove the socket.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The socket file is removed.
+
+    <Returns>
+      None.
+
+    """
+
+    for refresher in self.refreshers.values():
+      refresher.stop()
+
+    SocketServer.UnixStreamServer.server_close(self)
+    if os.path.exists(self.server_address):
+      os.remove(self.server_address)
+
+
+
+
+
+  def handle_daemon_request(self, request):
+    """
+    <Purpose>
+      Call the updater method named in 'request', and return the response to
+      send back.
+
+    <Arguments>
+      request:
+        The decoded request: {'repository': <name>, 'method': <name>,
+        'params': {...}}.
+
+    <Exceptions>
+      None.  Errors are returned in the response.
+
+    <Side Effects>
+      Whatever the updater method does (e.g., a target file is downloaded).
+
+    <Returns>
+      The response: {'result': ...} or {'error': {'type': ..., 'message': ...}}.
+
+    """
+
+    try:
+      if not isinstance(request, dict):
+        raise tuf.FormatError('The request is not an object.')
+
+      repository_name = request.get('repository')
+      method = request.get('method')
+      params = request.get('params', {})
+      if repository_name not in self.updaters:
+        raise tuf.RepositoryError('Unknown repository: '+repr(repository_name))
+      if method not in DAEMON_METHODS:
+        raise tuf.FormatError('Unknown method: '+repr(method))
+      if not isinstance(params, dict) or \
+         sorted(params) != sorted(DAEMON_METHODS[method]):
+        raise tuf.FormatError('Invalid parameters for '+repr(method)+': '+
+                              repr(params))
+
+      updater = self.updaters[repository_name]
+      if method == 'target':
+        result = self._target(updater, params['target_filepath'])
+      elif method == 'targets':
+        result = updater.targets(params['target_filepaths'])
+      else:
+        destination_directory = \
+          self._destination_directory(repository_name,
+                                      params['destination_directory'])
+        # The target information is the daemon's own, never the client's,
+        # and is that of the updated metadata, not of the snapshot.
+        target = updater.target(params['target_filepath'])
+        result = updater.download_target(target, destination_directory)
+
+    except Exception, exception:
+      logger.exception('Request '+repr(request)+' failed.')
+      return {'error': {'type': exception.__class__.__name__,
+                        'message': str(exception)}}
+
+    return {'result': result}
+
+
+
+
+
+  def _target(self, updater, target_filepath):
+    """
+    <Purpose>
+      Return the target information for 'target_filepath', from the snapshot
+      of 'updater' if it has it.
+
+    <Arguments>
+      updater:
+        The updater of the repository.
+
+      target_filepath:
+        The path to the target file on the repository.
+
+    <Exceptions>
+      tuf.FormatError, tuf.UnknownTargetError, tuf.RepositoryError:
+        As raised by Updater.target().
+
+    <Side Effects>
+      The metadata for delegated roles may be downloaded.
+
+    <Returns>
+      The target information, conformant to 'tuf.formats.TARGETFILE_SCHEMA'.
+
+    """
+
+    try:
+      return updater.snapshot().target(target_filepath)
+    except tuf.UnknownTargetError:
+      return updater.target(target_filepath)
+
+
+
+
+
+  def _destination_directory(self, repository_name, destination_directory):
+    """
+    <Purpose>
+      Ensure that a client may download the targets of 'repository_name' to
+      'destination_directory', i.e., that it is the directory configured for
+      the repository, and return it.
+
+    <Arguments>
+      repository_name:
+        The name of the repository.
+
+      destination_directory:
+        The destination directory requested by the client.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'destination_directory' is improperly formatted.
+
+      tuf.Error:
+        If 'destination_directory' is not the directory configured for the
+        repository.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The configured destination directory.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.PATH_SCHEMA.check_match(destination_directory)
+
+    # Symbolic links are resolved, so that a client cannot have the daemon
+    # write through one to a directory of its choice.
+    configured_directory = self.destination_directories[repository_name]
+    if os.path.realpath(destination_directory) != configured_directory:
+      message = 'Targets of '+repr(repository_name)+' may only be downloaded '+\
+        'to '+repr(configured_directory)+', not '+repr(destination_directory)+'.'
+      raise tuf.Error(message)
+
+    return configured_directory
+
+
+
+
+
+class _UpdateDaemonRequestHandler(SocketServer.StreamRequestHandler):
+  """
+  <Purpose>
+    Answer the requests of a client connection, one JSON object per line,
+    until the client closes it.
+
+  """
+
+  def handle(self):
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        return
+
+      try:
+        request = tuf.util.load_json_string(line)
+      except ValueError, exception:
+        response = {'error': {'type': 'FormatError',
+                              'message': 'Invalid request: '+str(exception)}}
+      else:
+        response = self.server.handle_daemon_request(request)
+
+      self.wfile.write(tuf.util.json.dumps(response)+'\n')
+      self.wfile.flush()
+
+
+
+
+
+class UpdateDaemonClient(object):
+  """
+  <Purpose>
+    A client of an 'UpdateDaemon', for one of its repositories.  It provides
+    the target methods of 'tuf.client.updater.Updater'; errors raised in the
+    daemon are raised again, as the same 'tuf' exception when it takes a
+    single message, and as 'tuf.UpdateDaemonError' otherwise.  A client may be
+    shared by the threads of a process.
+
+  """
+
+  def __init__(self, socket_path, repository_name):
+    """
+    <Purpose>
+      Constructor.  The connection to the daemon is opened by the first
+      request.
+
+    <Arguments>
+      socket_path:
+        The path of the Unix domain socket of the daemon.
+
+      repository_name:
+        The name of the repository in the daemon.
+
+    <Exceptions>
+      tuf.FormatError:
+        If the arguments are improperly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.PATH_SCHEMA.check_match(socket_path)
+    tuf.formats.NAME_SCHEMA.check_match(repository_name)
+
+    self.socket_path = socket_path
+    self.repository_name = repository_name
+    self._lock = threading.Lock()
+    self._socket = None
+    self._socket_file = None
+
+
+
+
+
+  def target(self, target_filepath):
+    """
+    <Purpose>
+      Return the target file information for 'target_filepath'.  See
+      'tuf.client.updater.Updater.target()'.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'target_filepath' is improperly formatted.
+
+      tuf.UnknownTargetError:
+        If 'target_filepath' was not found.
+
+      tuf.UpdateDaemonError:
+        If the daemon could not be reached, or failed otherwise.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETFILE_SCHEMA'.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.RELPATH_SCHEMA.check_match(target_filepath)
+
+    return self._request('target', target_filepath=target_filepath)
+
+
+
+
+
+  def targets(self, target_filepaths):
+    """
+    <Purpose>
+      Return the target file information for each of 'target_filepaths'.  See
+      'tuf.client.updater.Updater.targets()'.
+
+    <Arguments>
+      target_filepaths:
+        The list of the paths to the target files on the repository.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'target_filepaths' is improperly formatted.
+
+      tuf.UpdateDaemonError:
+        If the daemon could not be reached, or failed otherwise.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A dictionary of the target information of each path, or None for the
+      paths that were not found.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.RELPATHS_SCHEMA.check_match(target_filepaths)
+
+    return self._request('targets', target_filepaths=target_filepaths)
+
+
+
+
+
+  def download_target(self, target, destination_directory):
+    """
+    <Purpose>
+      Have the daemon download 'target' to 'destination_directory', and
+      verify it.  See 'tuf.client.updater.Updater.download_target()'.  Only
+      the path of 'target' is sent: the daemon downloads and verifies the
+      target with its own target information.
+
+    <Arguments>
+      target:
+        The target to be downloaded.  Conformant to
+        'tuf.formats.TARGETFILE_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target file, which must be the
+        destination directory configured for the repository in the daemon.
+        It is made absolute, since the daemon does not share the current
+        directory of the client.
+
+    <Exceptions>
+      tuf.FormatError:
+        If the arguments are improperly formatted.
+
+      tuf.Error:
+        If 'destination_directory' is not the directory configured in the
+        daemon.
+
+      tuf.UnknownTargetError:
+        If the daemon does not find the target.
+
+      tuf.NoWorkingMirrorError, tuf.UpdateDaemonError:
+        If the target could not be downloaded.
+
+    <Side Effects>
+      The target file is saved to 'destination_directory' by the daemon.
+
+    <Returns>
+      None.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.TARGETFILE_SCHEMA.check_match(target)
+    tuf.formats.PATH_SCHEMA.check_match(destination_directory)
+
+    destination_directory = os.path.abspath(destination_directory)
+    self._request('download_target', target_filepath=target['filepath'],
+                  destination_directory=destination_directory)
+
+
+
+
+
+  def close(self):
+    """
+    <Purpose>
+      Close the connection to the daemon, if it is open.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The socket is closed.
+
+    <Returns>
+      None.
+
+    """
+
+    with self._lock:
+      self._close()
+
+
+
+
+
+  def _close(self):
+    """
+    <Purpose>
+      Close the connection to the daemon.  The caller holds 'self._lock'.
+
+    """
+
+    if self._socket_file is not None:
+      self._socket_file.close()
+      self._socket.close()
+    self._socket = None
+    self._socket_file = None
+
+
+
+
+
+  def _request(self, method, **params):
+    """
+    <Purpose>
+      Send a request to the daemon, and return the result of its response.
+
+    <Arguments>
+      method:
+        The name of the updater method.
+
+      params:
+        The arguments of the method.
+
+    <Exceptions>
+      tuf.UpdateDaemonError:
+        If the daemon could not be reached.
+
+      tuf.Error:
+        The error raised in the daemon.
+
+    <Side Effects>
+      The connection to the daemon is opened if it is not.
+
+    <Returns>
+      The result of the method.
+
+    """
+
+    request = {'repository': self.repository_name, 'method': method,
+               'params': params}
+
+    with self._lock:
+      try:
+        if self._socket is None:
+          self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+          self._socket.connect(self.socket_path)
+          self._socket_file = self._socket.makefile('rwb')
+
+        self._socket_file.write(tuf.util.json.dumps(request)+'\n')
+        self._socket_file.flush()
+        line = self._socket_file.readline()
+
+      except socket.error, exception:
+        self._close()
+        raise tuf.UpdateDaemonError('socket.error', str(exception))
+
+      if not line:
+        self._close()
+        raise tuf.UpdateDaemonError(None, 'The daemon closed the connection.')
+
+    response = tuf.util.load_json_string(line)
+    if 'error' in response:
+      _raise_daemon_error(response['error'])
+
+    return response['result']
+
+
+
+
+
+def _raise_daemon_error(error):
+  """
+  <Purpose>
+    Raise the 'tuf' exception named in 'error', if it takes a single message,
+    and 'tuf.UpdateDaemonError' otherwise.
+
+  """
+
+  error_type = error.get('type')
+  message = error.get('message')
+  error_class = getattr(tuf, str(error_type), None)
+
+  if isinstance(error_class, type) and issubclass(error_class, tuf.Error) and \
+     error_class.__init__ == tuf.Error.__init__:
+    raise error_class(message)
+
+  raise tuf.UpdateDaemonError(error_type, message)
+
+
+
+
+
+def parse_options():
+  """
+  <Purpose>
+    Parse the command-line options and set the logging level as specified by
+    the user through the --verbose option.  The '--socket' and '--config'
+    options are required.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    Sets the logging level for TUF logging.
+
+  <Returns>
+    The parsed options.
+
+  """
+
+  parser = optparse.OptionParser()
+
+  parser.add_option('--verbose', dest='VERBOSE', type=int, default=2,
+                    help='Set the verbosity level of logging messages.'
+                         'The lower the setting, the greater the verbosity.')
+
+  parser.add_option('--socket', dest='SOCKET_PATH', type='string',
+                    help='Specify the path of the Unix domain socket the '
+                    'daemon listens on.')
+
+  parser.add_option('--config', dest='CONFIG_PATH', type='string',
+                    help='Specify the JSON file of the repositories served '
+                    'by the daemon.')
+
+  options, args = parser.parse_args()
+
+  # Set the logging level.
+  if options.VERBOSE == 5:
+    tuf.log.set_log_level(logging.CRITICAL)
+  elif options.VERBOSE == 4:
+    tuf.log.set_log_level(logging.ERROR)
+  elif options.VERBOSE == 3:
+    tuf.log.set_log_level(logging.WARNING)
+  elif options.VERBOSE == 2:
+    tuf.log.set_log_level(logging.INFO)
+  elif options.VERBOSE == 1:
+    tuf.log.set_log_level(logging.DEBUG)
+  else:
+    tuf.log.set_log_level(logging.NOTSET)
+
+  if options.SOCKET_PATH is None or options.CONFIG_PATH is None:
+    parser.error('"--socket" and "--config" must be set on the command-line.')
+
+  return options
+
+
+
+
+
+if __name__ == '__main__':
+
+  options = parse_options()
+
+  repositories = tuf.util.load_json_file(options.CONFIG_PATH)
+  updaters = create_updaters(repositories)
+  destination_directories = {}
+  for repository_name, repository in repositories.items():
+    destination_directories[repository_name] = \
+      repository['destination_directory']
+
+  # Remove the socket left by a daemon that did not exit cleanly.
+  if os.path.exists(options.SOCKET_PATH) and \
+     stat.S_ISSOCK(os.stat(options.SOCKET_PATH).st_mode):
+    os.remove(options.SOCKET_PATH)
+
+  daemon = UpdateDaemon(options.SOCKET_PATH, updaters,
+                        destination_directories)
+  daemon.start_refreshers()
+  try:
+    daemon.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    daemon.server_close()
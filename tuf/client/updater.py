@@ -98,19 +98,31 @@
   for target in updated_targets:
     updater.download_target(target, destination_directory)
 
+  # Alternatively, download them all at the same time, a few at a time.
+  updater.download_targets(updated_targets, destination_directory)
+
 """
 
+import bisect
+import collections
+import copy
 import errno
+import heapq
 import logging
 import os
+import Queue
+import random
 import shutil
+import threading
 import time
+import urlparse
 
 import tuf
 import tuf.conf
 import tuf.download
 import tuf.formats
 import tuf.hash
+import tuf.hooks
 import tuf.keydb
 import tuf.log
 import tuf.mirrors
@@ -154,6 +166,19 @@ class Updater(object):
     
     self.name:
       The name of the updater instance.
+
+    self.hooks:
+      The hooks of the events of this updater (see 'tuf.hooks'), and the
+      payloads of the events:
+        download_started: filepath, file_type, mirror, offset
+        download_finished: filepath, file_type, mirror, length, seconds
+        mirror_failed: filepath, file_type, mirror, error, length, seconds
+        signature_verified: rolename, signature_count, seconds
+        metadata_installed: rolename, version, length, seconds
+      'mirror' is the URL of the file on the mirror, 'offset' the first byte
+      requested from it, and 'length' the number of bytes received from it or
+      installed.  A file is 'download_finished' once it has been verified.
+      The chunks of every download are hooks of 'tuf.download'.
  
   <Updater Methods>
     refresh():
@@ -178,6 +203,10 @@ class Updater(object):
     target(file_path):
       Returns the target information for a specific file identified by its file
       path.  This target method also downloads the metadata of updated targets.
+
+    targets(file_paths):
+      Returns the target information for several files at once, refreshing
+      the metadata of each of the roles they are delegated to only once.
     
     updated_targets(targets, destination_directory):
       After the client has retrieved the target information for those targets
@@ -195,6 +224,12 @@ class Updater(object):
       served by the repository but have since been removed, can be deleted
       from disk by the client by calling this method.
 
+    snapshot():
+      Returns the latest published 'MetadataSnapshot'.  Its target methods
+      (target(), all_targets(), targets_of_role()) never download anything
+      and never wait on a refresh in progress, so they may be called from
+      any thread.
+
   """
 
   def __init__(self, updater_name, repository_mirrors):
@@ -279,7 +314,53 @@ class Updater(object):
     # paths, the dict values fileinfo data. This information can help determine
     # whether a metadata file has changed and so needs to be re-downloaded.
     self.fileinfo = {}
+
+    # Store the validators (i.e., the ETag and Last-Modified headers) of the
+    # timestamp metadata last downloaded from each mirror, by URL, so that
+    # refresh() downloads it again only if it has changed.
+    self.validators = {}
+
+    # Whether the last call to refresh() updated all of the top-level roles.
+    self.refresh_completed = False
     
+    # Store the keys and roles of the repository.  Every updater has its own
+    # key and role databases, so that several updaters, for different
+    # repositories, may be used in the same process.
+    self.keydb = tuf.keydb.KeyDB()
+    self.roledb = tuf.roledb.RoleDB()
+
+    # Serialize the methods that update the metadata (refresh() and the
+    # target methods that refresh delegated roles).  Readers of the published
+    # snapshot never acquire this lock.
+    self._lock = threading.RLock()
+
+    # Serialize the refreshes of the metadata of each delegated role, which
+    # may be refreshed by several threads at once (see
+    # _refresh_delegated_roles() and _prefetch_delegated_roles()).
+    # rolename (string): lock (threading.Lock)
+    self._role_locks = {}
+    self._role_locks_lock = threading.Lock()
+
+    # The latest published 'MetadataSnapshot', and the live metadata objects
+    # that were copied into it, so that only roles whose metadata has since
+    # been replaced are copied again by _publish_snapshot().
+    self._snapshot = None
+    self._snapshot_sources = {}
+
+    # The sorted names of the roles listed in the current release metadata,
+    # indexed once per release version (see _release_rolenames()).
+    self._release_index = None
+
+    # Collect statistics of the work done, if enabled (see
+    # 'tuf.conf.UPDATER_STATS' and stats()).
+    self._stats = UpdaterStats(enabled=tuf.conf.UPDATER_STATS)
+
+    # The hooks of the events of this updater.
+    self.hooks = tuf.hooks.HookRegistry(['download_started',
+                                         'download_finished', 'mirror_failed',
+                                         'signature_verified',
+                                         'metadata_installed'])
+
     # Store the location of the client's metadata directory.
     self.metadata_directory = {}
     
@@ -309,6 +390,15 @@ class Updater(object):
       message = 'Missing '+repr(previous_path)+'.  This path must exist.'
       raise tuf.RepositoryError(message)
     self.metadata_directory['previous'] = previous_path
+
+    # Store the verified target files, by digest, if the target cache is
+    # enabled (see 'tuf.conf.TARGET_CACHE_SIZE').
+    self.target_cache = None
+    if tuf.conf.TARGET_CACHE_SIZE is not None:
+      target_cache_directory = os.path.join(repository_directory, 'cache',
+                                            'targets')
+      self.target_cache = TargetCache(target_cache_directory,
+                                      tuf.conf.TARGET_CACHE_SIZE)
     
     # Load current and previous metadata.
     for metadata_set in ['current', 'previous']:
@@ -321,6 +411,10 @@ class Updater(object):
       message = 'No root of trust! Could not find the "root.txt" file.'
       raise tuf.RepositoryError(message)
 
+    # Publish the metadata loaded from disk, so that a snapshot is available
+    # before the first refresh.
+    self._publish_snapshot()
+
 
 
 
@@ -336,6 +430,200 @@ class Updater(object):
 
 
 
+  def snapshot(self):
+    """
+    <Purpose>
+      Return the latest published snapshot of the trusted metadata.  The
+      snapshot is an immutable copy of a complete, verified set of metadata
+      (an epoch), published only after refresh() has successfully updated all
+      of the top-level roles.  Threads may thus look up targets in it while
+      another thread is refreshing this updater, without waiting for the
+      refresh or seeing partially updated metadata.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A 'MetadataSnapshot' object.
+
+    """
+
+    return self._snapshot
+
+
+
+
+
+  def stats(self):
+    """
+    <Purpose>
+      Return the statistics of the work done by this updater since it was
+      created, or since reset_stats() was last called: the durations of each
+      phase (download, decompress, hash, json_parse, schema_check,
+      signature_verify, install) for every metadata role and for target files
+      ('target'), the bytes received from each mirror, and counters of cache
+      hits and misses, mirror failures, and resumed downloads.  Statistics are
+      only collected if 'tuf.conf.UPDATER_STATS' was True when the updater was
+      created.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A dictionary, as returned by UpdaterStats.as_dict().
+
+    """
+
+    return self._stats.as_dict()
+
+
+
+
+
+  def reset_stats(self):
+    """
+    <Purpose>
+      Forget the statistics returned by stats().
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self._stats.reset()
+
+
+
+
+
+  def _publish_snapshot(self):
+    """
+    <Purpose>
+      Publish a new 'MetadataSnapshot' of the current metadata, replacing the
+      one returned by snapshot().  Metadata objects are replaced, never
+      modified, when roles are updated, so only the roles whose metadata
+      object has changed since the last snapshot are copied; the others are
+      shared with the previous snapshot.  Roles removed from the role
+      database (e.g., expired delegated roles) are left out, and so are
+      delegated roles whose metadata is not the version listed by the current
+      release metadata (e.g., a role that changed on the repository since it
+      was last loaded), until they are updated.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The published snapshot is replaced, in a single assignment, if the
+      metadata has changed since it was published.
+
+    <Returns>
+      None.
+
+    """
+
+    current_metadata = self.metadata['current']
+    trusted_roles = [rolename for rolename in current_metadata
+                     if self.roledb.role_exists(rolename) and
+                     self._is_released_version(rolename)]
+
+    # Nothing to do if the metadata is the same as that of the last snapshot.
+    if self._snapshot is not None and \
+       sorted(trusted_roles) == sorted(self._snapshot_sources) and \
+       all(current_metadata[rolename] is self._snapshot_sources[rolename]
+           for rolename in trusted_roles):
+      return
+
+    metadata = {}
+    snapshot_sources = {}
+    for rolename in trusted_roles:
+      metadata_object = current_metadata[rolename]
+      if self._snapshot_sources.get(rolename) is metadata_object:
+        metadata[rolename] = self._snapshot.metadata[rolename]
+      else:
+        metadata[rolename] = copy.deepcopy(metadata_object)
+      snapshot_sources[rolename] = metadata_object
+
+    if self._snapshot is None:
+      epoch = 1
+    else:
+      epoch = self._snapshot.epoch + 1
+
+    logger.debug('Publishing metadata epoch '+repr(epoch)+'.')
+    self._snapshot_sources = snapshot_sources
+    self._snapshot = MetadataSnapshot(epoch, metadata, dict(self.fileinfo),
+                                      self)
+
+
+
+
+
+  def _is_released_version(self, rolename):
+    """
+    <Purpose>
+      Determine whether the current metadata of the delegated role 'rolename'
+      is the version listed by the current release metadata.  The top-level
+      roles are always updated by refresh() along with the release metadata,
+      so they are.
+
+    <Arguments>
+      rolename:
+        The name of the role.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      Boolean.
+
+    """
+
+    if not rolename.startswith('targets/'):
+      return True
+
+    metadata_filename = rolename + '.txt'
+    release_metadata = self.metadata['current'].get('release')
+    if release_metadata is None or \
+       metadata_filename not in release_metadata['meta'] or \
+       metadata_filename not in self.fileinfo:
+      return False
+
+    try:
+      return not self._fileinfo_has_changed(metadata_filename,
+                                    release_metadata['meta'][metadata_filename])
+    except KeyError:
+      return False
+
+
+
+
+
   def _load_metadata_from_file(self, metadata_set, metadata_role):
     """
     <Purpose>
@@ -403,7 +691,7 @@ class Updater(object):
           self._rebuild_key_and_role_db()
         elif metadata_object['_type'] == 'Targets':
           # TODO: Should we also remove the keys of the delegated roles?
-          tuf.roledb.remove_delegated_roles(metadata_role)
+          self.roledb.remove_delegated_roles(metadata_role)
           self._import_delegations(metadata_role)
 
 
@@ -445,8 +733,8 @@ class Updater(object):
     # The metadata files for delegated roles are also not loaded when the
     # repository is first instantiated.  Due to this setup, reloading delegated
     # roles is not required here.
-    tuf.keydb.create_keydb_from_root_metadata(self.metadata['current']['root'])
-    tuf.roledb.create_roledb_from_root_metadata(self.metadata['current']['root'])
+    self.keydb.create_keydb_from_root_metadata(self.metadata['current']['root'])
+    self.roledb.create_roledb_from_root_metadata(self.metadata['current']['root'])
 
 
 
@@ -498,7 +786,7 @@ class Updater(object):
         # We specify the keyid to ensure that it's the correct keyid
         # for the key.
         try:
-          tuf.keydb.add_rsakey(rsa_key, keyid)
+          self.keydb.add_rsakey(rsa_key, keyid)
         except tuf.KeyAlreadyExistsError:
           pass
         except (tuf.FormatError, tuf.Error), e:
@@ -512,11 +800,11 @@ class Updater(object):
     # Add the roles to the role database.
     for roleinfo in roles_info:
       try:
-        # NOTE: tuf.roledb.add_role will take care
+        # NOTE: self.roledb.add_role will take care
         # of the case where rolename is None.
         rolename = roleinfo.get('name')
         logger.debug('Adding delegated role: '+str(rolename)+'.')
-        tuf.roledb.add_role(rolename, roleinfo)
+        self.roledb.add_role(rolename, roleinfo)
       except tuf.RoleAlreadyExistsError, e:
         logger.warn('Role already exists: '+rolename)
       except:
@@ -540,6 +828,10 @@ class Updater(object):
       The latest copies for delegated metadata are downloaded and updated
       by the target methods.
 
+      The timestamp metadata is downloaded only if it has changed since the
+      last refresh (HTTP conditional GET).  If it has not, neither have the
+      other top-level roles, so only their expiration is checked.
+
     <Arguments>
       None.
 
@@ -559,40 +851,65 @@ class Updater(object):
     
     """
 
-    # The timestamp role does not have signed metadata about it; otherwise we
-    # would need an infinite regress of metadata. Therefore, we use some
-    # default, sane metadata about it.
-    DEFAULT_TIMESTAMP_FILEINFO = {
-      'hashes':None,
-      'length': tuf.conf.DEFAULT_TIMESTAMP_REQUIRED_LENGTH
-    }
+    with self._lock:
+      # The timestamp role does not have signed metadata about it; otherwise we
+      # would need an infinite regress of metadata. Therefore, we use some
+      # default, sane metadata about it.
+      DEFAULT_TIMESTAMP_FILEINFO = {
+        'hashes':None,
+        'length': tuf.conf.DEFAULT_TIMESTAMP_REQUIRED_LENGTH
+      }
+
+      # Update the top-level metadata.  The _update_metadata_if_changed() and
+      # _update_metadata() calls below do NOT perform an update if there
+      # is insufficient trusted signatures for the specified metadata.
+      # Raise 'tuf.NoWorkingMirrorError' if an update fails.
+
+      # Use default but sane information for timestamp metadata, and do not
+      # require strict checks on its required length.  The timestamp is only
+      # downloaded if it has changed since it was last downloaded from a mirror.
+      try:
+        self._update_metadata('timestamp', DEFAULT_TIMESTAMP_FILEINFO,
+                              conditional=True)
+      except tuf.NotModifiedError:
+        timestamp_modified = False
+      else:
+        timestamp_modified = True
+
+      # An unchanged timestamp means that the other top-level roles have not
+      # changed either, so there is nothing to update, unless the last refresh
+      # failed midway.
+      if timestamp_modified or not self.refresh_completed:
+        self.refresh_completed = False
 
-    # Update the top-level metadata.  The _update_metadata_if_changed() and
-    # _update_metadata() calls below do NOT perform an update if there
-    # is insufficient trusted signatures for the specified metadata.
-    # Raise 'tuf.NoWorkingMirrorError' if an update fails.
+        self._update_metadata_if_changed('release',
+                                         referenced_metadata='timestamp')
 
-    # Use default but sane information for timestamp metadata, and do not
-    # require strict checks on its required length.
-    self._update_metadata('timestamp', DEFAULT_TIMESTAMP_FILEINFO)
+        self._update_metadata_if_changed('root')
 
-    self._update_metadata_if_changed('release', referenced_metadata='timestamp')
+        self._update_metadata_if_changed('targets')
 
-    self._update_metadata_if_changed('root')
+        self.refresh_completed = True
 
-    self._update_metadata_if_changed('targets')
+      else:
+        logger.info('The timestamp has not changed.  Skipping the update of '
+                    'the other top-level roles.')
 
-    # Updated the top-level metadata (which all had valid signatures), however,
-    # have they expired?  Raise 'tuf.ExpiredMetadataError' if any of the metadata
-    # has expired.
-    for metadata_role in ['timestamp', 'root', 'release', 'targets']:
-      self._ensure_not_expired(metadata_role)
+      # Updated the top-level metadata (which all had valid signatures),
+      # however, have they expired?  Raise 'tuf.ExpiredMetadataError' if any of
+      # the metadata has expired.
+      for metadata_role in ['timestamp', 'root', 'release', 'targets']:
+        self._ensure_not_expired(metadata_role)
 
+      # Publish the new, complete set of verified metadata to the readers of
+      # snapshot().
+      self._publish_snapshot()
 
 
 
 
-  def __check_hashes(self, file_object, trusted_hashes):
+
+  def __check_hashes(self, file_object, trusted_hashes, rolename='target'):
     """
     <Purpose>
       A helper function that verifies multiple secure hashes of the downloaded
@@ -609,6 +926,10 @@ class Updater(object):
         A dictionary with hash-algorithm names as keys and hashes as dict values.
         The hashes should be in the hexdigest format.
 
+      rolename:
+        The role of the metadata file, or 'target' for a target file, for the
+        statistics of the updater.
+
     <Exceptions>
       tuf.BadHashError, if the hashes don't match.
 
@@ -622,14 +943,16 @@ class Updater(object):
 
     # Verify each trusted hash of 'trusted_hashes'.  Raise exception if
     # any of the hashes are incorrect and return if all are correct.
-    for algorithm, trusted_hash in trusted_hashes.items():
-      digest_object = tuf.hash.digest(algorithm)
-      digest_object.update(file_object.read())
-      computed_hash = digest_object.hexdigest()
-      if trusted_hash != computed_hash:
-        raise tuf.BadHashError(trusted_hash, computed_hash)
-      else:
-        logger.info('The file\'s '+algorithm+' hash is correct: '+trusted_hash)
+    with self._stats.time(rolename, 'hash'):
+      for algorithm, trusted_hash in trusted_hashes.items():
+        digest_object = tuf.hash.digest(algorithm)
+        digest_object.update(file_object.read())
+        computed_hash = digest_object.hexdigest()
+        if trusted_hash != computed_hash:
+          raise tuf.BadHashError(trusted_hash, computed_hash)
+        else:
+          logger.info('The file\'s '+algorithm+' hash is correct: '+\
+                      trusted_hash)
 
 
 
@@ -675,6 +998,47 @@ class Updater(object):
 
 
 
+  def __hard_check_uncompressed_file_length(self, file_object,
+                                            uncompressed_file_length):
+    """
+    <Purpose>
+      A helper function that checks the expected uncompressed length of a
+      decompressed file-like object.  The length of the file must be strictly
+      equal to the expected length.
+
+    <Arguments>
+      file_object:
+        A tuf.util.TempFile file-like object.
+
+      uncompressed_file_length:
+        A nonnegative integer that is the expected uncompressed length of the
+        file.
+
+    <Exceptions>
+      tuf.DownloadLengthMismatchError, if the lengths don't match.
+
+    <Side Effects>
+      The position of 'file_object' is reset to the start of the file.
+
+    <Returns>
+      None.
+
+    """
+
+    file_object.seek(0, os.SEEK_END)
+    observed_length = file_object.tell()
+    file_object.seek(0)
+    if observed_length != uncompressed_file_length:
+      raise tuf.DownloadLengthMismatchError(uncompressed_file_length,
+                                            observed_length)
+    else:
+      logger.debug('uncompressed file length ('+str(observed_length)+\
+                   ') == trusted length ('+str(uncompressed_file_length)+')')
+
+
+
+
+
   def __soft_check_compressed_file_length(self, file_object,
                                           compressed_file_length):
     """
@@ -716,11 +1080,14 @@ class Updater(object):
 
 
   def get_target_file(self, target_filepath, compressed_file_length,
-                      uncompressed_file_hashes):
+                      uncompressed_file_hashes, compression=None,
+                      uncompressed_file_length=None):
     """
     <Purpose>
       Safely download a target file up to a certain length, and check its
-      hashes thereafter.
+      hashes thereafter.  If 'compression' is given, the compressed version
+      of the target file is downloaded instead, and decompressed while it is
+      downloaded.
 
     <Arguments>
       target_filepath:
@@ -733,6 +1100,16 @@ class Updater(object):
       uncompressed_file_hashes:
         The expected hashes of the target file.
 
+      compression:
+        The compression algorithm of the compressed version of the target
+        file to download, a key of 'tuf.util.COMPRESSION_EXTENSIONS', or None
+        to download the target file itself.
+
+      uncompressed_file_length:
+        The expected length of the target file, which is checked once the
+        compressed version is decompressed.  Required if 'compression' is
+        given.
+
     <Exceptions>
       tuf.NoWorkingMirrorError:
         The target could not be fetched. This is raised only when all known
@@ -752,8 +1129,33 @@ class Updater(object):
       # Every target file must have its length and hashes inspected.
       self.__hard_check_compressed_file_length(target_file_object,
                                                compressed_file_length)
+      if compression is not None:
+        self.__hard_check_uncompressed_file_length(target_file_object,
+                                                   uncompressed_file_length)
       self.__check_hashes(target_file_object, uncompressed_file_hashes)
 
+    # A compressed target is served next to the target, with the extension of
+    # its compression algorithm (e.g., 'file.txt.gz').
+    if compression is not None:
+      tuf.formats.LENGTH_SCHEMA.check_match(uncompressed_file_length)
+      target_filepath = target_filepath + '.' + \
+        tuf.util.COMPRESSION_EXTENSIONS[compression]
+      return self.__get_file(target_filepath, verify_uncompressed_target_file,
+                             'target', compressed_file_length,
+                             download_safely=True, compression=compression,
+                             uncompressed_file_length=uncompressed_file_length)
+
+    # Large target files may be downloaded in segments.  Should that fail, we
+    # fall back to downloading them in a single stream from each mirror.
+    threshold = tuf.conf.SEGMENTED_DOWNLOAD_THRESHOLD
+    if threshold is not None and compressed_file_length >= threshold:
+      target_file_object = \
+        self.__get_file_in_segments(target_filepath,
+                                    verify_uncompressed_target_file,
+                                    compressed_file_length)
+      if target_file_object is not None:
+        return target_file_object
+
     return self.__get_file(target_filepath, verify_uncompressed_target_file,
                            'target', compressed_file_length,
                            download_safely=True, compression=None)
@@ -806,12 +1208,14 @@ class Updater(object):
 
     metadata = metadata_file_object.read()
     try:
-      metadata_signable = tuf.util.load_json_string(metadata)
+      with self._stats.time(metadata_role, 'json_parse'):
+        metadata_signable = tuf.util.load_json_string(metadata)
     except Exception, exception:
       raise tuf.InvalidMetadataJSONError(exception)
     else:
       # Ensure the loaded 'metadata_signable' is properly formatted.
-      tuf.formats.check_signable_object_format(metadata_signable)
+      with self._stats.time(metadata_role, 'schema_check'):
+        tuf.formats.check_signable_object_format(metadata_signable)
 
     # Is 'metadata_signable' newer than the currently installed
     # version?
@@ -832,16 +1236,22 @@ class Updater(object):
                                        metadata_signable['signed'])
 
     # Verify the signature on the downloaded metadata object.
-    valid = tuf.sig.verify(metadata_signable, metadata_role)
+    start_time = time.time()
+    with self._stats.time(metadata_role, 'signature_verify'):
+      valid = tuf.sig.verify(metadata_signable, metadata_role, self.keydb,
+                             self.roledb)
     if not valid:
       raise tuf.BadSignatureError(metadata_role)
+    self.hooks.dispatch('signature_verified', rolename=metadata_role,
+                        signature_count=len(metadata_signable['signatures']),
+                        seconds=time.time() - start_time)
 
 
 
 
 
   def unsafely_get_metadata_file(self, metadata_role, metadata_filepath,
-                                 compressed_file_length):
+                                 compressed_file_length, conditional=False):
     """
     <Purpose>
       Unsafely download a metadata file up to a certain length. The actual file
@@ -859,11 +1269,19 @@ class Updater(object):
         The expected compressed length of the metadata file. If the file is not
         compressed, then it will simply be its uncompressed length.
 
+      conditional:
+        Whether to download the metadata file only if it has changed since it
+        was last downloaded from the mirror.  See __get_file().
+
     <Exceptions>
       tuf.NoWorkingMirrorError:
         The metadata could not be fetched. This is raised only when all known
         mirrors failed to provide a valid copy of the desired metadata file.
 
+      tuf.NotModifiedError:
+        If 'conditional' is True and a mirror replied that the metadata file
+        has not changed.
+
     <Side Effects>
       The metadata file is downloaded from all known repository mirrors in the
       worst case. If a valid copy of the metadata file is found, it is stored
@@ -883,7 +1301,7 @@ class Updater(object):
     return self.__get_file(metadata_filepath,
                            unsafely_verify_uncompressed_metadata_file, 'meta',
                            compressed_file_length, download_safely=False,
-                           compression=None)
+                           compression=None, conditional=conditional)
 
 
 
@@ -891,7 +1309,8 @@ class Updater(object):
 
   def safely_get_metadata_file(self, metadata_role, metadata_filepath,
                                compressed_file_length,
-                               uncompressed_file_hashes, compression):
+                               uncompressed_file_hashes, compression,
+                               uncompressed_file_length=None):
     """
     <Purpose>
       Safely download a metadata file up to a certain length, and check its
@@ -914,6 +1333,10 @@ class Updater(object):
       compression:
         The name of the compression algorithm used to compress the metadata.
 
+      uncompressed_file_length:
+        The expected length of the uncompressed metadata file.  Required if
+        'compression' is given; the metadata is not decompressed past it.
+
     <Exceptions>
       tuf.NoWorkingMirrorError:
         The metadata could not be fetched. This is raised only when all known
@@ -932,14 +1355,120 @@ class Updater(object):
     def safely_verify_uncompressed_metadata_file(metadata_file_object):
       self.__hard_check_compressed_file_length(metadata_file_object,
                                                compressed_file_length)
-      self.__check_hashes(metadata_file_object, uncompressed_file_hashes)
+      self.__check_hashes(metadata_file_object, uncompressed_file_hashes,
+                          metadata_role)
       self.__verify_uncompressed_metadata_file(metadata_file_object,
                                                metadata_role)
 
+    if compression is not None:
+      tuf.formats.LENGTH_SCHEMA.check_match(uncompressed_file_length)
+
     return self.__get_file(metadata_filepath,
                            safely_verify_uncompressed_metadata_file, 'meta',
                            compressed_file_length, download_safely=True,
-                           compression=compression)
+                           compression=compression,
+                           uncompressed_file_length=uncompressed_file_length)
+
+
+
+
+
+  def __get_metadata_file_from_delta(self, metadata_role, delta_fileinfo,
+                                     uncompressed_file_hashes):
+    """
+    <Purpose>
+      Try to build the new version of the metadata of 'metadata_role' by
+      downloading its delta (e.g., 'targets.txt.delta') and applying it to the
+      current version.  The delta is verified against the length and hashes
+      listed for it in the release metadata, and the result as thoroughly as
+      a downloaded metadata file.  See 'tuf.formats.DELTA_SCHEMA'.
+
+    <Arguments>
+      metadata_role:
+        The role name of the metadata.
+
+      delta_fileinfo:
+        The length and hashes of the delta file.
+
+      uncompressed_file_hashes:
+        The expected hashes of the new version of the metadata file.
+
+    <Exceptions>
+      None.  If the delta cannot be used for any reason (e.g., the current
+      version of the metadata is not the base of the delta), the error is
+      logged and None is returned, so that the caller downloads the whole
+      metadata file instead.
+
+    <Side Effects>
+      The delta file is downloaded from a repository mirror.
+
+    <Returns>
+      A tuf.util.TempFile file-like object containing the new version of the
+      metadata, or None.
+
+    """
+
+    uncompressed_metadata_filename = metadata_role + '.txt'
+    delta_filename = uncompressed_metadata_filename + '.delta'
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    uncompressed_metadata_filename)
+
+    if metadata_role not in self.metadata['current'] or \
+       not os.path.exists(current_filepath):
+      return None
+
+    def verify_delta_file(delta_file_object):
+      self.__hard_check_compressed_file_length(delta_file_object,
+                                               delta_fileinfo['length'])
+      self.__check_hashes(delta_file_object, delta_fileinfo['hashes'],
+                          metadata_role)
+
+    metadata_file_object = None
+    try:
+      delta_file_object = self.__get_file(delta_filename, verify_delta_file,
+                                          'meta', delta_fileinfo['length'],
+                                          download_safely=True,
+                                          compression=None)
+      try:
+        delta = tuf.util.load_json_string(delta_file_object.read())
+      finally:
+        delta_file_object.close_temp_file()
+      tuf.formats.DELTA_SCHEMA.check_match(delta)
+
+      # The delta only applies to the version of the metadata it was made
+      # from.
+      if self._fileinfo_has_changed(uncompressed_metadata_filename,
+                                    delta['base']):
+        raise tuf.Error('The current '+repr(uncompressed_metadata_filename)+\
+                        ' is not the base of '+repr(delta_filename)+'.')
+
+      current_file_object = open(current_filepath, 'rb')
+      try:
+        current_data = current_file_object.read()
+      finally:
+        current_file_object.close()
+
+      metadata_file_object = \
+        tuf.util.TempFile(spool_size=tuf.conf.TEMPFILE_SPOOL_SIZE)
+      metadata_file_object.write(tuf.util.apply_delta(current_data,
+                                                      delta['edits']))
+      self.__check_hashes(metadata_file_object, uncompressed_file_hashes,
+                          metadata_role)
+      self.__verify_uncompressed_metadata_file(metadata_file_object,
+                                               metadata_role)
+
+    except Exception, exception:
+      logger.warn('Could not update '+repr(uncompressed_metadata_filename)+\
+                  ' from '+repr(delta_filename)+': '+repr(exception)+\
+                  '.  Downloading the whole file.')
+      if metadata_file_object is not None:
+        metadata_file_object.close_temp_file()
+      return None
+
+    logger.debug('Updated '+repr(uncompressed_metadata_filename)+' from '+\
+                 repr(delta_filename)+'.')
+    self._stats.increment('delta_updates')
+    return metadata_file_object
 
 
 
@@ -949,12 +1478,16 @@ class Updater(object):
   # function into two separate ones: one for "safe" download, and the other one
   # for "unsafe" download? This should induce safer and more readable code.
   def __get_file(self, filepath, verify_uncompressed_file, file_type,
-                 compressed_file_length, download_safely, compression):
+                 compressed_file_length, download_safely, compression,
+                 conditional=False, uncompressed_file_length=None):
     """
     <Purpose>
       Try downloading, up to a certain length, a metadata or target file from a
       list of known mirrors. As soon as the first valid copy of the file is
-      found, the rest of the mirrors will be skipped.
+      found, the rest of the mirrors will be skipped.  If a mirror drops the
+      transfer of a safely downloaded file midway, the next mirror is asked
+      for the rest of the file only (with an HTTP Range request).  The length
+      and hashes of the whole file are verified all the same.
 
     <Arguments>
       filepath:
@@ -980,11 +1513,26 @@ class Updater(object):
       compression:
         The name of the compression algorithm used to compress the file.
 
+      conditional:
+        Whether to ask each mirror for the file only if it has changed since
+        the copy last downloaded from that mirror, according to the validators
+        (ETag and Last-Modified) kept in 'self.validators'.  Only supported for
+        unsafe downloads, i.e., of the timestamp metadata.
+
+      uncompressed_file_length:
+        The trusted length of the uncompressed file, if 'compression' is
+        given.  A mirror whose file decompresses to more data is rejected as
+        soon as it does, rather than once the data has been written out.
+
     <Exceptions>
       tuf.NoWorkingMirrorError:
         The metadata could not be fetched. This is raised only when all known
         mirrors failed to provide a valid copy of the desired metadata file.
 
+      tuf.NotModifiedError:
+        If 'conditional' is True and a mirror replied that the file has not
+        changed.
+
     <Side Effects>
       The file is downloaded from all known repository mirrors in the worst
       case. If a valid copy of the file is found, it is stored in a temporary
@@ -1001,76 +1549,252 @@ class Updater(object):
     file_mirror_errors = {}
     file_object = None
 
+    # The bytes received from a mirror that dropped the transfer midway.  They
+    # are kept so that the next mirror only has to serve the rest of the file.
+    # Only "safe" downloads are resumed: their length and hashes are fixed by
+    # signed metadata, so every mirror must serve the very same bytes.
+    partial_file_object = None
+
+    # The statistics of metadata are collected by role, those of all target
+    # files together.
+    stats_rolename = 'target'
+    if file_type == 'meta':
+      stats_rolename = filepath.split('.txt')[0]
+
     for file_mirror in file_mirrors:
-      try:
-        if download_safely:
-          file_object = tuf.download.safe_download(file_mirror,
-                                                   compressed_file_length)
+      while True:
+        resumed = partial_file_object is not None
+        if resumed:
+          temp_file = partial_file_object
+          partial_file_object = None
+          logger.info('Resuming '+repr(filepath)+' from '+file_mirror+' at '+\
+                      'byte '+str(temp_file.get_compressed_length())+'.')
+          self._stats.increment('resumed_downloads')
+        elif file_type == 'meta':
+          # Metadata is usually small, and it is parsed right after it is
+          # downloaded, so it is kept in memory unless it is unusually large.
+          temp_file = tuf.util.TempFile(spool_size=tuf.conf.TEMPFILE_SPOOL_SIZE)
         else:
-          file_object = tuf.download.unsafe_download(file_mirror,
-                                                     compressed_file_length)
+          temp_file = tuf.util.TempFile()
+
+        # Decompress the file while it is being downloaded.
+        if compression and not resumed:
+          temp_file.start_decompression(compression, uncompressed_file_length)
+
+        # The validators are only kept once the file has been verified.
+        validators = None
+        if conditional:
+          validators = dict(self.validators.get(file_mirror, {}))
+
+        start_length = temp_file.get_compressed_length()
+        start_time = time.time()
+        self.hooks.dispatch('download_started', filepath=filepath,
+                            file_type=file_type, mirror=file_mirror,
+                            offset=start_length)
+        try:
+          with self._stats.time(stats_rolename, 'download'):
+            if download_safely:
+              file_object = tuf.download.safe_download(file_mirror,
+                                                       compressed_file_length,
+                                                       temp_file=temp_file)
+            else:
+              file_object = tuf.download.unsafe_download(file_mirror,
+                                                       compressed_file_length,
+                                                       temp_file=temp_file,
+                                                       validators=validators)
+
+        except tuf.NotModifiedError:
+          # Our copy of the file is as recent as the one on this mirror.
+          self._stats.increment('not_modified')
+          temp_file.close_temp_file()
+          raise
 
-        if compression:
-          logger.debug('Decompressing '+str(file_mirror))
-          file_object.decompress_temp_file_object(compression)
-        else:
-          logger.debug('Not decompressing '+str(file_mirror))
+        except Exception, exception:
+          # Remember the error from this mirror, but keep the bytes it did
+          # send us, if any, so that the next mirror may resume from there.
+          logger.exception('Update failed from '+file_mirror+'.')
+          file_mirror_errors[file_mirror] = exception
+          received_length = temp_file.get_compressed_length()
+          self._stats.add_bytes(file_mirror, received_length - start_length)
+          self._stats.increment('mirror_failures')
+          self.hooks.dispatch('mirror_failed', filepath=filepath,
+                              file_type=file_type, mirror=file_mirror,
+                              error=exception,
+                              length=received_length - start_length,
+                              seconds=time.time() - start_time)
+          if download_safely and 0 < received_length < compressed_file_length:
+            partial_file_object = temp_file
+          else:
+            temp_file.close_temp_file()
+          break
 
-        verify_uncompressed_file(file_object)
+        received_length = temp_file.get_compressed_length() - start_length
+        self._stats.add_bytes(file_mirror, received_length)
 
-      except Exception, exception:
-        # Remember the error from this mirror, and "reset" the target file.
-        logger.exception('Update failed from '+file_mirror+'.')
-        file_mirror_errors[file_mirror] = exception
-        file_object = None
-      else:
-        break
+        try:
+          if compression:
+            logger.debug('Decompressing '+str(file_mirror))
+            with self._stats.time(stats_rolename, 'decompress'):
+              file_object.decompress_temp_file_object(compression,
+                                                      uncompressed_file_length)
+          else:
+            logger.debug('Not decompressing '+str(file_mirror))
+
+          verify_uncompressed_file(file_object)
+
+        except Exception, exception:
+          # Remember the error from this mirror, and "reset" the target file.
+          logger.exception('Update failed from '+file_mirror+'.')
+          file_mirror_errors[file_mirror] = exception
+          self._stats.increment('mirror_failures')
+          self.hooks.dispatch('mirror_failed', filepath=filepath,
+                              file_type=file_type, mirror=file_mirror,
+                              error=exception, length=received_length,
+                              seconds=time.time() - start_time)
+          file_object.close_temp_file()
+          file_object = None
+
+          # A resumed file may have been spoiled by a bad prefix served by a
+          # previous mirror.  Download it once more from its first byte, so
+          # that this mirror is not rejected for the fault of another.
+          if resumed:
+            logger.warn('Downloading '+repr(filepath)+' from '+file_mirror+\
+                        ' again, from the first byte.')
+            continue
+          break
 
-    if file_object:
-      return file_object
-    else:
-      logger.exception('Failed to update {0} from all mirrors: {1}'.format(
-                       filepath, file_mirror_errors))
-      raise tuf.NoWorkingMirrorError(file_mirror_errors)
+        else:
+          if validators is not None:
+            self.validators[file_mirror] = validators
+          self.hooks.dispatch('download_finished', filepath=filepath,
+                              file_type=file_type, mirror=file_mirror,
+                              length=received_length,
+                              seconds=time.time() - start_time)
+          return file_object
+
+    if partial_file_object is not None:
+      partial_file_object.close_temp_file()
 
+    logger.exception('Failed to update {0} from all mirrors: {1}'.format(
+                     filepath, file_mirror_errors))
+    raise tuf.NoWorkingMirrorError(file_mirror_errors)
 
 
 
 
-  def _update_metadata(self, metadata_role, fileinfo, compression=None):
+
+  def __get_file_in_segments(self, filepath, verify_uncompressed_file,
+                             compressed_file_length):
     """
     <Purpose>
-      Download, verify, and 'install' the metadata belonging to 'metadata_role'.
-      Calling this function implies the metadata has been updated by the
-      repository and thus needs to be re-downloaded.  The current and previous
-      metadata stores are updated if the newly downloaded metadata is
-      successfully downloaded and verified.
-   
+      Try downloading a target file in segments that are downloaded
+      concurrently and spread across the known mirrors (see
+      tuf.download.safe_segmented_download()).  The assembled file is
+      verified as a whole.
+
     <Arguments>
-      metadata_role:
-        The name of the metadata. This is a role name and should not end
-        in '.txt'.  Examples: 'root', 'targets', 'targets/linux/x86'.
-      
-      fileinfo:
-        A dictionary containing length and hashes of the metadata file.
-        Ex: {"hashes": {"sha256": "3a5a6ec1f353...dedce36e0"}, 
-             "length": 1340}
-        The length must be that of the compressed metadata file if it is
-        compressed, or uncompressed metadata file if it is uncompressed.
-        The hashes must be that of the uncompressed metadata file.
+      filepath:
+        The relative target filepath.
 
-      STRICT_REQUIRED_LENGTH:
-        A Boolean indicator used to signal whether we should perform strict
-        checking of the required length in 'fileinfo'. True by default.  True
-        by default. We explicitly set this to False when we know that we want
+      verify_uncompressed_file:
+        A function which expects an uncompressed file-like object and which
+        will raise an exception in case the file is not valid for any reason.
+
+      compressed_file_length:
+        The expected length of the target file.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The segments of the file are downloaded from the known repository
+      mirrors.  If the assembled file is valid, it is stored in a temporary
+      file and returned.
+
+    <Returns>
+      A tuf.util.TempFile file-like object containing the target, or None if
+      a valid copy of the target could not be downloaded in segments.
+
+    """
+
+    file_mirrors = tuf.mirrors.get_list_of_mirrors('target', filepath,
+                                                   self.mirrors)
+
+    try:
+      file_object = \
+        tuf.download.safe_segmented_download(file_mirrors,
+                                             compressed_file_length,
+                                             tuf.conf.SEGMENTED_DOWNLOAD_COUNT)
+    except Exception, exception:
+      logger.exception('Could not download '+repr(filepath)+' in segments.')
+      return None
+
+    try:
+      verify_uncompressed_file(file_object)
+    except Exception, exception:
+      # We cannot tell which mirror served the bad segment.
+      logger.exception('The segments of '+repr(filepath)+' do not make up a'+\
+                       ' valid file.')
+      file_object.close_temp_file()
+      return None
+
+    return file_object
+
+
+
+
+
+  def _update_metadata(self, metadata_role, fileinfo, compression=None,
+                       delta_fileinfo=None, conditional=False,
+                       uncompressed_file_length=None):
+    """
+    <Purpose>
+      Download, verify, and 'install' the metadata belonging to 'metadata_role'.
+      Calling this function implies the metadata has been updated by the
+      repository and thus needs to be re-downloaded.  The current and previous
+      metadata stores are updated if the newly downloaded metadata is
+      successfully downloaded and verified.
+   
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.txt'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+      
+      fileinfo:
+        A dictionary containing length and hashes of the metadata file.
+        Ex: {"hashes": {"sha256": "3a5a6ec1f353...dedce36e0"}, 
+             "length": 1340}
+        The length must be that of the compressed metadata file if it is
+        compressed, or uncompressed metadata file if it is uncompressed.
+        The hashes must be that of the uncompressed metadata file.
+
+      STRICT_REQUIRED_LENGTH:
+        A Boolean indicator used to signal whether we should perform strict
+        checking of the required length in 'fileinfo'. True by default.  True
+        by default. We explicitly set this to False when we know that we want
         to turn this off for downloading the timestamp metadata, which has no
         signed required_length.
 
       compression:
         A string designating the compression type of 'metadata_role'.
         The 'release' metadata file may be optionally downloaded and stored in
-        compressed form.  Currently, only metadata files compressed with 'gzip'
-        are considered.  Any other string is ignored.
+        compressed form.  It must be one of the compressions supported by
+        tuf.util.TempFile, i.e., a key of 'tuf.util.COMPRESSION_EXTENSIONS'.
+
+      delta_fileinfo:
+        The length and hashes of the delta from the current version of the
+        metadata to the new one (e.g., 'targets.txt.delta'), if the referenced
+        metadata lists one.  The delta is tried first, and the whole metadata
+        file is downloaded if it cannot be used.
+
+      conditional:
+        Whether to download the 'timestamp' metadata only if it has changed
+        since it was last downloaded from the mirror.  Ignored if there is no
+        current timestamp metadata, or for other roles.
+
+      uncompressed_file_length:
+        The length of the uncompressed metadata file, listed by the
+        referenced metadata.  Required if 'compression' is given.
 
     <Exceptions>
       tuf.NoWorkingMirrorError:
@@ -1078,6 +1802,10 @@ class Updater(object):
         failure but rather indicates that all possible ways to update the
         metadata have been tried and failed.
 
+      tuf.NotModifiedError:
+        If 'conditional' is True and the metadata has not changed.  The
+        current metadata is left as it is.
+
     <Side Effects>
       The metadata file belonging to 'metadata_role' is downloaded from a
       repository mirror.  If the metadata is valid, it is stored to the 
@@ -1094,8 +1822,9 @@ class Updater(object):
    
     # The 'release' or Targets metadata may be compressed.  Add the appropriate
     # extension to 'metadata_filename'. 
-    if compression == 'gzip':
-      metadata_filename = metadata_filename + '.gz'
+    if compression is not None:
+      metadata_filename = metadata_filename + '.' + \
+        tuf.util.COMPRESSION_EXTENSIONS[compression]
 
     # Extract file length and file hashes.  They will be passed as arguments
     # to 'download_file' function.
@@ -1122,45 +1851,48 @@ class Updater(object):
     # metadata, but this is easily extend to "unsafe" metadata as well as
     # "safe" targets.
 
-    if metadata_role == 'timestamp':
+    metadata_file_object = None
+    if delta_fileinfo is not None and metadata_role != 'timestamp':
+      metadata_file_object = \
+        self.__get_metadata_file_from_delta(metadata_role, delta_fileinfo,
+                                            uncompressed_file_hashes)
+
+    if metadata_file_object is None and metadata_role == 'timestamp':
+      conditional = conditional and metadata_role in self.metadata['current']
       metadata_file_object = \
         self.unsafely_get_metadata_file(metadata_role, metadata_filename,
-                                        compressed_file_length)
-    else:
+                                        compressed_file_length,
+                                        conditional=conditional)
+    elif metadata_file_object is None:
       metadata_file_object = \
         self.safely_get_metadata_file(metadata_role, metadata_filename,
                                       compressed_file_length,
                                       uncompressed_file_hashes,
-                                      compression=compression)
+                                      compression, uncompressed_file_length)
 
     # The metadata has been verified. Move the metadata file into place.
     # First, move the 'current' metadata file to the 'previous' directory
-    # if it exists.
+    # if it exists.  Metadata is always stored uncompressed.
     current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filename)
+                                    uncompressed_metadata_filename)
     current_filepath = os.path.abspath(current_filepath)
     tuf.util.ensure_parent_dir(current_filepath)
     
     previous_filepath = os.path.join(self.metadata_directory['previous'],
-                                     metadata_filename)
+                                     uncompressed_metadata_filename)
     previous_filepath = os.path.abspath(previous_filepath)
-    if os.path.exists(current_filepath):
-      # Previous metadata might not exist, say when delegations are added.
-      tuf.util.ensure_parent_dir(previous_filepath)
-      shutil.move(current_filepath, previous_filepath)
-
-    # Next, move the verified updated metadata file to the 'current' directory.
-    # Note that the 'move' method comes from tuf.util's TempFile class.
-    # 'metadata_file_object' is an instance of tuf.util.TempFile.
-    metadata_signable = tuf.util.load_json_string(metadata_file_object.read())
-    if compression == 'gzip':
-      current_uncompressed_filepath = \
-        os.path.join(self.metadata_directory['current'],
-                     uncompressed_metadata_filename)
-      current_uncompressed_filepath = \
-        os.path.abspath(current_uncompressed_filepath)
-      metadata_file_object.move(current_uncompressed_filepath)
-    else:
+    start_time = time.time()
+    with self._stats.time(metadata_role, 'install'):
+      if os.path.exists(current_filepath):
+        # Previous metadata might not exist, say when delegations are added.
+        tuf.util.ensure_parent_dir(previous_filepath)
+        shutil.move(current_filepath, previous_filepath)
+
+      # Next, move the verified updated metadata file to the 'current'
+      # directory.  Note that the 'move' method comes from tuf.util's TempFile
+      # class.  'metadata_file_object' is an instance of tuf.util.TempFile.
+      metadata_signable = \
+        tuf.util.load_json_string(metadata_file_object.read())
       metadata_file_object.move(current_filepath)
 
     # Extract the metadata object so we can store it to the metadata store.
@@ -1173,13 +1905,19 @@ class Updater(object):
     logger.debug('Updated '+repr(current_filepath)+'.')
     self.metadata['previous'][metadata_role] = current_metadata_object
     self.metadata['current'][metadata_role] = updated_metadata_object
-    self._update_fileinfo(metadata_filename) 
+    self._update_fileinfo(uncompressed_metadata_filename) 
+    installed_length = self.fileinfo[uncompressed_metadata_filename]['length']
+    self.hooks.dispatch('metadata_installed', rolename=metadata_role,
+                        version=updated_metadata_object['version'],
+                        length=installed_length,
+                        seconds=time.time() - start_time)
 
 
 
 
 
-  def _update_metadata_if_changed(self, metadata_role, referenced_metadata='release'):
+  def _update_metadata_if_changed(self, metadata_role, referenced_metadata='release',
+                                  speculative=False):
     """
     <Purpose>
       Update the metadata for 'metadata_role' if it has changed.  With the
@@ -1191,7 +1929,8 @@ class Updater(object):
         
       If the metadata needs to be updated but an update cannot be obtained,
       this function will delete the file (with the exception of the root
-      metadata, which never gets removed without a replacement).
+      metadata, which never gets removed without a replacement), unless the
+      update is 'speculative'.
 
       Due to the way in which metadata files are updated, it is expected that
       'referenced_metadata' is not out of date and trusted.  The refresh()
@@ -1215,6 +1954,12 @@ class Updater(object):
         other words, it is updated by calling _update_metadata('timestamp')
         and not by this function.  The referenced metadata for 'release'
         is 'timestamp'.  See refresh().
+
+      speculative:
+        Boolean indicating if the update is only attempted ahead of time
+        (e.g., a prefetch), in which case the current metadata and the role
+        database are left as they are if it fails.  The update is attempted
+        again when the metadata is needed.
         
     <Exceptions>
       tuf.NoWorkingMirrorError:
@@ -1271,13 +2016,23 @@ class Updater(object):
     # For 'targets.txt' and delegated metadata, 'referenced_metata'
     # should always be 'release'.  'release.txt' specifies all roles
     # provided by a repository, including their file sizes and hashes.
+    # If several compressed versions are listed, download the smallest one.
     if metadata_role == 'release' or metadata_role.startswith('targets'):
-      gzip_metadata_filename = uncompressed_metadata_filename + '.gz'
-      if gzip_metadata_filename in self.metadata['current'] \
-                                                [referenced_metadata]['meta']:
-        compression = 'gzip'
-        compressed_fileinfo = self.metadata['current'][referenced_metadata] \
-                                    ['meta'][gzip_metadata_filename]
+      referenced_meta = self.metadata['current'][referenced_metadata]['meta']
+      compressed_fileinfo = None
+      for algorithm, extension in tuf.util.COMPRESSION_EXTENSIONS.items():
+        compressed_metadata_filename = \
+          uncompressed_metadata_filename + '.' + extension
+        if compressed_metadata_filename not in referenced_meta:
+          continue
+        if compressed_fileinfo is None or \
+           referenced_meta[compressed_metadata_filename]['length'] < \
+           compressed_fileinfo['length']:
+          compression = algorithm
+          compressed_fileinfo = referenced_meta[compressed_metadata_filename]
+          smallest_metadata_filename = compressed_metadata_filename
+
+      if compressed_fileinfo is not None:
         # NOTE: When we download the compressed file, we care about its
         # compressed length.  However, we check the hash of the uncompressed
         # file; therefore we use the hashes of the uncompressed file.
@@ -1285,7 +2040,7 @@ class Updater(object):
                     'hashes': uncompressed_fileinfo['hashes']}
         logger.debug('Compressed version of '+\
                      repr(uncompressed_metadata_filename)+' is available at '+\
-                     repr(gzip_metadata_filename)+'.')
+                     repr(smallest_metadata_filename)+'.')
       else:
         logger.debug('Compressed version of '+\
                      repr(uncompressed_metadata_filename)+' not available.')
@@ -1293,19 +2048,38 @@ class Updater(object):
     else:
       fileinfo = uncompressed_fileinfo
 
+    # A delta from the current version of the metadata may be listed as well,
+    # which is usually much smaller than even the compressed metadata.
+    delta_fileinfo = self.metadata['current'][referenced_metadata]['meta'].get(
+      uncompressed_metadata_filename + '.delta')
+
     # Simply return if the file has not changed, according to the metadata
     # about the uncompressed file provided by the referenced metadata.
     if not self._fileinfo_has_changed(uncompressed_metadata_filename,
                                       uncompressed_fileinfo):
+      self._stats.increment('metadata_unchanged')
       return
 
     logger.debug('Metadata '+repr(uncompressed_metadata_filename)+\
                  ' has changed.')
+    self._stats.increment('metadata_updated')
+
+    # The uncompressed length bounds the decompression of compressed metadata.
+    uncompressed_length = uncompressed_fileinfo['length']
 
     try:
       self._update_metadata(metadata_role, fileinfo=fileinfo,
-                            compression=compression)
+                            compression=compression,
+                            delta_fileinfo=delta_fileinfo,
+                            uncompressed_file_length=uncompressed_length)
     except:
+      # A failed speculative update proves nothing that the next update of
+      # the metadata will not find out again, so nothing is deleted.
+      if speculative:
+        logger.debug('Metadata for '+str(metadata_role)+' could not be '
+                     'updated ahead of time.')
+        raise
+
       # The current metadata we have is not current but we couldn't
       # get new metadata. We shouldn't use the old metadata anymore.
       # This will get rid of in-memory knowledge of the role and
@@ -1323,7 +2097,7 @@ class Updater(object):
       if metadata_role == 'targets' or metadata_role.startswith('targets/'):
         logger.debug('Removing delegated roles of '+repr(metadata_role)+'.')
         # TODO: Should we also remove the keys of the delegated roles?
-        tuf.roledb.remove_delegated_roles(metadata_role)
+        self.roledb.remove_delegated_roles(metadata_role)
         self._import_delegations(metadata_role)
 
 
@@ -1384,7 +2158,7 @@ class Updater(object):
     # The targets of delegated roles are stored in the parent's
     # metadata file.  Retrieve the parent role of 'metadata_role'
     # to confirm 'metadata_role' contains valid targets.
-    parent_role = tuf.roledb.get_parent_rolename(metadata_role)
+    parent_role = self.roledb.get_parent_rolename(metadata_role)
 
     # Iterate over the targets of 'metadata_role' and confirm they are trusted,
     # or their root parent directory exists in the role delegated paths of the
@@ -1477,25 +2251,19 @@ class Updater(object):
       hash prefix.
     """
 
-    # Assume that 'paths' and 'path_hash_prefixes' are inconsistent until
-    # proven otherwise.
-    consistent = False
+    # No paths are not proven consistent with the prefixes.
+    if len(paths) == 0:
+      return False
 
-    if len(paths) > 0 and len(path_hash_prefixes) > 0:
-      for path in paths:
-        path_hash = self._get_target_hash(path)
-        # Assume that every path is inconsistent until proven otherwise.
-        consistent = False
-
-        for path_hash_prefix in path_hash_prefixes:
-          if path_hash.startswith(path_hash_prefix):
-            consistent = True
-            break
-
-        # This path has no matching path_hash_prefix. Stop looking further.
-        if not consistent: break
+    # str.startswith() is True if any of a tuple of prefixes matches, and
+    # False if the tuple is empty.
+    path_hash_prefixes = tuple(path_hash_prefixes)
+    for path_hash in self._get_target_hashes(paths):
+      # This path has no matching path_hash_prefix. Stop looking further.
+      if not path_hash.startswith(path_hash_prefixes):
+        return False
 
-    return consistent
+    return True
 
 
 
@@ -1698,7 +2466,7 @@ class Updater(object):
     # Remove knowledge of the role.
     if metadata_role in self.metadata['current']:
       del self.metadata['current'][metadata_role]
-    tuf.roledb.remove_role(metadata_role)
+    self.roledb.remove_role(metadata_role)
 
 
 
@@ -1782,26 +2550,33 @@ class Updater(object):
 
     """
     
-    # Load the most up-to-date targets of the 'targets' role and all
-    # delegated roles.
-    self._refresh_targets_metadata(include_delegations=True)
+    with self._lock:
+      # Load the most up-to-date targets of the 'targets' role and all
+      # delegated roles.
+      self._refresh_targets_metadata(include_delegations=True)
+
+      # Publish the delegated metadata loaded above, unless the top-level
+      # metadata it was verified against is only partially refreshed.
+      if self.refresh_completed:
+        self._publish_snapshot()
  
-    all_targets = []
-    # Fetch the targets for the 'targets' role.
-    all_targets = self._targets_of_role('targets', skip_refresh=True)
-
-    # Fetch the targets for the delegated roles.
-    for delegated_role in tuf.roledb.get_delegated_rolenames('targets'):
-      all_targets = self._targets_of_role(delegated_role, all_targets,
-                                          skip_refresh=True)
+      all_targets = []
+      # Fetch the targets for the 'targets' role.
+      all_targets = self._targets_of_role('targets', skip_refresh=True)
+
+      # Fetch the targets for the delegated roles.
+      for delegated_role in self.roledb.get_delegated_rolenames('targets'):
+        all_targets = self._targets_of_role(delegated_role, all_targets,
+                                            skip_refresh=True)
     
-    return all_targets
+      return all_targets
 
 
 
 
 
-  def _refresh_targets_metadata(self, rolename='targets', include_delegations=False):
+  def _refresh_targets_metadata(self, rolename='targets', include_delegations=False,
+                                speculative=False):
     """
     <Purpose>
       Refresh the targets metadata of 'rolename'.  If 'include_delegations'
@@ -1822,6 +2597,12 @@ class Updater(object):
          Boolean indicating if the delegated roles set by 'rolename' should
          be refreshed.
 
+      speculative:
+         Boolean indicating if the roles are refreshed ahead of time (e.g.,
+         prefetched).  If so, metadata that could not be updated is not
+         deleted and expired roles are not removed from the role database;
+         see _update_metadata_if_changed().
+
     <Exceptions>
       tuf.RepositoryError:
         If the metadata file for the 'targets' role is missing
@@ -1830,7 +2611,7 @@ class Updater(object):
     <Side Effects>
       The metadata for the delegated roles are loaded and updated if they
       have changed.  Delegated metadata is removed from the role database if
-      it has expired.
+      it has expired, unless the refresh is 'speculative'.
 
     <Returns>
       None.
@@ -1840,13 +2621,12 @@ class Updater(object):
     roles_to_update = []
 
     # See if this role provides metadata and, if we're including
-    # delegations, look for metadata from delegated roles.
-    role_prefix = rolename + '/'
-    for metadata_path in self.metadata['current']['release']['meta'].keys():
-      if metadata_path == rolename + '.txt':
-        roles_to_update.append(metadata_path[:-len('.txt')])
-      elif include_delegations and metadata_path.startswith(role_prefix):
-        roles_to_update.append(metadata_path[:-len('.txt')])
+    # delegations, look for metadata from delegated roles.  The roles are
+    # listed in sorted order, so parent roles always come first.
+    if rolename + '.txt' in self.metadata['current']['release']['meta']:
+      roles_to_update.append(rolename)
+    if include_delegations:
+      roles_to_update.extend(self._delegated_release_rolenames(rolename))
 
     # Remove the 'targets' role because it gets updated when the targets.txt
     # file is updated in _update_metadata_if_changed('targets').
@@ -1861,23 +2641,207 @@ class Updater(object):
     if not roles_to_update:
       return
 
-    # Sort the roles so that parent roles always come first.
-    roles_to_update.sort()
     logger.debug('Roles to update: '+repr(roles_to_update)+'.')
 
     # Iterate through 'roles_to_update', load its metadata
-    # file, and update it if it has changed.
+    # file, and update it if it has changed.  Another thread may be
+    # refreshing the same role (e.g., a prefetch), so its metadata store
+    # entries, file information and metadata files are only changed while
+    # holding the lock of the role.
     for rolename in roles_to_update:
-      self._load_metadata_from_file('previous', rolename)
-      self._load_metadata_from_file('current', rolename)
+      with self._role_lock(rolename):
+        self._load_metadata_from_file('previous', rolename)
+        self._load_metadata_from_file('current', rolename)
 
-      self._update_metadata_if_changed(rolename)
+        self._update_metadata_if_changed(rolename, speculative=speculative)
 
-      # Remove the role if it has expired.
-      try:
-        self._ensure_not_expired(rolename)
-      except tuf.ExpiredMetadataError:
-        tuf.roledb.remove_role(rolename)
+        # Remove the role if it has expired.  A speculative refresh leaves
+        # that to the refresh of the role when it is needed.
+        if speculative:
+          continue
+        try:
+          self._ensure_not_expired(rolename)
+        except tuf.ExpiredMetadataError:
+          self.roledb.remove_role(rolename)
+
+
+
+
+
+  def _role_lock(self, rolename):
+    """
+    <Purpose>
+      Return the lock that serializes the refreshes of the metadata of
+      'rolename', creating it if this is the first refresh of the role.
+
+    <Arguments>
+      rolename:
+        The name of the role.  Example: 'targets/linux/x86'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The lock is stored for the next refreshes of the role.
+
+    <Returns>
+      A 'threading.Lock' object.
+
+    """
+
+    with self._role_locks_lock:
+      role_lock = self._role_locks.get(rolename)
+      if role_lock is None:
+        role_lock = threading.Lock()
+        self._role_locks[rolename] = role_lock
+
+      return role_lock
+
+
+
+
+
+  def _release_rolenames(self):
+    """
+    <Purpose>
+      Return the sorted names of the roles whose metadata is listed in the
+      current release metadata (e.g., 'targets/linux/x86' for
+      'targets/linux/x86.txt').  The list is built once per version of the
+      release metadata, rather than on every lookup.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The list is stored until the release metadata changes.
+
+    <Returns>
+      A sorted list of role names, which must not be modified.
+
+    """
+
+    release_metadata = self.metadata['current']['release']
+    release_index = self._release_index
+
+    if release_index is None or release_index[0] is not release_metadata or \
+       release_index[1] != release_metadata['version']:
+      rolenames = sorted([metadata_path[:-len('.txt')] for metadata_path in
+                          release_metadata['meta'] if
+                          metadata_path.endswith('.txt')])
+      # Keep the release metadata the list was built from, so that its
+      # identity cannot be reused by newer metadata.
+      release_index = (release_metadata, release_metadata['version'],
+                       rolenames)
+      self._release_index = release_index
+
+    return release_index[2]
+
+
+
+
+
+  def _delegated_release_rolenames(self, rolename):
+    """
+    <Purpose>
+      Return the sorted names of the roles that follow 'rolename' (e.g.,
+      'targets/a' and 'targets/a/b' for 'targets') and are listed in the
+      current release metadata.  They are a contiguous range of
+      _release_rolenames(): the names that start with 'rolename/', which
+      sort before 'rolename0' since '0' follows '/'.
+
+    <Arguments>
+      rolename:
+        The name of a role.  Example: 'targets/linux'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A new sorted list of role names.
+
+    """
+
+    rolenames = self._release_rolenames()
+    start = bisect.bisect_left(rolenames, rolename+'/')
+    end = bisect.bisect_left(rolenames, rolename+'0', start)
+
+    return rolenames[start:end]
+
+
+
+
+
+  def _refresh_delegated_roles(self, rolenames):
+    """
+    <Purpose>
+      Refresh the metadata of several delegated roles at the same time, with
+      _refresh_targets_metadata(), one thread per role and at most
+      'tuf.conf.CONCURRENT_DOWNLOADS' threads.  The roles must not be
+      delegated by one another (e.g., they are all children of the same
+      role), since the metadata of a role is verified with the keys that its
+      parent role delegated.
+
+    <Arguments>
+      rolenames:
+        The list of the delegated roles to refresh.
+
+    <Exceptions>
+      tuf.RepositoryError, tuf.NoWorkingMirrorError:
+        The error of the first role in 'rolenames' that could not be
+        refreshed, raised once all the others have been.
+
+    <Side Effects>
+      The metadata for the delegated roles are loaded and updated if they
+      have changed.
+
+    <Returns>
+      None.
+
+    """
+
+    # Refreshing a single role needs no thread.
+    if len(rolenames) <= 1 or tuf.conf.CONCURRENT_DOWNLOADS <= 1:
+      for rolename in rolenames:
+        self._refresh_targets_metadata(rolename)
+      return
+
+    pending_roles = Queue.Queue()
+    for rolename in rolenames:
+      pending_roles.put(rolename)
+
+    # rolename (string): error (Exception)
+    role_errors = {}
+
+    def refresh_pending_roles():
+      while True:
+        try:
+          rolename = pending_roles.get_nowait()
+        except Queue.Empty:
+          return
+        try:
+          self._refresh_targets_metadata(rolename)
+        except Exception, exception:
+          role_errors[rolename] = exception
+
+    refresh_threads = []
+    for index in range(min(tuf.conf.CONCURRENT_DOWNLOADS, len(rolenames))):
+      refresh_thread = threading.Thread(target=refresh_pending_roles)
+      refresh_thread.daemon = True
+      refresh_thread.start()
+      refresh_threads.append(refresh_thread)
+
+    for refresh_thread in refresh_threads:
+      refresh_thread.join()
+
+    for rolename in rolenames:
+      if rolename in role_errors:
+        raise role_errors[rolename]
 
 
 
@@ -1914,14 +2878,14 @@ class Updater(object):
 
     # See if this role provides metadata.  All the available roles
     # on the repository are specified in the 'release.txt' metadata.
-    targets_metadata_allowed = self.metadata['current']['release']['meta'].keys()
+    targets_metadata_allowed = self.metadata['current']['release']['meta']
     for parent_role in parent_roles:
       parent_role = parent_role + '.txt'
 
       if parent_role not in targets_metadata_allowed:
-        message = '"release.txt" does not provide all the parent roles'+\
+        message = '"release.txt" does not provide all the parent roles '+\
           'of '+repr(rolename)+'.'
-        raise tuf.Repository(message)
+        raise tuf.RepositoryError(message)
 
     # Remove the 'targets' role because it gets updated when the targets.txt
     # file is updated in _update_metadata_if_changed('targets').
@@ -1952,7 +2916,7 @@ class Updater(object):
       try:
         self._ensure_not_expired(rolename)
       except tuf.ExpiredMetadataError:
-        tuf.roledb.remove_role(rolename)
+        self.roledb.remove_role(rolename)
 
 
 
@@ -2001,7 +2965,7 @@ class Updater(object):
 
     logger.debug('Getting targets of role: '+repr(rolename)+'.')
 
-    if not tuf.roledb.role_exists(rolename):
+    if not self.roledb.role_exists(rolename):
       raise tuf.UnknownRoleError(rolename)
 
     # We do not need to worry about the target paths being trusted because
@@ -2066,13 +3030,19 @@ class Updater(object):
 
     """
       
-    # Does 'rolename' have the correct format?
-    # Raise 'tuf.FormatError' if there is a mismatch.
-    tuf.formats.RELPATH_SCHEMA.check_match(rolename)
+    with self._lock:
+      # Does 'rolename' have the correct format?
+      # Raise 'tuf.FormatError' if there is a mismatch.
+      tuf.formats.RELPATH_SCHEMA.check_match(rolename)
 
-    self._refresh_targets_metadata(rolename)
-    
-    return self._targets_of_role(rolename, skip_refresh=True)
+      self._refresh_targets_metadata(rolename)
+
+      # Publish the delegated metadata loaded above, unless the top-level
+      # metadata it was verified against is only partially refreshed.
+      if self.refresh_completed:
+        self._publish_snapshot()
+
+      return self._targets_of_role(rolename, skip_refresh=True)
 
 
 
@@ -2096,6 +3066,9 @@ class Updater(object):
       tuf.UnknownTargetError:
         If 'target_filepath' was not found.
 
+      tuf.RepositoryError, tuf.NoWorkingMirrorError:
+        If the metadata of a role could not be updated.
+
       Any other unforeseen runtime exception.
    
     <Side Effects>
@@ -2107,21 +3080,117 @@ class Updater(object):
 
     """
 
-    # Does 'target_filepath' have the correct format?
+    with self._lock:
+      # Does 'target_filepath' have the correct format?
+      # Raise 'tuf.FormatError' if there is a mismatch.
+      tuf.formats.RELPATH_SCHEMA.check_match(target_filepath)
+
+      # Get target by looking at roles in order of priority tags.
+      target = self._preorder_depth_first_walk(target_filepath)
+
+      # Publish the delegated metadata loaded above, unless the top-level
+      # metadata it was verified against is only partially refreshed.
+      if self.refresh_completed:
+        self._publish_snapshot()
+
+      # Raise an exception if the target information could not be retrieved.
+      if target is None:
+        message = target_filepath+' not found.'
+        logger.error(message)
+        raise tuf.UnknownTargetError(message)
+      # Otherwise, return the found target.
+      else:
+        return target
+
+
+
+
+
+  def targets(self, target_filepaths):
+    """
+    <Purpose>
+      Return the target file information for each of 'target_filepaths', as
+      target() would, but with a single walk of the tree of delegations.  The
+      paths are grouped by the roles they are delegated to, so that the
+      metadata of every role is refreshed only once, and the relevant child
+      roles of a role are refreshed at the same time.
+
+    <Arguments>
+      target_filepaths:
+        The list of the paths to the target files on the repository, relative
+        to the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'target_filepaths' is improperly formatted.
+
+      tuf.RepositoryError, tuf.NoWorkingMirrorError:
+        If the metadata of a role could not be updated.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A dictionary with an entry for each of 'target_filepaths': its target
+      information, conformant to 'tuf.formats.TARGETFILE_SCHEMA', or None if
+      it was not found.
+
+    """
+
+    # Does 'target_filepaths' have the correct format?
     # Raise 'tuf.FormatError' if there is a mismatch.
-    tuf.formats.RELPATH_SCHEMA.check_match(target_filepath)
+    tuf.formats.RELPATHS_SCHEMA.check_match(target_filepaths)
+
+    with self._lock:
+      found_targets = dict.fromkeys(target_filepaths)
+
+      # Ensure the client has the most up-to-date version of 'targets.txt'.
+      # See _preorder_depth_first_walk().
+      self._update_metadata_if_changed('targets')
+
+      # Preorder depth-first traversal of the tree of target delegations, as
+      # in _preorder_depth_first_walk(), with the paths that may still be
+      # found in each role.  The paths found in a role are not looked for in
+      # the roles after it.
+      role_paths = [('targets', set(target_filepaths))]
+      while len(role_paths) > 0:
+        role_name, paths = role_paths.pop(-1)
+        paths = [path for path in paths if found_targets[path] is None]
+        if not paths:
+          continue
+
+        role_metadata = self._current_role_metadata(role_name)
+        targets = role_metadata['targets']
+        for path in paths:
+          if path in targets:
+            logger.debug('Found target '+path+' in role '+role_name)
+            found_targets[path] = {'filepath': path, 'fileinfo': targets[path]}
+
+        # Group the paths left by the child roles they are delegated to.
+        paths = [path for path in paths if found_targets[path] is None]
+        child_roles = role_metadata.get('delegations', {}).get('roles', [])
+        child_role_paths = []
+        for child_role in child_roles:
+          child_paths = set()
+          for path in paths:
+            if self._visit_child_role(child_role, path) is not None:
+              child_paths.add(path)
+          if child_paths:
+            child_role_paths.append((child_role['name'], child_paths))
+
+        # The metadata of the relevant child roles are refreshed together.
+        self._refresh_delegated_roles([child_role_name for child_role_name,
+                                       child_paths in child_role_paths])
 
-    # Get target by looking at roles in order of priority tags.
-    target = self._preorder_depth_first_walk(target_filepath)
+        # Push children in reverse order of appearance onto the stack.
+        role_paths.extend(reversed(child_role_paths))
 
-    # Raise an exception if the target information could not be retrieved.
-    if target is None:
-      message = target_filepath+' not found.'
-      logger.error(message)
-      raise tuf.UnknownTargetError(message)
-    # Otherwise, return the found target.
-    else:
-      return target
+      # Publish the delegated metadata loaded above, unless the top-level
+      # metadata it was verified against is only partially refreshed.
+      if self.refresh_completed:
+        self._publish_snapshot()
+
+      return found_targets
 
 
 
@@ -2144,21 +3213,25 @@ class Updater(object):
         If 'target_filepath' is improperly formatted.
 
       tuf.RepositoryError:
-        If 'target_filepath' was not found.
+        If the metadata of a role that must be interrogated is missing from
+        the release metadata.
    
     <Side Effects>
       The metadata for updated delegated roles are downloaded and stored.
     
     <Returns>
       The target information for 'target_filepath', conformant to
-      'tuf.formats.TARGETFILE_SCHEMA'.
+      'tuf.formats.TARGETFILE_SCHEMA', or None if it was not found.
     
     """
 
     target = None
-    current_metadata = self.metadata['current']
     role_names = ['targets']
 
+    # The threads refreshing the metadata of child roles ahead of the walk,
+    # by role name.  See 'tuf.conf.DELEGATION_PREFETCH_WINDOW'.
+    prefetch_threads = {}
+
     # Ensure the client has the most up-to-date version of 'targets.txt'.
     # Raise 'tuf.NoWorkingMirrorError' if the changed metadata cannot be successfully
     # downloaded and 'tuf.RepositoryError' if the referenced metadata is
@@ -2177,10 +3250,14 @@ class Updater(object):
       # self.metadata['current'][role_name] is currently missing.
       # _refresh_targets_metadata() does not refresh 'targets.txt', it
       # expects _update_metadata_if_changed() to have already refreshed it,
-      # which this function has checked above.
+      # which this function has checked above.  If the metadata was being
+      # prefetched, wait for it; the call below then only has to verify that
+      # it is up-to-date, or raises the error that the prefetch ignored.
+      if role_name in prefetch_threads:
+        prefetch_threads.pop(role_name).join()
       self._refresh_targets_metadata(role_name, include_delegations=False)
 
-      role_metadata = current_metadata[role_name]
+      role_metadata = self._current_role_metadata(role_name)
       targets = role_metadata['targets']
       delegations = role_metadata.get('delegations', {})
       child_roles = delegations.get('roles', [])
@@ -2199,47 +3276,154 @@ class Updater(object):
             logger.debug('Adding child role '+repr(child_role_name))
             role_names.append(child_role_name)
 
+        # Refresh the metadata of the next roles to visit in the background.
+        self._prefetch_delegated_roles(role_names, prefetch_threads)
+
       else:
         logger.debug('Found target in current role '+repr(role_name))
 
+    # Do not leave threads updating the metadata after the walk.
+    for prefetch_thread in prefetch_threads.values():
+      prefetch_thread.join()
+
     return target
 
 
 
 
 
-  def _get_target_from_targets_role(self, role_name, targets, target_filepath):
+  def _current_role_metadata(self, role_name):
     """
     <Purpose>
-      Determine whether the targets role with the given 'role_name' has the
-      target with the name 'target_filepath'.
+      Return the current metadata of 'role_name', which the target methods
+      have just refreshed, so that target() and targets() fail the same way
+      when a role they must interrogate has no metadata.
 
     <Arguments>
       role_name:
-        The name of the targets role that we are inspecting.
-
-      targets:
-        The targets of the Targets role with the name 'role_name'.
-        
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
+        The name of the targets role.  Example: 'targets/linux/x86'.
 
     <Exceptions>
-      None.
-   
+      tuf.RepositoryError:
+        If the metadata of 'role_name' is missing from the release metadata,
+        and so could not be loaded.
+
     <Side Effects>
       None.
-    
+
     <Returns>
-      The target information for 'target_filepath', conformant to
-      'tuf.formats.TARGETFILE_SCHEMA'.
-    
-    """
+      The metadata of 'role_name', conformant to
+      'tuf.formats.TARGETS_SCHEMA'.
 
-    target = None
+    """
 
-    # Does the current role name have our target?
+    try:
+      return self.metadata['current'][role_name]
+    except KeyError:
+      message = 'The metadata of '+repr(role_name)+' is missing from the '+\
+        'release metadata.'
+      logger.error(message)
+      raise tuf.RepositoryError(message)
+
+
+
+
+
+  def _prefetch_delegated_roles(self, role_names, prefetch_threads):
+    """
+    <Purpose>
+      Start refreshing, in the background, the metadata of the next
+      'tuf.conf.DELEGATION_PREFETCH_WINDOW' roles that
+      _preorder_depth_first_walk() will visit, unless they are already being
+      prefetched.
+      The roles on the stack are children of roles whose metadata has been
+      loaded, so their metadata can be verified.  The refreshes are
+      speculative: a role whose metadata could not be updated, or has
+      expired, is left as it is in the metadata store and the role database,
+      and the error is only logged.  The walk refreshes every role again
+      before it inspects it, and reports any error then.  A prefetch changes
+      the metadata of its role under the same per-role lock as any other
+      refresh (see _role_lock()), so it never overlaps with the refresh of
+      that role by the caller.
+
+    <Arguments>
+      role_names:
+        The stack of the roles left to visit; the last role is visited next.
+
+      prefetch_threads:
+        The threads refreshing roles, by role name.  The started threads are
+        added to it.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      Threads are started.
+
+    <Returns>
+      None.
+
+    """
+
+    def prefetch_role(role_name):
+      try:
+        self._refresh_targets_metadata(role_name, include_delegations=False,
+                                       speculative=True)
+      except Exception, exception:
+        logger.debug('Could not prefetch '+repr(role_name)+': '+
+                     repr(exception))
+
+    next_role_names = role_names[-tuf.conf.DELEGATION_PREFETCH_WINDOW:]
+    if tuf.conf.DELEGATION_PREFETCH_WINDOW <= 0:
+      next_role_names = []
+
+    for role_name in reversed(next_role_names):
+      if role_name in prefetch_threads:
+        continue
+
+      logger.debug('Prefetching '+repr(role_name))
+      prefetch_thread = threading.Thread(target=prefetch_role,
+                                         args=(role_name,))
+      prefetch_thread.daemon = True
+      prefetch_thread.start()
+      prefetch_threads[role_name] = prefetch_thread
+
+
+
+
+
+  def _get_target_from_targets_role(self, role_name, targets, target_filepath):
+    """
+    <Purpose>
+      Determine whether the targets role with the given 'role_name' has the
+      target with the name 'target_filepath'.
+
+    <Arguments>
+      role_name:
+        The name of the targets role that we are inspecting.
+
+      targets:
+        The targets of the Targets role with the name 'role_name'.
+        
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      None.
+   
+    <Side Effects>
+      None.
+    
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETFILE_SCHEMA'.
+    
+    """
+
+    target = None
+
+    # Does the current role name have our target?
     logger.debug('Asking role '+repr(role_name)+' about target '+\
       repr(target_filepath))
     for filepath, fileinfo in targets.iteritems():
@@ -2371,80 +3555,240 @@ class Updater(object):
     """
 
     # Calculate the hash of the filepath to determine which bin to find the 
-    # target.  The client currently assumes the repository uses
-    # 'hash_function' to generate hashes.
+    # target, unless it has already been calculated.  The client currently
+    # assumes the repository uses 'hash_function' to generate hashes.
+    key = (hash_function, target_filepath)
+    target_filepath_hash = _TARGET_PATH_HASH_MEMO.get(key)
+    if target_filepath_hash is None:
+      target_filepath_hash = _hash_target_path(target_filepath, hash_function)
+      _TARGET_PATH_HASH_MEMO.update([(key, target_filepath_hash)])
 
-    digest_object = tuf.hash.digest(hash_function)
+    return target_filepath_hash
 
-    try:
-      digest_object.update(target_filepath)
-    except UnicodeEncodeError:
-      # Sometimes, there are Unicode characters in target paths. We assume a
-      # UTF-8 encoding and try to hash that.
-      digest_object = tuf.hash.digest(hash_function)
-      encoded_target_filepath = target_filepath.encode('utf-8')
-      digest_object.update(encoded_target_filepath)
 
-    target_filepath_hash = digest_object.hexdigest() 
 
-    return target_filepath_hash
 
 
+  def _get_target_hashes(self, target_filepaths, hash_function='sha256'):
+    """
+    <Purpose>
+      Compute the hashes of 'target_filepaths', as _get_target_hash() does,
+      e.g., to check all the targets of a hashed bin at once.
+
+    <Arguments>
+      target_filepaths:
+        A list of paths of target files on the repository.
+
+      hash_function:
+        The algorithm used by the repository to generate the hashes of the
+        target filepaths.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The list of the hashes of 'target_filepaths', in the same order.
+
+    """
+
+    memo_get = _TARGET_PATH_HASH_MEMO.get
+    target_filepath_hashes = []
+    new_hashes = []
+
+    for target_filepath in target_filepaths:
+      key = (hash_function, target_filepath)
+      target_filepath_hash = memo_get(key)
+      if target_filepath_hash is None:
+        target_filepath_hash = _hash_target_path(target_filepath, hash_function)
+        new_hashes.append((key, target_filepath_hash))
+      target_filepath_hashes.append(target_filepath_hash)
+
+    if new_hashes:
+      _TARGET_PATH_HASH_MEMO.update(new_hashes)
+
+    return target_filepath_hashes
 
 
 
-  def remove_obsolete_targets(self, destination_directory):
+
+
+  def remove_obsolete_targets(self, destination_directory, dry_run=False):
     """
     <Purpose>
       Remove any files that are in 'previous' but not 'current'.  This
       makes it so if you remove a file from a repository, it actually goes
       away.  The targets for the 'targets' role and all delegated roles
-      are checked.
+      are checked together, so that a target that has moved from one role to
+      another is not removed.  The previous targets of a role that is still
+      delegated, but whose current metadata is not loaded (e.g., it could not
+      be updated) or has expired, are kept.  The targets of a delegated role
+      that has been removed from the repository (see _delegation_removed())
+      are all obsolete.
     
     <Arguments>
       destination_directory:
         The directory containing the target files tracked by TUF.
 
+      dry_run:
+        If True, report the files that would be removed, but do not remove
+        them.
+
     <Exceptions>
       tuf.FormatError:
         If 'destination_directory' is improperly formatted.
-      
-      tuf.RepositoryError:
-        If an error occurred removing any files.
 
     <Side Effects>
-      Target files are removed from disk.
+      Target files are removed from disk, unless 'dry_run' is True.
 
     <Returns>
-      None.
+      A dictionary that reports the obsolete targets:
+      {'removed': [target filepath, ...],
+       'missing': [target filepath, ...],
+       'errors': {target filepath: error message, ...}}
+      The obsolete targets that were removed (or, in a dry run, would be),
+      those that were not in 'destination_directory', and those that could
+      not be removed.
 
     """
   
     # Does 'destination_directory' have the correct format?
     # Raise 'tuf.FormatError' if there is a mismatch.
     tuf.formats.PATH_SCHEMA.check_match(destination_directory)
+    tuf.formats.TOGGLE_SCHEMA.check_match(dry_run)
+
+    # The targets roles known to the client: those loaded in this session,
+    # and those whose metadata was stored by an earlier one.
+    roles = set(self.roledb.get_rolenames())
+    roles.update(self.metadata['current'])
+    roles.update(self.metadata['previous'])
+    current_directory = self.metadata_directory['current']
+    for directory, junk, filenames in \
+      os.walk(os.path.join(current_directory, 'targets')):
+      for filename in filenames:
+        if filename.endswith('.txt'):
+          filepath = os.path.join(directory, filename)
+          roles.add(os.path.relpath(filepath, current_directory)[:-len('.txt')])
+
+    # Collect the previous and current targets of all the targets roles, and
+    # find the targets of 'previous' that are no longer found in 'current'.
+    previous_targets = set()
+    current_targets = set()
+    for role in roles:
+      if not role.startswith('targets'):
+        continue
+
+      # Every target of a role that is no longer delegated is obsolete.
+      if self._delegation_removed(role):
+        for metadata_set in ['previous', 'current']:
+          metadata = self.metadata[metadata_set].get(role)
+          metadata_filepath = \
+            os.path.join(self.metadata_directory[metadata_set], role+'.txt')
+          if metadata is None and os.path.exists(metadata_filepath):
+            metadata = tuf.util.load_json_file(metadata_filepath)['signed']
+          if metadata is not None:
+            previous_targets.update(metadata['targets'])
+        continue
+
+      # The targets of a role that is still delegated, but that could not be
+      # updated or has expired, are all kept.
+      current_metadata = self.metadata['current'].get(role)
+      previous_metadata = self.metadata['previous'].get(role)
+      if current_metadata is None or not self.roledb.role_exists(role):
+        for metadata in [previous_metadata, current_metadata]:
+          if metadata is not None:
+            current_targets.update(metadata['targets'])
+        continue
+
+      current_targets.update(current_metadata['targets'])
+      if previous_metadata is not None:
+        previous_targets.update(previous_metadata['targets'])
+
+    report = {'removed': [], 'missing': [], 'errors': {}}
+    for target in sorted(previous_targets - current_targets):
+      # 'target' is only in 'previous', so remove it.
+      destination = os.path.join(destination_directory, target)
+      if dry_run:
+        if os.path.lexists(destination):
+          report['removed'].append(target)
+        else:
+          report['missing'].append(target)
+        continue
+
+      # Remove the file if it hasn't been removed already.
+      try:
+        os.remove(destination)
+      except OSError, e:
+        # If 'filename' already removed, just log it.
+        if e.errno == errno.ENOENT:
+          logger.debug('File '+repr(destination)+' was already removed.')
+          report['missing'].append(target)
+        else:
+          logger.error(str(e))
+          report['errors'][target] = str(e)
+      except Exception, e:
+        logger.error(str(e))
+        report['errors'][target] = str(e)
+      else:
+        logger.debug('Removed obsolete file: '+repr(destination)+'.')
+        report['removed'].append(target)
+
+    if report['removed']:
+      if dry_run:
+        logger.info('Would remove '+str(len(report['removed']))+\
+                    ' obsolete files from '+repr(destination_directory)+'.')
+      else:
+        logger.warn('Removed '+str(len(report['removed']))+' obsolete '+\
+                    'files from '+repr(destination_directory)+'.')
+
+    return report
+
+
+
+
+
+  def _delegation_removed(self, rolename):
+    """
+    <Purpose>
+      Determine whether the targets role 'rolename' has been removed from the
+      repository: its metadata is no longer listed in the current release
+      metadata, or the current metadata of its parent role (or of an
+      ancestor) no longer delegates to it.  A role whose parent metadata is
+      not loaded is not known to be removed.
+
+    <Arguments>
+      rolename:
+        The name of the targets role.  Example: 'targets/linux/x86'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      Boolean.  True if 'rolename' is no longer delegated, False otherwise.
+
+    """
+
+    if rolename == 'targets':
+      return False
 
-    # Iterate through the rolenames and verify whether the 'previous'
-    # directory contains a target no longer found in 'current'.
-    for role in tuf.roledb.get_rolenames():
-      if role.startswith('targets'):
-        if role in self.metadata['previous'] and self.metadata['previous'][role] != None:
-          for target in self.metadata['previous'][role]['targets'].keys():
-            if target not in self.metadata['current'][role]['targets'].keys():
-              # 'target' is only in 'previous', so remove it.
-              logger.warn('Removing obsolete file: '+repr(target)+'.')
-              # Remove the file if it hasn't been removed already.
-              destination = os.path.join(destination_directory, target) 
-              try:
-                os.remove(destination)
-              except OSError, e:
-                # If 'filename' already removed, just log it.
-                if e.errno == errno.ENOENT:
-                  logger.info('File '+repr(destination)+' was already removed.')
-                else:
-                  logger.error(str(e))
-              except Exception, e:
-                logger.error(str(e))
+    if rolename+'.txt' not in self.metadata['current']['release']['meta']:
+      return True
+
+    parent_role = rolename.rsplit('/', 1)[0]
+    if self._delegation_removed(parent_role):
+      return True
+
+    parent_metadata = self.metadata['current'].get(parent_role)
+    if parent_metadata is None:
+      return False
+
+    child_roles = parent_metadata.get('delegations', {}).get('roles', [])
+    return rolename not in [child_role['name'] for child_role in child_roles]
 
 
 
@@ -2541,7 +3885,8 @@ class Updater(object):
         If a target could not be downloaded from any of the mirrors.
 
     <Side Effects>
-      A target file is saved to the local system.
+      A target file is saved to the local system.  It is served from, and
+      added to, the target cache, if it is enabled.
 
     <Returns>
       None.
@@ -2560,14 +3905,9 @@ class Updater(object):
     target_filepath = target['filepath']
     trusted_length = target['fileinfo']['length']
     trusted_hashes = target['fileinfo']['hashes']
+    trusted_compressions = target['fileinfo'].get('compressions', {})
 
-    # get_target_file checks every mirror and returns the first target
-    # that passes verification.
-    target_file_object = self.get_target_file(target_filepath, trusted_length,
-                                              trusted_hashes)
-   
-    # We acquired a target file object from a mirror.  Move the file into
-    # place (i.e., locally to 'destination_directory').
+    # The target file is saved to 'destination'.  Create its directory.
     destination = os.path.join(destination_directory, target_filepath)
     destination = os.path.abspath(destination)
     target_dirpath = os.path.dirname(destination)
@@ -2580,9 +3920,1288 @@ class Updater(object):
     else:
       logger.warn(str(target_dirpath)+' does not exist.')
 
-    target_file_object.move(destination)
+    # Nothing to download if the target cache has the target.
+    if self.target_cache is not None:
+      with self._stats.time('target', 'install'):
+        cache_hit = self.target_cache.get(trusted_length, trusted_hashes,
+                                          destination)
+      if cache_hit:
+        self._stats.increment('target_cache_hits')
+        return
+      self._stats.increment('target_cache_misses')
+
+    # The target may also be served compressed.  Pick the smallest compressed
+    # version that we can decompress, if it is smaller than the target.
+    compression = None
+    compressed_length = trusted_length
+    for algorithm, compressed_fileinfo in trusted_compressions.items():
+      if algorithm in tuf.util.COMPRESSION_EXTENSIONS and \
+         compressed_fileinfo['length'] < compressed_length:
+        compression = algorithm
+        compressed_length = compressed_fileinfo['length']
+
+    # get_target_file checks every mirror and returns the first target
+    # that passes verification.  Should no mirror serve a valid compressed
+    # version, we fall back to the target itself.
+    target_file_object = None
+    if compression is not None:
+      try:
+        target_file_object = \
+          self.get_target_file(target_filepath, compressed_length,
+                               trusted_hashes, compression=compression,
+                               uncompressed_file_length=trusted_length)
+      except tuf.NoWorkingMirrorError, exception:
+        logger.warn('Could not download the '+compression+' version of '+\
+                    repr(target_filepath)+'.  Downloading it uncompressed.')
+
+    if target_file_object is None:
+      target_file_object = self.get_target_file(target_filepath,
+                                                trusted_length,
+                                                trusted_hashes)
+   
+    # We acquired a target file object from a mirror.  Move the file into
+    # place (i.e., locally to 'destination_directory').
+    with self._stats.time('target', 'install'):
+      target_file_object.move(destination)
+
+    if self.target_cache is not None:
+      self.target_cache.add(trusted_hashes, destination)
+
+
+
+
+
+  def download_targets(self, targets, destination_directory,
+                       concurrency=None):
+    """
+    <Purpose>
+      Download several targets at the same time, and verify they are trusted.
+      Every target is downloaded and verified exactly as download_target()
+      does, by one of 'concurrency' threads.  A target that fails does not
+      stop the others.  Targets with the same length and hashes are downloaded
+      once, and then hardlinked or copied to their other paths.
+
+    <Arguments>
+      targets:
+        The targets to be downloaded.  Conformant to
+        'tuf.formats.TARGETFILES_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target files.
+
+      concurrency:
+        The number of targets downloaded at the same time.  If None,
+        'tuf.conf.CONCURRENT_DOWNLOADS'.
+
+    <Exceptions>
+      tuf.FormatError:
+        If the arguments are not properly formatted.
+
+      tuf.DownloadTargetsError:
+        If some of the targets could not be downloaded, once all the others
+        have been.
+
+    <Side Effects>
+      The target files are saved to the local system.
+
+    <Returns>
+      None.
+
+    """
+
+    # Do the arguments have the correct format?
+    # Raise 'tuf.FormatError' if the check fail.
+    tuf.formats.TARGETFILES_SCHEMA.check_match(targets)
+    tuf.formats.PATH_SCHEMA.check_match(destination_directory)
+    if concurrency is None:
+      concurrency = tuf.conf.CONCURRENT_DOWNLOADS
+    tuf.formats.LENGTH_SCHEMA.check_match(concurrency)
+
+    # Group the targets with the same content, i.e., the same length and
+    # hashes, in the order they are listed.  The content of each group is
+    # downloaded once.
+    target_groups = []
+    target_groups_by_content = {}
+    for target in targets:
+      fileinfo = target['fileinfo']
+      content = (fileinfo['length'], tuple(sorted(fileinfo['hashes'].items())))
+      if content not in target_groups_by_content:
+        target_groups_by_content[content] = []
+        target_groups.append(target_groups_by_content[content])
+      target_groups_by_content[content].append(target)
+
+    pending_target_groups = Queue.Queue()
+    for target_group in target_groups:
+      pending_target_groups.put(target_group)
+
+    # target_filepath (string): error (Exception)
+    target_errors = {}
+
+    def download_pending_targets():
+      while True:
+        try:
+          target_group = pending_target_groups.get_nowait()
+        except Queue.Empty:
+          return
+        self._download_target_group(target_group, destination_directory,
+                                    target_errors)
+
+    download_threads = []
+    for index in range(min(max(concurrency, 1), len(target_groups))):
+      download_thread = threading.Thread(target=download_pending_targets)
+      download_thread.daemon = True
+      download_thread.start()
+      download_threads.append(download_thread)
+
+    for download_thread in download_threads:
+      download_thread.join()
+
+    if target_errors:
+      raise tuf.DownloadTargetsError(target_errors)
+
+
+
+
+
+  def _download_target_group(self, target_group, destination_directory,
+                             target_errors):
+    """
+    <Purpose>
+      Download the first target of 'target_group', and save it as each of the
+      other targets, which have the same length and hashes, by hardlinking or
+      copying it (see 'tuf.conf.TARGET_HARDLINKS').  If the first target
+      cannot be downloaded, the next one is tried.
+
+    <Arguments>
+      target_group:
+        The targets with the same content.  Conformant to
+        'tuf.formats.TARGETFILES_SCHEMA'.
+
+      destination_directory:
+        The directory to save the target files.
+
+      target_errors:
+        The errors of the targets that could not be saved, by filepath.  The
+        errors of 'target_group' are added to it.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The target files are saved to the local system.
+
+    <Returns>
+      None.
+
+    """
+
+    downloaded_filepath = None
+    for target in target_group:
+      destination = os.path.abspath(os.path.join(destination_directory,
+                                                 target['filepath']))
+      try:
+        if downloaded_filepath is None:
+          self.download_target(target, destination_directory)
+          downloaded_filepath = destination
+
+        else:
+          logger.info('Saving '+repr(target['filepath'])+', which has the '
+                      'same content as '+repr(downloaded_filepath)+'.')
+          try:
+            os.makedirs(os.path.dirname(destination))
+          except OSError, e:
+            if e.errno != errno.EEXIST:
+              raise
+          tuf.util.link_or_copy_file(downloaded_filepath, destination,
+                                     tuf.conf.TARGET_HARDLINKS)
+
+      except Exception, exception:
+        logger.exception('Could not download '+repr(target['filepath'])+'.')
+        target_errors[target['filepath']] = exception
+
+
+
+
+
+class MetadataSnapshot(object):
+  """
+  <Purpose>
+    A read-only view of a complete, verified set of metadata published by an
+    Updater (see Updater.snapshot()).  Unlike the target methods of Updater,
+    the target methods of a snapshot never download or update metadata, so
+    they never block on network I/O and may be called from any number of
+    threads while the Updater is refreshing.  The snapshot has no metadata
+    for the delegated roles that the Updater had not loaded, or had not
+    updated to the version of the current release metadata, when it was
+    published.  A lookup that needs the metadata of such a role fails, rather
+    than be answered by a less trusted role; the caller may then use the
+    target methods of the Updater, which update the metadata.
+
+  <MetadataSnapshot Attributes>
+    self.epoch:
+      The number of the snapshot.  It is incremented every time an Updater
+      publishes metadata that has changed.
+
+    self.metadata:
+      Dictionary holding a copy of the current metadata of the roles, by role
+      name.  Example: {'root': ROOTROLE_SCHEMA,
+                       'targets': TARGETSROLE_SCHEMA, ...}
+
+    self.fileinfo:
+      A copy of the lengths and hashes of the metadata files, when the
+      snapshot was published.
+
+  """
+
+  def __init__(self, epoch, metadata, fileinfo, updater):
+    """
+    <Purpose>
+      Constructor.  Snapshots are created by Updater._publish_snapshot(); the
+      objects in 'metadata' and 'fileinfo' must not be modified afterwards.
+
+    <Arguments>
+      epoch:
+        The number of the snapshot.
+
+      metadata:
+        The copied metadata of the trusted roles, by role name.
+
+      fileinfo:
+        The copied file information of the metadata files.
+
+      updater:
+        The Updater that published the snapshot.  Only its stateless
+        delegation helpers are used.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self.epoch = epoch
+    self.metadata = metadata
+    self.fileinfo = fileinfo
+    self._updater = updater
+
+
+
+
+
+  def targets_of_role(self, rolename='targets'):
+    """
+    <Purpose>
+      Return a list of the targets directly specified by 'rolename', conformant
+      to 'tuf.formats.TARGETFILES_SCHEMA'.  The list is empty if the snapshot
+      has no metadata for 'rolename'.
+
+    <Arguments>
+      rolename:
+        The name of the role whose list of targets are wanted.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'rolename' is improperly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A list of targets, conformant to 'tuf.formats.TARGETFILES_SCHEMA'.
+
+    """
+
+    # Does 'rolename' have the correct format?
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.RELPATH_SCHEMA.check_match(rolename)
+
+    targets = []
+    if rolename not in self.metadata:
+      return targets
+
+    for filepath, fileinfo in self.metadata[rolename]['targets'].items():
+      targets.append({'filepath': filepath, 'fileinfo': fileinfo})
+
+    return targets
+
+
+
+
+
+  def all_targets(self):
+    """
+    <Purpose>
+      Return a list of the targets of the 'targets' role and of all the
+      delegated roles in the snapshot, conformant to
+      'tuf.formats.TARGETFILES_SCHEMA'.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A list of targets, conformant to 'tuf.formats.TARGETFILES_SCHEMA'.
+
+    """
+
+    all_targets = self.targets_of_role('targets')
+
+    # Parent roles sort before their delegated roles.
+    for rolename in sorted(self.metadata):
+      if rolename.startswith('targets/'):
+        all_targets.extend(self.targets_of_role(rolename))
+
+    return all_targets
+
+
+
+
+
+  def target(self, target_filepath):
+    """
+    <Purpose>
+      Return the target file information for 'target_filepath', found in the
+      most trusted role of the snapshot that provides it.  The tree of
+      delegations is interrogated in the same order as Updater.target().
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'target_filepath' is improperly formatted.
+
+      tuf.UnknownTargetError:
+        If 'target_filepath' was not found, or if a role that must be
+        interrogated for it is not in the snapshot.  Updater.target() may
+        find it.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETFILE_SCHEMA'.
+
+    """
+
+    # Does 'target_filepath' have the correct format?
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.RELPATH_SCHEMA.check_match(target_filepath)
+
+    target = None
+    role_names = ['targets']
+
+    # Preorder depth-first traversal of the tree of target delegations.
+    while len(role_names) > 0 and target is None:
+      role_name = role_names.pop(-1)
+
+      # A role that was not loaded might provide the target, and the roles
+      # after it must not answer in its place.
+      if role_name not in self.metadata:
+        message = target_filepath+' not found: the metadata of '+\
+          repr(role_name)+' is not in the snapshot.'
+        raise tuf.UnknownTargetError(message)
+
+      role_metadata = self.metadata[role_name]
+      target = self._updater._get_target_from_targets_role(role_name,
+                                    role_metadata['targets'], target_filepath)
+
+      if target is None:
+        child_roles = role_metadata.get('delegations', {}).get('roles', [])
+
+        # Push children in reverse order of appearance onto the stack.
+        for child_role in reversed(child_roles):
+          child_role_name = self._updater._visit_child_role(child_role,
+                                                            target_filepath)
+          if child_role_name is not None:
+            role_names.append(child_role_name)
+
+    if target is None:
+      message = target_filepath+' not found.'
+      raise tuf.UnknownTargetError(message)
+
+    return target
+
+
+
+
+
+class BackgroundRefresher(object):
+  """
+  <Purpose>
+    Call the refresh() method of an Updater from a background thread, every
+    'tuf.conf.REFRESH_INTERVAL' seconds give or take a random
+    'tuf.conf.REFRESH_JITTER' fraction of it, and sooner if the metadata of a
+    role is about to expire.  Foreground threads look up targets in the
+    Updater's snapshot() and never wait for the network.
+
+    refresher = tuf.client.updater.BackgroundRefresher(updater)
+    refresher.start()
+    ...
+    target = updater.snapshot().target('file.txt')
+    ...
+    refresher.stop()
+
+  <BackgroundRefresher Attributes>
+    self.updater:
+      The Updater that is refreshed.
+
+    self.last_success:
+      The time (a Unix timestamp) the last successful refresh completed, or
+      None.
+
+    self.last_failure:
+      The time the last failed refresh stopped, or None.
+
+    self.last_error:
+      The exception raised by the last failed refresh, or None.
+
+  """
+
+  def __init__(self, updater, interval=None, jitter=None):
+    """
+    <Purpose>
+      Constructor.  The refresher does not run until start() is called.
+
+    <Arguments>
+      updater:
+        The Updater to refresh.
+
+      interval:
+        The number of seconds between refreshes.  If None,
+        'tuf.conf.REFRESH_INTERVAL'.
+
+      jitter:
+        The fraction of 'interval' by which an interval may randomly be
+        longer or shorter.  If None, 'tuf.conf.REFRESH_JITTER'.
+
+    <Exceptions>
+      tuf.FormatError:
+        If 'interval' or 'jitter' is improperly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    if interval is None:
+      interval = tuf.conf.REFRESH_INTERVAL
+    if jitter is None:
+      jitter = tuf.conf.REFRESH_JITTER
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.LENGTH_SCHEMA.check_match(interval)
+    if not isinstance(jitter, (int, float)) or not 0 <= jitter < 1:
+      raise tuf.FormatError('Invalid jitter: '+repr(jitter))
+
+    self.updater = updater
+    self.interval = interval
+    self.jitter = jitter
+
+    self.last_success = None
+    self.last_failure = None
+    self.last_error = None
+
+    # A heap of (expiry time, role name) tuples, for the metadata of the
+    # roles in the Updater's snapshot, rebuilt after every refresh.
+    self._expiries = []
+
+    self._stop_event = threading.Event()
+    self._thread = None
+
+
+
+
+
+  def start(self):
+    """
+    <Purpose>
+      Start refreshing the Updater in a background thread.  The first
+      refresh happens immediately.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      tuf.Error:
+        If the refresher is already running.
+
+    <Side Effects>
+      A daemon thread is started.
+
+    <Returns>
+      None.
+
+    """
+
+    if self._thread is not None and self._thread.is_alive():
+      raise tuf.Error('The refresher of '+repr(self.updater.name)+' is '
+                      'already running.')
+
+    self._stop_event.clear()
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+
+
+
+
+  def stop(self, timeout=None):
+    """
+    <Purpose>
+      Stop refreshing the Updater.  A refresh in progress is not interrupted;
+      this method waits for it, for at most 'timeout' seconds.
+
+    <Arguments>
+      timeout:
+        The number of seconds to wait for the background thread, or None to
+        wait for as long as it takes.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The background thread stops.
+
+    <Returns>
+      None.
+
+    """
+
+    self._stop_event.set()
+    if self._thread is not None:
+      self._thread.join(timeout)
+
+
+
+
+
+  def _run(self):
+    """
+    <Purpose>
+      The loop of the background thread: refresh, then wait for
+      _next_refresh_delay() seconds or until stop() is called.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The Updater is refreshed.
+
+    <Returns>
+      None.
+
+    """
+
+    while not self._stop_event.is_set():
+      self.refresh()
+      self._stop_event.wait(self._next_refresh_delay(time.time()))
+
+
+
+
+
+  def refresh(self):
+    """
+    <Purpose>
+      Refresh the Updater now, record the outcome, and schedule the next
+      refresh before the soonest expiry of the refreshed metadata.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.  Errors are logged and recorded in 'self.last_error'.
+
+    <Side Effects>
+      The metadata of the Updater is refreshed.
+
+    <Returns>
+      True if the refresh succeeded, False otherwise.
+
+    """
+
+    try:
+      self.updater.refresh()
+
+    except Exception, exception:
+      logger.exception('Could not refresh '+repr(self.updater.name)+'.')
+      self.last_failure = time.time()
+      self.last_error = exception
+      succeeded = False
+
+    else:
+      self.last_success = time.time()
+      succeeded = True
+
+    # Rebuild the heap of expiries from the published metadata.
+    expiries = []
+    for rolename, metadata in self.updater.snapshot().metadata.items():
+      try:
+        expires = tuf.formats.parse_time(metadata['expires'])
+      except (KeyError, tuf.FormatError):
+        continue
+      expiries.append((expires, rolename))
+    heapq.heapify(expiries)
+    self._expiries = expiries
+
+    return succeeded
+
+
+
+
+
+  def _next_refresh_delay(self, now):
+    """
+    <Purpose>
+      Return the number of seconds until the next refresh: the interval,
+      randomly made longer or shorter by up to 'self.jitter' of it, or less
+      if the metadata of a role expires within 'tuf.conf.REFRESH_BEFORE_EXPIRY'
+      seconds of the end of it.  Expiries that are already that close to
+      'now' are skipped: the last refresh did not renew them, and refreshing
+      in a loop would not help.
+
+    <Arguments>
+      now:
+        The current time, a Unix timestamp.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      Past entries are removed from the heap of expiries.
+
+    <Returns>
+      The number of seconds to wait.
+
+    """
+
+    delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    while self._expiries and \
+          self._expiries[0][0] - tuf.conf.REFRESH_BEFORE_EXPIRY <= now:
+      heapq.heappop(self._expiries)
+
+    if self._expiries:
+      expires, rolename = self._expiries[0]
+      expiry_delay = expires - tuf.conf.REFRESH_BEFORE_EXPIRY - now
+      if expiry_delay < delay:
+        logger.debug('Refreshing '+repr(self.updater.name)+' before '+
+                     repr(rolename)+' expires.')
+        delay = expiry_delay
+
+    return delay
+
+
+
+
+
+class TargetCache(object):
+  """
+  <Purpose>
+    A cache of verified target files, stored by sha256 digest, so that a
+    target is downloaded once however many destination directories or
+    repositories it is saved to.  A target is served from the cache only if
+    the cached file still has its trusted length and sha256 digest.  Its size
+    is kept under its maximum by removing the least recently used files,
+    according to an index kept in memory, which is built from the
+    modification times of the cached files (updated when they are used) when
+    the cache is created.  The cache may be shared by several processes:
+    files are added to it atomically, and the files added by another process
+    are indexed when they are first used.
+
+  <TargetCache Attributes>
+    self.directory:
+      The directory of the cached files.
+
+    self.max_size:
+      The maximum total size, in bytes, of the cached files.
+
+  """
+
+  def __init__(self, directory, max_size):
+    """
+    <Purpose>
+      Constructor.
+
+    <Arguments>
+      directory:
+        The directory of the cached files.  It is created if it does not
+        exist.
+
+      max_size:
+        The maximum total size, in bytes, of the cached files.
+
+    <Exceptions>
+      tuf.FormatError:
+        If the arguments are improperly formatted.
+
+    <Side Effects>
+      'directory' is created, and the files already in it are indexed.
+
+    <Returns>
+      None.
+
+    """
+
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.PATH_SCHEMA.check_match(directory)
+    tuf.formats.LENGTH_SCHEMA.check_match(max_size)
+
+    self.directory = directory
+    self.max_size = max_size
+
+    try:
+      os.makedirs(directory)
+    except OSError, e:
+      if e.errno != errno.EEXIST:
+        raise
+
+    # The size of every cached file, from the least to the most recently
+    # used, and their total size.  The cache may be used by several threads.
+    # cached filepath (string): size (int)
+    self._cached_files = collections.OrderedDict()
+    self._total_size = 0
+    self._lock = threading.Lock()
+
+    # (modification time, size, path) of every cached file.
+    cached_files = []
+    for dirpath, dirnames, filenames in os.walk(self.directory):
+      for filename in filenames:
+        if filename.endswith('.tmp'):
+          continue
+        cached_filepath = os.path.join(dirpath, filename)
+        try:
+          file_stat = os.stat(cached_filepath)
+        except OSError:
+          continue
+        cached_files.append((file_stat.st_mtime, file_stat.st_size,
+                             cached_filepath))
+
+    for mtime, file_size, cached_filepath in sorted(cached_files):
+      self._cached_files[cached_filepath] = file_size
+      self._total_size += file_size
+
+
+
+
+
+  def _get_cached_filepath(self, trusted_hashes):
+    """
+    <Purpose>
+      Return the path of the cached file with the sha256 digest in
+      'trusted_hashes', or None if there is no valid sha256 digest.
+
+    """
+
+    digest = trusted_hashes.get('sha256')
+    if digest is None or not tuf.formats.HEX_SCHEMA.matches(digest):
+      return None
+
+    digest = digest.lower()
+    return os.path.join(self.directory, digest[:2], digest)
+
+
+
+
+
+  def get(self, trusted_length, trusted_hashes, destination):
+    """
+    <Purpose>
+      Save the cached target with 'trusted_length' and 'trusted_hashes' to
+      'destination', if the cache has it, by hardlinking or copying it (see
+      'tuf.conf.TARGET_HARDLINKS').  A cached file that no longer
+      matches is removed.
+
+    <Arguments>
+      trusted_length:
+        The trusted length of the target.
+
+      trusted_hashes:
+        The trusted hashes of the target.
+
+      destination:
+        The path to save the target to.  An existing file is replaced.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      'destination' is created, and the cached file marked as used.
+
+    <Returns>
+      True if the target was saved to 'destination', False otherwise.
+
+    """
+
+    cached_filepath = self._get_cached_filepath(trusted_hashes)
+    if cached_filepath is None or not os.path.exists(cached_filepath):
+      return False
+
+    # The cached file may have been modified, e.g., through a hardlink.  The
+    # file is named after its sha256 digest, which is the only one checked.
+    trusted_digest = os.path.basename(cached_filepath)
+    try:
+      file_size = os.path.getsize(cached_filepath)
+      if file_size != trusted_length:
+        raise tuf.DownloadLengthMismatchError(trusted_length, file_size)
+      digest_object = tuf.hash.digest_filename(cached_filepath, 'sha256')
+      if digest_object.hexdigest() != trusted_digest:
+        raise tuf.BadHashError(trusted_digest, digest_object.hexdigest())
+
+    except (IOError, OSError, tuf.Error), exception:
+      logger.warn('Removing '+repr(cached_filepath)+' from the target cache: '+
+                  str(exception))
+      with self._lock:
+        self._remove(cached_filepath)
+      return False
+
+    with self._lock:
+      self._index(cached_filepath, file_size)
+
+    try:
+      os.utime(cached_filepath, None)
+      tuf.util.link_or_copy_file(cached_filepath, destination,
+                                 tuf.conf.TARGET_HARDLINKS)
+    except (IOError, OSError), exception:
+      logger.warn('Could not save '+repr(destination)+' from the target '
+                  'cache: '+str(exception))
+      return False
+
+    logger.info('Saved '+repr(destination)+' from the target cache.')
+    return True
+
+
+
+
+
+  def add(self, trusted_hashes, filepath):
+    """
+    <Purpose>
+      Add 'filepath', a verified target with 'trusted_hashes', to the cache,
+      and remove the least recently used files if the cache is then too big.
+      Errors are logged and otherwise ignored.
+
+    <Arguments>
+      trusted_hashes:
+        The trusted hashes of the target.
+
+      filepath:
+        The path of the verified target.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The target is hardlinked or copied into the cache, and other cached
+      files may be removed.
+
+    <Returns>
+      None.
+
+    """
+
+    cached_filepath = self._get_cached_filepath(trusted_hashes)
+    if cached_filepath is None:
+      return
+
+    try:
+      tuf.util.ensure_parent_dir(cached_filepath)
+
+      # Rename the new file into place, so that other processes never see a
+      # partially written cached file.
+      temporary_filepath = cached_filepath+'.'+str(os.getpid())+'.'+\
+        str(threading.current_thread().ident)+'.tmp'
+      tuf.util.link_or_copy_file(filepath, temporary_filepath,
+                                 tuf.conf.TARGET_HARDLINKS)
+      file_size = os.path.getsize(temporary_filepath)
+      os.rename(temporary_filepath, cached_filepath)
+      with self._lock:
+        self._index(cached_filepath, file_size)
+        self._evict()
+
+    except (IOError, OSError, tuf.Error), exception:
+      logger.warn('Could not add '+repr(filepath)+' to the target cache: '+
+                  str(exception))
+
+
+
+
+
+  def _index(self, cached_filepath, file_size):
+    """
+    <Purpose>
+      Index 'cached_filepath', of 'file_size' bytes, as the most recently
+      used cached file.  The caller must hold 'self._lock'.
+
+    """
+
+    self._total_size -= self._cached_files.pop(cached_filepath, 0)
+    self._cached_files[cached_filepath] = file_size
+    self._total_size += file_size
+
+
+
+
+
+  def _remove(self, cached_filepath):
+    """
+    <Purpose>
+      Remove 'cached_filepath' from the cache and its index, unless another
+      process already has.  An error is logged, and the file no longer
+      indexed.  The caller must hold 'self._lock'.
+
+    """
+
+    self._total_size -= self._cached_files.pop(cached_filepath, 0)
+
+    try:
+      os.remove(cached_filepath)
+    except OSError, e:
+      if e.errno != errno.ENOENT:
+        logger.warn('Could not remove '+repr(cached_filepath)+' from the '+
+                    'target cache: '+str(e))
+
+
+
+
+
+  def _evict(self):
+    """
+    <Purpose>
+      Remove the least recently used cached files until their total size is
+      at most 'self.max_size'.  The caller must hold 'self._lock'.
+
+    """
+
+    while self._total_size > self.max_size and self._cached_files:
+      cached_filepath = next(iter(self._cached_files))
+      logger.debug('Evicting '+repr(cached_filepath)+' from the target cache.')
+      self._remove(cached_filepath)
+
+
+
+
+
+class UpdaterStats(object):
+  """
+  <Purpose>
+    Statistics of the work done by an Updater, to find out where the time of
+    a refresh or a download goes: the number and total duration of each phase
+    of the handling of every metadata role and of target files (e.g., the
+    download, decompression, and hashing of a file, the parsing, format check,
+    and signature verification of metadata, and the installation of the
+    verified file), the number of bytes received from each mirror, and event
+    counters (e.g., cache hits and misses, and mirror failures).  Statistics
+    may be collected by several threads at once.  A disabled UpdaterStats
+    collects nothing, and costs a method call per event.
+
+  <UpdaterStats Attributes>
+    self.enabled:
+      Whether statistics are collected.
+
+  """
+
+  def __init__(self, enabled=True):
+    """
+    <Purpose>
+      Constructor.
+
+    <Arguments>
+      enabled:
+        Whether statistics are collected.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self.enabled = enabled
+    self._lock = threading.Lock()
+    self.reset()
+
+
+
+
+
+  def reset(self):
+    """
+    <Purpose>
+      Forget the statistics collected so far.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    with self._lock:
+      # role name: {phase: [count, seconds]}
+      self._durations = {}
+      # mirror: bytes
+      self._mirror_bytes = {}
+      # counter name: count
+      self._counters = {}
+
+
+
+
+
+  def time(self, rolename, phase):
+    """
+    <Purpose>
+      Return a context manager that adds the duration of its block to the
+      statistics of 'phase' of 'rolename'.
+
+      with stats.time('root', 'signature_verify'):
+        ...
+
+    <Arguments>
+      rolename:
+        The role name, or 'target' for target files.
+
+      phase:
+        The name of the phase.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A context manager.
+
+    """
+
+    if not self.enabled:
+      return _NULL_STATS_TIMER
+
+    return _StatsTimer(self, rolename, phase)
+
+
+
+
+
+  def add_duration(self, rolename, phase, seconds):
+    """
+    <Purpose>
+      Add a duration of 'seconds' to the statistics of 'phase' of 'rolename'.
+
+    """
+
+    if not self.enabled:
+      return
+
+    with self._lock:
+      phase_durations = self._durations.setdefault(rolename, {})
+      count_and_seconds = phase_durations.setdefault(phase, [0, 0.0])
+      count_and_seconds[0] += 1
+      count_and_seconds[1] += seconds
+
+
+
+
+
+  def add_bytes(self, url, length):
+    """
+    <Purpose>
+      Add 'length' bytes to those received from the mirror of 'url'.  Mirrors
+      are identified by the scheme and network location of their URLs.
+
+    """
+
+    if not self.enabled or length <= 0:
+      return
+
+    parsed_url = urlparse.urlparse(url)
+    mirror = parsed_url.scheme+'://'+parsed_url.netloc
+
+    with self._lock:
+      self._mirror_bytes[mirror] = self._mirror_bytes.get(mirror, 0) + length
+
+
+
+
+
+  def increment(self, counter, count=1):
+    """
+    <Purpose>
+      Add 'count' to the counter named 'counter'.
+
+    """
+
+    if not self.enabled:
+      return
+
+    with self._lock:
+      self._counters[counter] = self._counters.get(counter, 0) + count
+
+
+
+
+
+  def as_dict(self):
+    """
+    <Purpose>
+      Return a copy of the statistics collected so far.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A dictionary of the form:
+      {'durations': {'root': {'download': {'count': 1, 'seconds': 0.12},
+                              'signature_verify': {...}, ...},
+                     'target': {...}, ...},
+       'mirror_bytes': {'http://localhost:8001': 13323, ...},
+       'counters': {'target_cache_hits': 3, 'mirror_failures': 1, ...}}
+
+    """
+
+    with self._lock:
+      durations = {}
+      for rolename, phase_durations in self._durations.items():
+        durations[rolename] = {}
+        for phase, (count, seconds) in phase_durations.items():
+          durations[rolename][phase] = {'count': count, 'seconds': seconds}
+
+      return {'durations': durations,
+              'mirror_bytes': dict(self._mirror_bytes),
+              'counters': dict(self._counters)}
+
+
+
+
+
+class _StatsTimer(object):
+  """Add the duration of a 'with' block to an UpdaterStats."""
+
+  def __init__(self, stats, rolename, phase):
+    self.stats = stats
+    self.rolename = rolename
+    self.phase = phase
+
+  def __enter__(self):
+    self.start_time = time.time()
+
+  def __exit__(self, exception_type, exception_value, traceback):
+    self.stats.add_duration(self.rolename, self.phase,
+                            time.time() - self.start_time)
+
+
+
+
+
+class _NullStatsTimer(object):
+  """The timer of a disabled UpdaterStats."""
+
+  def __enter__(self):
+    pass
+
+  def __exit__(self, exception_type, exception_value, traceback):
+    pass
+
+
+_NULL_STATS_TIMER = _NullStatsTimer()
+
+
+
+
+
+def _hash_target_path(target_filepath, hash_function):
+  """Return the hex digest of 'target_filepath' with 'hash_function'."""
+
+  digest_object = tuf.hash.digest(hash_function)
+
+  try:
+    digest_object.update(target_filepath)
+  except UnicodeEncodeError:
+    # Sometimes, there are Unicode characters in target paths. We assume a
+    # UTF-8 encoding and try to hash that.
+    digest_object = tuf.hash.digest(hash_function)
+    encoded_target_filepath = target_filepath.encode('utf-8')
+    digest_object.update(encoded_target_filepath)
+
+  return digest_object.hexdigest()
+
+
+
+
+
+class _TargetPathHashMemo(object):
+  """The hashes of target paths, by (hash function, path), shared by all the
+  updaters of a process.  At most 'tuf.conf.TARGET_PATH_HASH_MEMO_SIZE' are
+  kept; the paths hashed first are forgotten first."""
+
+  def __init__(self):
+    self._hashes = {}
+    self._keys = collections.deque()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    return self._hashes.get(key)
+
+  def update(self, items):
+    size = tuf.conf.TARGET_PATH_HASH_MEMO_SIZE
+    if not size:
+      return
 
+    with self._lock:
+      for key, path_hash in items:
+        if key in self._hashes:
+          continue
+        while len(self._keys) >= size:
+          del self._hashes[self._keys.popleft()]
+        self._hashes[key] = path_hash
+        self._keys.append(key)
 
+  def clear(self):
+    with self._lock:
+      self._hashes.clear()
+      self._keys.clear()
 
+  def __len__(self):
+    return len(self._hashes)
 
 
+_TARGET_PATH_HASH_MEMO = _TargetPathHashMemo()
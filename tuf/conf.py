@@ -20,9 +20,29 @@
 # Set a directory that should be used for all temporary files. If this
 # is None, then the system default will be used. The system default
 # will also be used if a directory path set here is invalid or
-# unusable.
+# unusable.  Verified files are renamed, rather than copied, into place if
+# they are on the same filesystem as their destination, so a directory on the
+# filesystem of the metadata and target directories saves a copy of every
+# downloaded file.
 temporary_directory = None
 
+# The size (in bytes) of the userspace write buffer of temporary files.  Data
+# is only written to disk once this much of it has accumulated, or when the
+# file is flushed, so that downloading a file in small chunks does not cost
+# a system call per chunk.
+TEMPFILE_BUFFER_SIZE = 1048576 #bytes
+
+# Metadata files are downloaded to memory, rather than to a temporary file on
+# disk, as long as they are no larger than this many bytes.  If None, every
+# download goes to disk.
+TEMPFILE_SPOOL_SIZE = 1048576 #bytes
+
+# If True, a downloaded file is synced to disk (fsync) once it is complete,
+# before it is verified.  This is only needed if the downloaded file must
+# survive a crash of the machine, which is not the case for files that are
+# verified and then copied elsewhere.
+FSYNC_DOWNLOADS = False
+
 # The directory under which metadata for all repositories will be
 # stored. This is not a simple cache because each repository's root of
 # trust (root.txt) will need to already be stored below here and should
@@ -54,6 +74,67 @@ MIN_AVERAGE_DOWNLOAD_SPEED = CHUNK_SIZE #bytes/second
 # The time (in seconds) we ignore a server with a slow initial retrieval speed.
 SLOW_START_GRACE_PERIOD = 30 #seconds
 
+# Target files of at least this many bytes are downloaded in segments, i.e.,
+# byte ranges that are downloaded concurrently and spread across the mirrors.
+# This helps when a single connection to a distant mirror cannot fill the
+# link.  If None, every target file is downloaded in a single stream.
+SEGMENTED_DOWNLOAD_THRESHOLD = None #bytes
+
+# The number of segments a target file is split into, if it is downloaded in
+# segments.
+SEGMENTED_DOWNLOAD_COUNT = 4
+
+# The number of target files that Updater.download_targets() downloads at the
+# same time, one thread each.
+CONCURRENT_DOWNLOADS = 8
+
+# The number of child roles whose metadata Updater.target() downloads in the
+# background, as soon as it knows they may delegate the target, instead of
+# one at a time when it visits them.  The roles are still visited in the same
+# order.  If 0, no metadata is prefetched.
+DELEGATION_PREFETCH_WINDOW = 0
+
+# The interval between two refreshes of the metadata by a
+# tuf.client.updater.BackgroundRefresher, and the random fraction of it added
+# to, or removed from, every interval so that many clients do not all refresh
+# at the same time.
+REFRESH_INTERVAL = 300 #seconds
+REFRESH_JITTER = 0.1
+
+# A BackgroundRefresher refreshes the metadata sooner than its interval if a
+# role expires within this many seconds.
+REFRESH_BEFORE_EXPIRY = 60 #seconds
+
+# The maximum size of the cache of verified target files that Updaters keep,
+# by sha256 digest, in the 'cache/targets' directory of the repository
+# directory.  Updater.download_target() serves a target from the cache if it
+# has its content, from any repository or destination directory, instead of
+# downloading it again.  The least recently used files are removed from the
+# cache when it is full.  If None, targets are not cached.
+TARGET_CACHE_SIZE = None #bytes
+
+# Whether target files with the same content are hardlinked, rather than
+# copied, when they are served from the target cache, or when
+# Updater.download_targets() downloads a content once for several targets.
+# Hardlinked files share their content, so a cached target that is modified
+# in place at its destination no longer matches its digest, and is then
+# removed from the cache when it is next used.
+TARGET_HARDLINKS = True
+
+# Whether updaters collect the time spent in each phase of an update (e.g.,
+# downloading, hashing, verifying signatures), the number of bytes received
+# from each mirror, and a few counters.  See Updater.stats().  The collection
+# is cheap, but not free, so it is disabled by default.
+UPDATER_STATS = False
+
+# The maximum number of target paths whose hashes, which place targets in the
+# hashed bins of 'path_hash_prefixes' delegations, are remembered by all the
+# updaters of a process, so that a path is hashed once rather than on every
+# refresh and lookup.  The paths hashed first are forgotten first.  If 0, the
+# hashes are not remembered.  Each path costs about 350 bytes of memory (with
+# paths of about 50 characters), so the default costs about 7 MB.
+TARGET_PATH_HASH_MEMO_SIZE = 20000 #paths
+
 # The current "good enough" number of PBKDF2 passphrase iterations.
 # We recommend that important keys, such as root, be kept offline.
 # 'tuf.conf.PBKDF2_ITERATIONS' should increase as CPU speeds increase, set here
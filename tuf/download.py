@@ -29,11 +29,13 @@ import httplib
 import logging
 import os.path
 import socket
+import threading
 import timeit
 
 import tuf
 import tuf.conf
 import tuf.hash
+import tuf.hooks
 import tuf.util
 import tuf.formats
 
@@ -62,6 +64,18 @@ EINTR = getattr(errno, 'EINTR', 4)
 # See 'log.py' to learn how logging is handled in TUF.
 logger = logging.getLogger('tuf.download')
 
+# The hooks of the downloads of this module (see 'tuf.hooks'), and the
+# payloads of their events:
+#   download_started: url, offset, required_length
+#   chunk_received: url, length, downloaded_length, required_length, seconds
+#   download_finished: url, offset, length, seconds
+# 'offset' is the first byte requested from 'url', 'length' the number of
+# bytes received (of the chunk, or of the whole download), and 'seconds' the
+# time since the download started.  Segments of a segmented download are
+# downloads of their own.
+hooks = tuf.hooks.HookRegistry(['download_started', 'chunk_received',
+                                'download_finished'])
+
 
 
 
@@ -296,6 +310,17 @@ class SaferHTTPResponse(httplib.HTTPResponse):
 
 
 
+class SaferHTTPConnection(httplib.HTTPConnection):
+  """An HTTP connection whose responses are read only with our safe socket
+  file-like objects.  Setting the response class per connection, rather than
+  on httplib.HTTPConnection itself, keeps downloads thread-safe."""
+
+  response_class = SaferHTTPResponse
+
+
+
+
+
 class VerifiedHTTPSConnection(httplib.HTTPSConnection):
   """
   A connection that wraps connections with ssl certificate verification.
@@ -303,6 +328,8 @@ class VerifiedHTTPSConnection(httplib.HTTPSConnection):
   https://github.com/pypa/pip/blob/d0fa66ecc03ab20b7411b35f7c7b423f31f77761/pip/download.py#L72
   """
 
+  response_class = SaferHTTPResponse
+
   def connect(self):
 
     self.connection_kwargs = {}
@@ -360,15 +387,63 @@ class VerifiedHTTPSHandler(urllib2.HTTPSHandler):
 
 
 
-def _get_request(url):
+class SaferHTTPHandler(urllib2.HTTPHandler):
+  """
+  An HTTPHandler that uses our own SaferHTTPConnection.
+  """
+
+  def http_open(self, req):
+    return self.do_open(SaferHTTPConnection, req)
+
+
+
+
+
+def _get_request(url, offset=0, last_byte=None, validators=None):
   """
   Wraps the URL to retrieve to protects against "creative"
   interpretation of the RFC: http://bugs.python.org/issue8732
 
+  If 'offset' is positive, the server is asked only for the bytes of the file
+  starting at 'offset' (RFC 2616, section 14.35), so that an interrupted
+  download may be resumed.  If 'last_byte' is given, the server is asked only
+  for the bytes up to and including 'last_byte', so that a file may be
+  downloaded in segments.  If 'validators' are given, the server is asked for
+  the file only if it has changed since (RFC 2616, sections 14.25 and 14.26).
+
   https://github.com/pypa/pip/blob/d0fa66ecc03ab20b7411b35f7c7b423f31f77761/pip/download.py#L147
   """
 
-  return urllib2.Request(url, headers={'Accept-encoding': 'identity'})
+  headers = {'Accept-encoding': 'identity'}
+  if last_byte is not None:
+    headers['Range'] = 'bytes='+str(offset)+'-'+str(last_byte)
+  elif offset > 0:
+    headers['Range'] = 'bytes='+str(offset)+'-'
+
+  if validators:
+    if validators.get('etag') is not None:
+      headers['If-None-Match'] = validators['etag']
+    if validators.get('last-modified') is not None:
+      headers['If-Modified-Since'] = validators['last-modified']
+
+  return urllib2.Request(url, headers=headers)
+
+
+
+
+
+def _get_validators(connection):
+  """
+  Return the validators of the file served by 'connection', i.e., its ETag and
+  Last-Modified headers, which identify this version of the file in a later
+  conditional request.  See _get_request().
+  """
+
+  validators = {}
+  for header in ('etag', 'last-modified'):
+    validators[header] = connection.info().getheader(header)
+
+  return validators
 
 
 
@@ -394,8 +469,9 @@ def _get_opener(scheme=None):
       if isinstance(handler, urllib2.HTTPHandler):
         opener.handlers.remove(handler)
   else:
-    # Otherwise, use the default opener.
-    opener = urllib2.build_opener()
+    # Otherwise, use the default opener, except that plain http responses are
+    # read safely.
+    opener = urllib2.build_opener(SaferHTTPHandler())
 
   return opener
 
@@ -403,7 +479,7 @@ def _get_opener(scheme=None):
 
 
 
-def _open_connection(url):
+def _open_connection(url, offset=0, last_byte=None, validators=None):
   """
   <Purpose>
     Helper function that opens a connection to the url. urllib2 supports http, 
@@ -417,9 +493,23 @@ def _open_connection(url):
   <Arguments>
     url:
       URL string (e.g., 'http://...' or 'ftp://...' or 'file://...') 
+
+    offset:
+      The number of bytes of the file we already have.  If positive, only the
+      bytes from 'offset' onward are requested.  The server is free to ignore
+      this request; see _get_resumed_offset().
+
+    last_byte:
+      If given, only the bytes up to and including 'last_byte' are requested.
+
+    validators:
+      If given, the validators of a copy of the file that we already have, as
+      returned by _get_validators().  The file is requested only if it has
+      changed since.
     
   <Exceptions>
-    None.
+    tuf.NotModifiedError, if 'validators' are given and the server replies
+    that the file has not changed.
     
   <Side Effects>
     Opens a connection to a remote server.
@@ -439,14 +529,24 @@ def _open_connection(url):
 
   parsed_url = urlparse.urlparse(url)
   opener = _get_opener(scheme=parsed_url.scheme)
-  request = _get_request(url)
-  return opener.open(request)
+  request = _get_request(url, offset, last_byte, validators)
 
+  # The timeout induces non-blocking socket operations.
+  try:
+    return opener.open(request, timeout=tuf.conf.SOCKET_TIMEOUT)
+  except urllib2.HTTPError, exception:
+    # urllib2 treats '304 Not Modified' like any other non-2xx reply.
+    if validators and exception.code == httplib.NOT_MODIFIED:
+      exception.close()
+      raise tuf.NotModifiedError(url)
+    raise
 
 
 
 
-def _download_fixed_amount_of_data(connection, temp_file, required_length):
+
+def _download_fixed_amount_of_data(connection, temp_file, required_length,
+                                   url=None):
   """
   <Purpose>
     This is a helper function, where the download really happens. While-block
@@ -467,9 +567,14 @@ def _download_fixed_amount_of_data(connection, temp_file, required_length):
       always specified by the TUF metadata for the data file in question
       (except in the case of timestamp metadata, in which case we would fix a
       reasonable upper bound).
+
+    url:
+      The URL of the contents, for the 'chunk_received' hooks.
   
   <Side Effects>
     Data from the server will be written to 'temp_file'.
+
+    The 'chunk_received' hooks are called for every chunk.
  
   <Exceptions>
     Runtime or network exceptions will be raised without question.
@@ -484,6 +589,10 @@ def _download_fixed_amount_of_data(connection, temp_file, required_length):
   # Keep track of total bytes downloaded.
   total_downloaded = 0
 
+  # Check once, rather than for every chunk, whether any hook wants chunks.
+  dispatch_chunks = hooks.registered('chunk_received')
+  start_time = timeit.default_timer()
+
   try:
     while True:
       # We download a fixed chunk of data in every round. This is so that we
@@ -503,9 +612,16 @@ def _download_fixed_amount_of_data(connection, temp_file, required_length):
         # Finally, we signal that the download is complete.
         break
 
-      # Data successfully read from the connection.  Store it. 
-      temp_file.write(data)
+      # Data successfully read from the connection.  Store it.  It is
+      # flushed together with the rest of the file, once it is complete.
+      temp_file.write(data, auto_flush=False)
       total_downloaded = total_downloaded + len(data)
+
+      if dispatch_chunks:
+        hooks.dispatch('chunk_received', url=url, length=len(data),
+                       downloaded_length=total_downloaded,
+                       required_length=required_length,
+                       seconds=timeit.default_timer()-start_time)
   except:
     raise
   else:
@@ -559,6 +675,55 @@ def _get_content_length(connection):
 
 
 
+def _get_resumed_offset(connection, offset):
+  """
+  <Purpose>
+    A helper function that determines whether the server resumed the transfer
+    of a file at 'offset', as requested by _open_connection().
+
+  <Arguments>
+    connection:
+      The object that the _open_connection function returns for communicating
+      with the server about the contents of a URL.
+
+    offset:
+      The number of bytes of the file we already have, and thus the first byte
+      requested from the server.
+
+  <Side Effects>
+    No known side effects.
+
+  <Exceptions>
+    Runtime exceptions will be suppressed but logged.
+
+  <Returns>
+    'offset' if the server sends the file starting at 'offset'.  Otherwise 0,
+    which signals that the server sends the file from its first byte.
+
+  """
+
+  if offset == 0:
+    return 0
+
+  try:
+    # A server that honours our request answers with '206 Partial Content' and
+    # a Content-Range header of the form 'bytes 1024-4095/4096'.
+    content_range = connection.info().get('Content-Range', '')
+    if connection.getcode() == 206 and \
+       content_range.startswith('bytes '+str(offset)+'-'):
+      logger.debug('Server resumed the download at byte '+str(offset)+'.')
+      return offset
+  except:
+    logger.exception('Could not get content range about '+str(connection)+
+                     ' from server!')
+
+  logger.warn('Server did not resume the download at byte '+str(offset)+'.')
+  return 0
+
+
+
+
+
 def _check_content_length(reported_length, required_length):
   """
   <Purpose>
@@ -659,21 +824,24 @@ def _check_downloaded_length(total_downloaded, required_length,
 
 
 
-def safe_download(url, required_length):
-  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True)
+def safe_download(url, required_length, temp_file=None, validators=None):
+  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True,
+                        temp_file=temp_file, validators=validators)
 
 
 
 
 
-def unsafe_download(url, required_length):
-  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=False)
+def unsafe_download(url, required_length, temp_file=None, validators=None):
+  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=False,
+                        temp_file=temp_file, validators=validators)
 
 
 
 
 
-def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
+def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True,
+                   temp_file=None, validators=None):
   """
   <Purpose>
     Given the url, hashes and length of the desired file, this function 
@@ -696,9 +864,28 @@ def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
       False when we know that we want to turn this off for downloading the
       timestamp metadata, which has no signed required_length.
 
+    temp_file:
+      An optional 'tuf.util.TempFile' holding the first bytes of the file, as
+      kept from an earlier, interrupted download of it.  The server is asked
+      for the remaining bytes only, which are appended to 'temp_file'.  If the
+      server does not honour the request, 'temp_file' is emptied and the whole
+      file is downloaded again.  The caller owns 'temp_file': it is not closed
+      if the download fails, so that the bytes received so far may be resumed
+      from another mirror.
+
+    validators:
+      An optional dict with the 'etag' and 'last-modified' validators of a
+      copy of the file that we already have, typically from an earlier
+      download of it from the same mirror.  The file is downloaded only if it
+      has changed since; otherwise, tuf.NotModifiedError is raised.  On a
+      download, the dict is updated with the validators of the downloaded
+      file, which the caller may keep once it has verified the file.
+
   <Side Effects>
     A 'tuf.util.TempFile' object is created on disk to store the contents of
-    'url'.
+    'url', unless 'temp_file' is given.
+
+    The hooks of the download are called.
  
   <Exceptions>
     tuf.DownloadLengthMismatchError, if there was a mismatch of observed vs
@@ -706,6 +893,9 @@ def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
  
     tuf.FormatError, if any of the arguments are improperly formatted.
 
+    tuf.NotModifiedError, if 'validators' are given and the file has not
+    changed.
+
     Any other unforeseen runtime exception.
  
   <Returns>
@@ -725,56 +915,268 @@ def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
   url = url.replace('\\', '/')
   logger.info('Downloading: '+str(url))
 
-  # NOTE: Not thread-safe.
-  # Save current values or functions for restoration later.
-  previous_socket_timeout = socket.getdefaulttimeout()
-  previous_http_response_class = httplib.HTTPConnection.response_class
-
   # This is the temporary file that we will return to contain the contents of
-  # the downloaded file.
-  temp_file = tuf.util.TempFile()
+  # the downloaded file.  We only clean it up on failure if we created it.
+  if temp_file is None:
+    temp_file = tuf.util.TempFile()
+    close_temp_file_on_error = True
+  else:
+    close_temp_file_on_error = False
 
-  try:
-    # NOTE: Not thread-safe.
-    # Set timeout to induce non-blocking socket operations.
-    socket.setdefaulttimeout(tuf.conf.SOCKET_TIMEOUT)
-    # Replace the socket file-like object class with our safer version.
-    httplib.HTTPConnection.response_class = SaferHTTPResponse
+  # Resume after the bytes we already have, unless we already have them all;
+  # a file that is complete but was rejected is downloaded again.
+  offset = temp_file.get_compressed_length()
+  if offset >= required_length:
+    offset = 0
 
-    # Open the connection to the remote file.
-    connection = _open_connection(url)
+  start_time = timeit.default_timer()
+  hooks.dispatch('download_started', url=url, offset=offset,
+                 required_length=required_length)
 
-    # We ask the server about how big it thinks this file should be.
+  try:
+    # Open the connection to the remote file.
+    connection = _open_connection(url, offset, validators=validators)
+    if validators is not None:
+      validators.update(_get_validators(connection))
+
+    # Did the server resume the transfer where we asked it to?  Discard any
+    # bytes that it is going to send us again.
+    offset = _get_resumed_offset(connection, offset)
+    temp_file.seek(offset)
+    temp_file.truncate()
+
+    # We ask the server about how big it thinks the rest of this file should
+    # be.
     reported_length = _get_content_length(connection)
 
     # Then, we check whether the required length matches the reported length.
-    _check_content_length(reported_length, required_length)
+    _check_content_length(reported_length, required_length-offset)
 
-    # Download the contents of the URL, up to the required length, to a
-    # temporary file, and get the total number of downloaded bytes.
-    total_downloaded = _download_fixed_amount_of_data(connection, temp_file, 
-                                                      required_length)
+    # Download the rest of the contents of the URL, up to the required length,
+    # to a temporary file, and get the total number of downloaded bytes.
+    total_downloaded = offset + \
+      _download_fixed_amount_of_data(connection, temp_file,
+                                     required_length-offset, url=url)
 
     # Does the total number of downloaded bytes match the required length?
     _check_downloaded_length(total_downloaded, required_length,
                              STRICT_REQUIRED_LENGTH=STRICT_REQUIRED_LENGTH)
 
+    # Write out the buffered contents of the file before it is verified.
+    temp_file.flush(fsync=tuf.conf.FSYNC_DOWNLOADS)
+
+  except tuf.NotModifiedError:
+    if close_temp_file_on_error:
+      temp_file.close_temp_file()
+    logger.info('Not modified: '+str(url))
+    raise
+
   except:
-    # Close 'temp_file'; any written data is lost.
-    temp_file.close_temp_file()
+    # Close 'temp_file' if it is ours; any written data is lost.  Otherwise,
+    # the caller may resume from the data written so far.
+    if close_temp_file_on_error:
+      temp_file.close_temp_file()
     logger.exception('Could not download URL: '+str(url))
     raise
 
   else:
+    hooks.dispatch('download_finished', url=url, offset=offset,
+                   length=total_downloaded-offset,
+                   seconds=timeit.default_timer()-start_time)
     return temp_file
 
-  finally:
-    # NOTE: Not thread-safe.
-    # Restore previously saved values or functions.
-    httplib.HTTPConnection.response_class = previous_http_response_class
-    socket.setdefaulttimeout(previous_socket_timeout)
 
 
 
 
+class _SegmentWriter(object):
+  """A minimal file-like object that writes a single segment of a file, i.e.,
+  a range of its bytes, into a temporary file shared by all segments.  The
+  writes of concurrently downloaded segments are serialized by 'lock'."""
+
+  def __init__(self, temp_file, lock, position):
+    self.temp_file = temp_file
+    self.lock = lock
+    # The position in 'temp_file' where the next byte of the segment goes.
+    self.position = position
+
+
+
+  def write(self, data, auto_flush=True):
+    self.lock.acquire()
+    try:
+      self.temp_file.seek(self.position)
+      self.temp_file.write(data, auto_flush=auto_flush)
+    finally:
+      self.lock.release()
+    self.position += len(data)
+
+
+
+
+
+def _download_segment(urls, segment_writer, last_byte, url_errors):
+  """
+  <Purpose>
+    A helper function that downloads a segment of a file, from the position of
+    'segment_writer' up to and including 'last_byte'.  The mirrors in 'urls'
+    are tried in order; every mirror resumes where the previous one stopped.
+
+  <Arguments>
+    urls:
+      A list of URL strings of the mirrors that serve the file.
+
+    segment_writer:
+      A '_SegmentWriter' object to which the bytes of the segment are written.
+
+    last_byte:
+      The position of the last byte of the segment in the file.
+
+    url_errors:
+      A dictionary to which the error of every mirror that failed to serve the
+      segment is added, keyed by URL.
+
+  <Side Effects>
+    Data from the servers is written to 'segment_writer'.
+
+    The hooks of the download of the segment are called.
+
+  <Exceptions>
+    None.
+
+  <Returns>
+    None.  The segment is complete if the position of 'segment_writer' is
+    past 'last_byte'.
+
+  """
+
+  for url in urls:
+    offset = segment_writer.position
+    required_length = last_byte+1-offset
+    start_time = timeit.default_timer()
+    hooks.dispatch('download_started', url=url, offset=offset,
+                   required_length=required_length)
+    try:
+      connection = _open_connection(url, offset, last_byte)
+
+      # Unlike an interrupted download, a segment cannot be downloaded from
+      # the first byte of the file instead: the server must send us exactly
+      # the bytes we asked for.
+      if offset > 0 and _get_resumed_offset(connection, offset) != offset:
+        connection.close()
+        raise tuf.DownloadError(url+' does not serve byte ranges.')
+
+      _check_content_length(_get_content_length(connection), required_length)
+      downloaded_length = _download_fixed_amount_of_data(connection,
+                                                         segment_writer,
+                                                         required_length,
+                                                         url=url)
+      _check_downloaded_length(downloaded_length, required_length)
+
+    except Exception, exception:
+      logger.exception('Could not download bytes '+str(offset)+'-'+
+                       str(last_byte)+' of URL: '+str(url))
+      url_errors[url] = exception
+
+    else:
+      hooks.dispatch('download_finished', url=url, offset=offset,
+                     length=downloaded_length,
+                     seconds=timeit.default_timer()-start_time)
+      return
+
+
+
+
+
+def safe_segmented_download(urls, required_length, segment_count):
+  """
+  <Purpose>
+    Download a file of 'required_length' bytes in 'segment_count' segments,
+    i.e., byte ranges that are downloaded concurrently, one thread each.  The
+    segments are spread across the mirrors in 'urls', all of which must serve
+    the very same file: segment i is requested from urls[i % len(urls)] first,
+    and from the mirrors that follow it if that one fails.  The segments are
+    assembled into a temporary file preallocated to 'required_length' bytes.
+
+    As with safe_download(), every connection is protected against slow
+    retrieval and the length of the file must be strictly equal to
+    'required_length'.  The caller must check the hashes of the file.
+
+  <Arguments>
+    urls:
+      A list of URL strings of the mirrors that serve the file.
+
+    required_length:
+      An integer value representing the length of the file.
+
+    segment_count:
+      The number of segments the file is downloaded in.  A file is never
+      split into more segments than it has bytes, so an empty file is not
+      downloaded at all.
+
+  <Side Effects>
+    A 'tuf.util.TempFile' object is created on disk to store the contents of
+    the file.
+
+  <Exceptions>
+    tuf.FormatError, if any of the arguments are improperly formatted.
+
+    tuf.NoWorkingMirrorError, if a segment could not be downloaded from any of
+    the mirrors.
+
+  <Returns>
+    A 'tuf.util.TempFile' file-like object which points to the contents of
+    the file.
+
+  """
+
+  # Do all of the arguments have the appropriate format?
+  # Raise 'tuf.FormatError' if there is a mismatch.
+  tuf.formats.URLS_SCHEMA.check_match(urls)
+  tuf.formats.LENGTH_SCHEMA.check_match(required_length)
+  tuf.formats.SEGMENTCOUNT_SCHEMA.check_match(segment_count)
+
+  # See _download_file() for why back-slashes are replaced.
+  urls = [url.replace('\\', '/') for url in urls]
+  segment_count = min(segment_count, required_length)
+  logger.info('Downloading in '+str(segment_count)+' segments: '+str(urls))
+
+  temp_file = tuf.util.TempFile()
+  temp_file.truncate(required_length)
+  lock = threading.Lock()
+  # url (URL): error (Exception)
+  url_errors = {}
+  segment_threads = []
+
+  for index in range(segment_count):
+    first_byte = index * required_length // segment_count
+    last_byte = (index+1) * required_length // segment_count - 1
+
+    if urls:
+      start = index % len(urls)
+      segment_urls = urls[start:] + urls[:start]
+    else:
+      segment_urls = []
+
+    segment_writer = _SegmentWriter(temp_file, lock, first_byte)
+    segment_thread = threading.Thread(target=_download_segment,
+                                      args=(segment_urls, segment_writer,
+                                            last_byte, url_errors))
+    segment_thread.daemon = True
+    segment_thread.start()
+    segment_threads.append((segment_thread, segment_writer, last_byte))
+
+  # Wait for all the segments; every segment must be complete.
+  complete = True
+  for segment_thread, segment_writer, last_byte in segment_threads:
+    segment_thread.join()
+    if segment_writer.position != last_byte+1:
+      complete = False
+
+  if not complete:
+    temp_file.close_temp_file()
+    logger.error('Could not download all the segments of: '+str(urls))
+    raise tuf.NoWorkingMirrorError(url_errors)
 
+  temp_file.flush(fsync=tuf.conf.FSYNC_DOWNLOADS)
+  return temp_file
@@ -106,6 +106,7 @@ PATHS_SCHEMA = SCHEMA.ListOf(PATH_SCHEMA)
 
 # Uniform Resource Locator identifier (e.g., 'https://www.updateframework.com/').
 URL_SCHEMA = SCHEMA.AnyString()
+URLS_SCHEMA = SCHEMA.ListOf(URL_SCHEMA)
 
 # A dictionary holding version information.
 VERSION_SCHEMA = SCHEMA.Object(
@@ -121,6 +122,10 @@ METADATAVERSION_SCHEMA = SCHEMA.Integer(lo=1)
 # An integer representing length.  Must be 0, or greater.
 LENGTH_SCHEMA = SCHEMA.Integer(lo=0)
 
+# An integer representing the number of segments a file is downloaded in.
+# Must be 1, or greater.
+SEGMENTCOUNT_SCHEMA = SCHEMA.Integer(lo=1)
+
 # An integer representing logger levels, such as logging.CRITICAL (=50).
 # Must be between 0 and 50.
 LOGLEVEL_SCHEMA = SCHEMA.Integer(lo=0, hi=50)
@@ -179,6 +184,16 @@ ED25519KEY_SCHEMA = SCHEMA.Object(
   keyid=KEYID_SCHEMA,
   keyval=KEYVAL_SCHEMA)
 
+# The compressed versions of a target file that a repository serves next to
+# it (e.g., 'file.txt.gz' next to 'file.txt'), keyed by compression algorithm
+# (e.g., 'gzip').  A compressed version is verified by its length, and by the
+# length and hashes of its uncompressed contents, i.e., of the target file.
+COMPRESSIONS_SCHEMA = SCHEMA.DictOf(
+  key_schema=NAME_SCHEMA,
+  value_schema=SCHEMA.Object(
+    object_name='compressed fileinfo',
+    length=LENGTH_SCHEMA))
+
 # Info that describes both metadata and target files.
 # This schema allows the storage of multiple hashes for the same file
 # (e.g., sha256 and sha512 may be computed for the same file and stored).
@@ -186,7 +201,24 @@ FILEINFO_SCHEMA = SCHEMA.Object(
   object_name='fileinfo',
   length=LENGTH_SCHEMA,
   hashes=HASHDICT_SCHEMA,
-  custom=SCHEMA.Optional(SCHEMA.Object()))
+  custom=SCHEMA.Optional(SCHEMA.Object()),
+  compressions=SCHEMA.Optional(COMPRESSIONS_SCHEMA))
+
+# A delta between two versions of a metadata file (e.g., 'targets.txt.delta'),
+# which turns a client's current copy, described by 'base', into the next
+# version.  Metadata files are written with one JSON value per line, so every
+# edit replaces the lines [start, end) of the base with 'lines'.  The edits are
+# sorted and do not overlap.  A delta is not signed: it is listed with its
+# hashes in the release metadata, and its result must match the hashes of the
+# next version listed there.
+DELTA_SCHEMA = SCHEMA.Object(
+  object_name='delta',
+  base=FILEINFO_SCHEMA,
+  edits=SCHEMA.ListOf(SCHEMA.Object(
+    object_name='edit',
+    start=LENGTH_SCHEMA,
+    end=LENGTH_SCHEMA,
+    lines=SCHEMA.ListOf(SCHEMA.AnyString()))))
 
 # A dict holding the information for a particular file.  The keys hold the
 # relative file path and the values the relevant file information.
@@ -362,6 +394,17 @@ MIRRORDICT_SCHEMA = SCHEMA.DictOf(
   key_schema=SCHEMA.AnyString(),
   value_schema=MIRROR_SCHEMA)
 
+# The repositories served by the update daemon (see 'tuf/client/daemon.py'),
+# by name.  Each has its own local repository directory and mirrors, and the
+# only directory its targets are downloaded to.
+DAEMON_REPOSITORIES_SCHEMA = SCHEMA.DictOf(
+  key_schema=NAME_SCHEMA,
+  value_schema=SCHEMA.Object(
+    object_name='daemon repository',
+    repository_directory=PATH_SCHEMA,
+    repository_mirrors=MIRRORDICT_SCHEMA,
+    destination_directory=PATH_SCHEMA))
+
 # A Mirrorlist: indicates all the live mirrors, and what documents they
 # serve.
 MIRRORLIST_SCHEMA = SCHEMA.Object(
@@ -803,7 +846,7 @@ def make_signable(object):
 
 
 
-def make_fileinfo(length, hashes, custom=None):
+def make_fileinfo(length, hashes, custom=None, compressions=None):
   """
   <Purpose>
     Create a dictionary conformant to 'FILEINFO_SCHEMA'.
@@ -820,6 +863,11 @@ def make_fileinfo(length, hashes, custom=None):
     custom:
       An optional object providing additional information about the file.
 
+    compressions:
+      An optional dict, in 'COMPRESSIONS_SCHEMA' format, of the compressed
+      versions of a target file, which has the form:
+       {'gzip': {'length': 1024}, 'xz': {'length': 812}}
+
   <Exceptions>
     tuf.FormatError, if the 'FILEINFO_SCHEMA' to be returned
     does not have the correct format.
@@ -838,6 +886,8 @@ def make_fileinfo(length, hashes, custom=None):
   fileinfo = {'length' : length, 'hashes' : hashes}
   if custom is not None:
     fileinfo['custom'] = custom
+  if compressions is not None:
+    fileinfo['compressions'] = compressions
 
   # Raise 'tuf.FormatError' if the check fails.
   FILEINFO_SCHEMA.check_match(fileinfo)
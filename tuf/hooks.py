@@ -0,0 +1,244 @@
+"""
+<Program Name>
+  hooks.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Provide registries of hooks, i.e., callables that are called with the
+  payload of an event when it happens, so that callers may collect metrics,
+  show progress, or trace downloads and verification without patching the
+  modules that do them.  'tuf.download.hooks' is the registry of download
+  events, and every 'tuf.client.updater.Updater' has one of its own, for the
+  events of its mirrors and metadata.
+
+  def print_progress(url, length, downloaded_length, required_length,
+                     seconds):
+    print url, downloaded_length, '/', required_length
+
+  tuf.download.hooks.register('chunk_received', print_progress)
+
+  The events of 'tuf.download.hooks', and their keyword arguments:
+    download_started: url, offset, required_length
+    chunk_received: url, length, downloaded_length, required_length, seconds
+    download_finished: url, offset, length, seconds
+
+  The events of 'tuf.client.updater.Updater.hooks', and their keyword
+  arguments:
+    download_started: filepath, file_type, mirror, offset
+    download_finished: filepath, file_type, mirror, length, seconds
+    mirror_failed: filepath, file_type, mirror, error, length, seconds
+    signature_verified: rolename, signature_count, seconds
+    metadata_installed: rolename, version, length, seconds
+
+  'offset' is the first byte requested, 'length' the number of bytes
+  received (or, for 'metadata_installed', installed), and 'seconds' the time
+  the event took since the download or the verification started.
+
+  Hooks are called in the thread where the event happens, in the order they
+  were registered, with keyword arguments only; they should be quick.  An
+  exception raised by a hook is logged and otherwise ignored, so that it does
+  not interrupt the update.  Dispatching an event that no hook is registered
+  for costs a dictionary lookup.
+
+"""
+
+import logging
+import threading
+
+import tuf
+import tuf.log
+
+# See 'tuf.log' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.hooks')
+
+
+
+
+
+class HookRegistry(object):
+  """
+  <Purpose>
+    A registry of the hooks of a fixed set of events.  Hooks may be
+    registered, unregistered, and dispatched by several threads at once:
+    registrations replace the tuple of the hooks of an event, rather than
+    modify it, so only registrations need a lock.
+
+  <HookRegistry Attributes>
+    self.events:
+      The names of the events that hooks may be registered for.
+
+  """
+
+  def __init__(self, events):
+    """
+    <Purpose>
+      Constructor.
+
+    <Arguments>
+      events:
+        A list of the names of the events that hooks may be registered for.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self.events = frozenset(events)
+    # event name: (hook, ...)
+    self._hooks = {}
+    self._lock = threading.Lock()
+
+
+
+
+
+  def register(self, event, hook):
+    """
+    <Purpose>
+      Register 'hook' to be called on every 'event'.
+
+    <Arguments>
+      event:
+        The name of the event.
+
+      hook:
+        A callable that takes the payload of 'event' as keyword arguments.
+
+    <Exceptions>
+      tuf.FormatError, if 'event' is unknown, or 'hook' is not callable.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self._check_event(event)
+    if not callable(hook):
+      raise tuf.FormatError(repr(hook)+' is not callable.')
+
+    with self._lock:
+      self._hooks[event] = self._hooks.get(event, ()) + (hook,)
+
+
+
+
+
+  def unregister(self, event, hook):
+    """
+    <Purpose>
+      Stop calling 'hook' on 'event'.  Nothing happens if 'hook' is not
+      registered for 'event'.
+
+    <Arguments>
+      event:
+        The name of the event.
+
+      hook:
+        A callable registered for 'event'.
+
+    <Exceptions>
+      tuf.FormatError, if 'event' is unknown.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self._check_event(event)
+    with self._lock:
+      hooks = tuple(registered_hook for registered_hook in
+                    self._hooks.get(event, ()) if registered_hook != hook)
+      if hooks:
+        self._hooks[event] = hooks
+      else:
+        self._hooks.pop(event, None)
+
+
+
+
+
+  def registered(self, event):
+    """
+    <Purpose>
+      Return whether any hook is registered for 'event'.  Callers may check
+      this before they compute the payload of a frequent event.
+
+    <Arguments>
+      event:
+        The name of the event.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A boolean.
+
+    """
+
+    return event in self._hooks
+
+
+
+
+
+  def dispatch(self, event, **payload):
+    """
+    <Purpose>
+      Call the hooks registered for 'event' with 'payload'.
+
+    <Arguments>
+      event:
+        The name of the event.
+
+      payload:
+        The keyword arguments the hooks are called with.
+
+    <Exceptions>
+      None.  The exceptions raised by hooks are logged.
+
+    <Side Effects>
+      The hooks of 'event' are called.
+
+    <Returns>
+      None.
+
+    """
+
+    hooks = self._hooks.get(event)
+    if not hooks:
+      return
+
+    for hook in hooks:
+      try:
+        hook(**payload)
+      except Exception:
+        logger.exception('The hook '+repr(hook)+' of '+repr(event)+' failed.')
+
+
+
+
+
+  def _check_event(self, event):
+    if event not in self.events:
+      raise tuf.FormatError('Unknown event: '+repr(event)+'.  Expected one '+
+                            'of '+repr(sorted(self.events))+'.')
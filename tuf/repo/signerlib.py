@@ -19,6 +19,7 @@
 
 """
 
+import bz2
 import gzip
 import os
 import ConfigParser
@@ -324,7 +325,7 @@ def generate_root_metadata(config_filepath, version):
 
 
 def generate_targets_metadata(repository_directory, target_files, version,
-                              expiration_date):
+                              expiration_date, compressions=()):
   """
   <Purpose>
     Generate the targets metadata object. The targets must exist at the same
@@ -352,6 +353,13 @@ def generate_targets_metadata(repository_directory, target_files, version,
     expiration_date:
       The expiration date, in UTC, of the metadata file.
       Conformant to 'tuf.formats.TIME_SCHEMA'.
+
+    compressions:
+      Compression extensions (e.g., 'gz', 'xz').  A target file with one of
+      these extensions that is listed next to its uncompressed version (e.g.,
+      'targets/file.txt.gz' and 'targets/file.txt') is not a target of its
+      own, but a compressed version of the target, which clients may
+      download instead.  None by default.
   
   <Exceptions>
     tuf.FormatError, if an error occurred trying to generate the targets
@@ -378,8 +386,30 @@ def generate_targets_metadata(repository_directory, target_files, version,
 
   repository_directory = check_directory(repository_directory)
 
+  # The compression algorithms of 'compressions', e.g., 'gz' -> 'gzip'.
+  algorithms = {}
+  for algorithm, extension in tuf.util.COMPRESSION_EXTENSIONS.items():
+    if extension in compressions:
+      algorithms[extension] = algorithm
+  for extension in compressions:
+    if extension not in algorithms:
+      raise tuf.FormatError('Unknown compression algorithm: '+str(extension))
+
+  # Separate the compressed versions of the target files from the targets.
+  compressed_files = {}
+  target_files_set = set(target_files)
+  for target in target_files:
+    uncompressed_target, extension = os.path.splitext(target)
+    extension = extension[1:]
+    if extension in algorithms and uncompressed_target in target_files_set:
+      compressed_files.setdefault(uncompressed_target, []).append(target)
+  for compressed_targets in compressed_files.values():
+    target_files_set.difference_update(compressed_targets)
+
   # Generate the file info for all the target files listed in 'target_files'.
   for target in target_files:
+    if target not in target_files_set:
+      continue
     # Strip 'targets/' from from 'target' and keep the rest (e.g.,
     # 'targets/more_targets/somefile.txt' -> 'more_targets/somefile.txt'
     relative_targetpath = os.path.sep.join(target.split(os.path.sep)[1:])
@@ -388,7 +418,18 @@ def generate_targets_metadata(repository_directory, target_files, version,
       message = repr(target_path)+' could not be read.  Unable to generate '+\
         'targets metadata.'
       raise tuf.Error(message)
-    filedict[relative_targetpath] = get_metadata_file_info(target_path)
+    fileinfo = get_metadata_file_info(target_path)
+
+    # Add the lengths of the compressed versions of the target, if any.
+    if target in compressed_files:
+      fileinfo['compressions'] = {}
+      for compressed_target in compressed_files[target]:
+        extension = os.path.splitext(compressed_target)[1][1:]
+        compressed_path = os.path.join(repository_directory, compressed_target)
+        fileinfo['compressions'][algorithms[extension]] = \
+          {'length': os.path.getsize(compressed_path)}
+
+    filedict[relative_targetpath] = fileinfo
 
   # Generate the targets metadata object.
   targets_metadata = tuf.formats.TargetsFile.make_metadata(version,
@@ -454,6 +495,20 @@ def generate_release_metadata(metadata_directory, version, expiration_date):
   filedict['root.txt'] = get_metadata_file_info(root_filename)
   filedict['targets.txt'] = get_metadata_file_info(targets_filename)
 
+  # Include the compressed versions of 'targets.txt', if any.  Clients pick
+  # the smallest one.
+  for extension in tuf.util.COMPRESSION_EXTENSIONS.values():
+    compressed_filename = targets_filename + '.' + extension
+    if os.path.exists(compressed_filename):
+      filedict['targets.txt.' + extension] = \
+        get_metadata_file_info(compressed_filename)
+
+  # Include the delta from the previous 'targets.txt', if any.  The deltas of
+  # delegated roles are found by the walk below.
+  delta_filename = targets_filename + '.delta'
+  if os.path.exists(delta_filename):
+    filedict['targets.txt.delta'] = get_metadata_file_info(delta_filename)
+
   # Walk the 'targets/' directory and generate the file info for all
   # the files listed there.  This information is stored in the 'meta'
   # field of the release metadata object.
@@ -561,7 +616,9 @@ def write_metadata_file(metadata, filename, compression=None):
 
     compression:
       Specify an algorithm as a string to compress the file; otherwise, the
-      file will be left uncompressed. Available options are 'gz' (gzip).
+      file will be left uncompressed. Available options are 'gz' (gzip), 'bz2'
+      (bzip2) and, if the lzma module is available, 'xz'.  The extension is
+      appended to 'filename'.
 
   <Exceptions>
     tuf.FormatError, if the arguments are improperly formatted.
@@ -600,6 +657,14 @@ def write_metadata_file(metadata, filename, compression=None):
     logger.info('gzip compression for '+str(filename))
     filename_with_compression += '.gz'
     file_object = gzip.open(filename_with_compression, 'w')
+  elif compression == 'bz2':
+    logger.info('bzip2 compression for '+str(filename))
+    filename_with_compression += '.bz2'
+    file_object = bz2.BZ2File(filename_with_compression, 'w')
+  elif compression == 'xz' and tuf.util.lzma is not None:
+    logger.info('xz compression for '+str(filename))
+    filename_with_compression += '.xz'
+    file_object = tuf.util.lzma.LZMAFile(filename_with_compression, 'w')
   else:
     raise tuf.FormatError('Unknown compression algorithm: '+str(compression))
 
@@ -626,6 +691,125 @@ def write_metadata_file(metadata, filename, compression=None):
 
 
 
+def write_compressed_metadata_files(metadata, filename, compressions):
+  """
+  <Purpose>
+    Write the compressed versions of the metadata file 'filename' listed in
+    'compressions', and remove any other compressed version of it.  A stale
+    compressed version would otherwise be listed in the release or timestamp
+    metadata next to the new uncompressed file, and fail verification.
+
+  <Arguments>
+    metadata:
+      The object that will be saved to the compressed files.
+
+    filename:
+      The filename (absolute path) of the uncompressed metadata file.
+
+    compressions:
+      The compression extensions (e.g., 'gz', 'bz2', 'xz') of the compressed
+      versions to write.  See write_metadata_file().
+
+  <Exceptions>
+    tuf.FormatError, if the arguments are improperly formatted or a
+    compression is not supported.
+
+    Any other runtime (e.g. IO) exception.
+
+  <Side Effects>
+    The compressed files are created, overwritten or removed.
+
+  <Returns>
+    The list of paths to the written compressed metadata files.
+
+  """
+
+  written_filepaths = []
+  for compression in compressions:
+    written_filepath = write_metadata_file(metadata, filename, compression)
+    logger.info('Wrote '+str(written_filepath))
+    written_filepaths.append(written_filepath)
+
+  for extension in tuf.util.COMPRESSION_EXTENSIONS.values():
+    compressed_filename = filename + '.' + extension
+    if extension not in compressions and os.path.exists(compressed_filename):
+      logger.info('Removing stale '+str(compressed_filename))
+      os.remove(compressed_filename)
+
+  return written_filepaths
+
+
+
+
+
+def write_delta_metadata_file(metadata, filename):
+  """
+  <Purpose>
+    Write the delta ('filename' + '.delta') that turns the current version of
+    the metadata file 'filename' into 'metadata', before 'metadata' is written
+    to 'filename'.  Clients that hold the current version download the delta
+    instead of the full file.  If 'filename' does not exist yet, any stale
+    delta is removed instead.  See 'tuf.formats.DELTA_SCHEMA'.
+
+  <Arguments>
+    metadata:
+      The object that will be saved to 'filename'.
+
+    filename:
+      The filename (absolute path) of the metadata file.
+
+  <Exceptions>
+    tuf.FormatError, if the arguments are improperly formatted.
+
+    Any other runtime (e.g. IO) exception.
+
+  <Side Effects>
+    The delta file is created, overwritten or removed.
+
+  <Returns>
+    The path to the written delta file, or None if none was written.
+
+  """
+
+  # Are the arguments properly formatted?
+  # Raise 'tuf.FormatError' if there is a mismatch.
+  tuf.formats.SIGNABLE_SCHEMA.check_match(metadata)
+  tuf.formats.PATH_SCHEMA.check_match(filename)
+
+  delta_filename = filename + '.delta'
+  if not os.path.exists(filename):
+    if os.path.exists(delta_filename):
+      logger.info('Removing stale '+str(delta_filename))
+      os.remove(delta_filename)
+    return None
+
+  # The new version is serialized exactly as write_metadata_file() does.
+  base_fileinfo = get_metadata_file_info(filename)
+  old_file_object = open(filename, 'rb')
+  try:
+    old_data = old_file_object.read()
+  finally:
+    old_file_object.close()
+  new_data = json.dumps(metadata, indent=1, sort_keys=True) + '\n'
+
+  delta = {'base': base_fileinfo,
+           'edits': tuf.util.make_delta(old_data, new_data)}
+  tuf.formats.DELTA_SCHEMA.check_match(delta)
+
+  logger.info('Writing to '+str(delta_filename))
+  delta_file_object = open(delta_filename, 'w')
+  try:
+    json.dump(delta, delta_file_object, indent=1, sort_keys=True)
+    delta_file_object.write('\n')
+  finally:
+    delta_file_object.close()
+
+  return delta_filename
+
+
+
+
+
 def read_metadata_file(filename):
   """
   <Purpose>
@@ -1078,7 +1262,8 @@ def build_root_file(config_filepath, root_keyids, metadata_directory, version):
 
 
 def build_targets_file(target_paths, targets_keyids, metadata_directory,
-                       version, expiration_date):
+                       version, expiration_date, compressions=(),
+                       target_compressions=(), write_delta=False):
   """
   <Purpose>
     Build the targets metadata file using the signing keys in 'targets_keyids'.
@@ -1106,6 +1291,20 @@ def build_targets_file(target_paths, targets_keyids, metadata_directory,
       The expiration date, in UTC, of the metadata file.
       Conformant to 'tuf.formats.TIME_SCHEMA'.
 
+    compressions:
+      The compression extensions (e.g., 'gz', 'xz') of the compressed versions
+      of the targets file to write next to it.  Clients download the smallest
+      one that is listed in the release metadata.  None by default.
+
+    target_compressions:
+      Compression extensions of the compressed versions of target files that
+      are served next to them.  See generate_targets_metadata().
+
+    write_delta:
+      Whether to write 'targets.txt.delta', the delta from the current
+      targets file to the new one, so that clients download only the changed
+      lines.  See write_delta_metadata_file().
+
   <Exceptions>
     tuf.FormatError, if any of the arguments are improperly formatted.
 
@@ -1159,12 +1358,20 @@ def build_targets_file(target_paths, targets_keyids, metadata_directory,
 
   # Create the targets metadata object.
   targets_metadata = generate_targets_metadata(repository_directory, targets,
-                                               version, expiration_date)
+                                               version, expiration_date,
+                                               target_compressions)
 
   # Sign it.
   targets_filepath = os.path.join(metadata_directory, TARGETS_FILENAME)
   signable = sign_metadata(targets_metadata, targets_keyids, targets_filepath)
 
+  write_compressed_metadata_files(signable, targets_filepath, compressions)
+
+  if write_delta:
+    write_delta_metadata_file(signable, targets_filepath)
+  elif os.path.exists(targets_filepath + '.delta'):
+    os.remove(targets_filepath + '.delta')
+
   return write_metadata_file(signable, targets_filepath)
 
 
@@ -1172,7 +1379,8 @@ def build_targets_file(target_paths, targets_keyids, metadata_directory,
 
 
 def build_release_file(release_keyids, metadata_directory,
-                       version, expiration_date, compress=False):
+                       version, expiration_date, compress=False,
+                       compressions=('gz',)):
   """
   <Purpose>
     Build the release metadata file using the signing keys in 'release_keyids'.
@@ -1197,6 +1405,11 @@ def build_release_file(release_keyids, metadata_directory,
       Should we *include* a compressed version of the release file? By default,
       the answer is no.
 
+    compressions:
+      The compression extensions (e.g., 'gz', 'bz2', 'xz') of the compressed
+      versions of the release file to write, if 'compress' is True.  Only
+      gzip by default.
+
   <Exceptions>
     tuf.FormatError, if any of the arguments are improperly formatted.
 
@@ -1227,14 +1440,11 @@ def build_release_file(release_keyids, metadata_directory,
                                                version, expiration_date)
   signable = sign_metadata(release_metadata, release_keyids, release_filepath)
 
-  # Should we also include a compressed version of release.txt?
-  if compress:
-    # If so, write a gzip version of release.txt.
-    compressed_written_filepath = \
-        write_metadata_file(signable, release_filepath, compression='gz')
-    logger.info('Wrote '+str(compressed_written_filepath))
-  else:
+  # Should we also include compressed versions of release.txt?
+  if not compress:
     logger.debug('No compressed version of release metadata will be included.')
+    compressions = ()
+  write_compressed_metadata_files(signable, release_filepath, compressions)
 
   written_filepath = write_metadata_file(signable, release_filepath)
   logger.info('Wrote '+str(written_filepath))
@@ -1301,8 +1511,10 @@ def build_timestamp_file(timestamp_keyids, metadata_directory,
   # Should we include compressed versions of release in timestamp?
   compressions = ()
   if include_compressed_release:
-    # Presently, we include only gzip versions by default.
-    compressions = ('gz',)
+    # Include every compressed version that build_release_file() wrote.
+    compressions = tuple([extension for extension in
+                          tuf.util.COMPRESSION_EXTENSIONS.values()
+                          if os.path.exists(release_filepath+'.'+extension)])
     logger.info('Including '+str(compressions)+' versions of release in '\
                 'timestamp.')
   else:
@@ -1325,7 +1537,8 @@ def build_timestamp_file(timestamp_keyids, metadata_directory,
 
 def build_delegated_role_file(delegated_targets_directory, delegated_keyids, 
                               metadata_directory, delegation_metadata_directory,
-                              delegation_role_name, version, expiration_date):
+                              delegation_role_name, version, expiration_date,
+                              write_delta=False):
   """
   <Purpose>
     Build the targets metadata file using the signing keys in
@@ -1360,6 +1573,10 @@ def build_delegated_role_file(delegated_targets_directory, delegated_keyids,
       The expiration date, in UTC, of the metadata file.
       Conformant to 'tuf.formats.TIME_SCHEMA'.
 
+    write_delta:
+      Whether to write the delta from the current delegated role file to the
+      new one.  See write_delta_metadata_file().
+
   <Exceptions>
     tuf.FormatError, if any of the arguments are improperly formatted.
 
@@ -1405,6 +1622,11 @@ def build_delegated_role_file(delegated_targets_directory, delegated_keyids,
                                   delegation_role_name)
   signable = sign_metadata(targets_metadata, delegated_keyids, targets_filepath)
 
+  if write_delta:
+    write_delta_metadata_file(signable, targets_filepath)
+  elif os.path.exists(targets_filepath + '.delta'):
+    os.remove(targets_filepath + '.delta')
+
   return write_metadata_file(signable, targets_filepath)
 
 
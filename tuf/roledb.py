@@ -18,8 +18,9 @@
   'add_role()'.  There are many supplemental functions included here that yield
   useful information about the roles contained in the database, such as
   extracting all the parent rolenames for a specified rolename, deleting all the
-  delegated roles, retrieving role paths, etc.  The Update Framework process
-  maintains a single roledb.
+  delegated roles, retrieving role paths, etc.  Every RoleDB object is a
+  separate role database; the module-level functions operate on a default
+  one, shared by the whole process.
 
   The role database is a dictionary conformant to 'tuf.formats.ROLEDICT_SCHEMA'
   and has the form:
@@ -38,574 +39,752 @@ import tuf.log
 # See 'tuf.log' to learn how logging is handled in TUF.
 logger = logging.getLogger('tuf.roledb')
 
-# The role database.
-_roledb_dict = {}
 
-
-def create_roledb_from_root_metadata(root_metadata):
+class RoleDB(object):
+  """
+  A collection of roles, indexed by rolename.  Every instance is a separate
+  database; the module-level functions operate on a default instance.
   """
-  <Purpose>
-    Create a role database containing all of the unique roles found in
-    'root_metadata'.
 
-  <Arguments>
-    root_metadata:
-      A dictionary conformant to 'tuf.formats.ROOT_SCHEMA'.  The roles found
-      in the 'roles' field of 'root_metadata' is needed by this function.  
+  def __init__(self):
+    # The role database.
+    self._roledb_dict = {}
+
+
+
 
-  <Exceptions>
-    tuf.FormatError, if 'root_metadata' does not have the correct object format.
 
-    tuf.Error, if one of the roles found in 'root_metadata' contains an invalid
-    delegation (i.e., a nonexistent parent role).
+  def create_roledb_from_root_metadata(self, root_metadata):
+    """
+    <Purpose>
+      Create a role database containing all of the unique roles found in
+      'root_metadata'.
 
-  <Side Effects>
-    Calls add_role().
+    <Arguments>
+      root_metadata:
+        A dictionary conformant to 'tuf.formats.ROOT_SCHEMA'.  The roles found
+        in the 'roles' field of 'root_metadata' is needed by this function.  
+
+    <Exceptions>
+      tuf.FormatError, if 'root_metadata' does not have the correct object format.
+
+      tuf.Error, if one of the roles found in 'root_metadata' contains an invalid
+      delegation (i.e., a nonexistent parent role).
+
+    <Side Effects>
+      Calls add_role().
     
-    The old role database is replaced.
+      The old role database is replaced.
 
-  <Returns>
-    None.
+    <Returns>
+      None.
 
-  """
+    """
 
-  # Does 'root_metadata' have the correct object format?
-  # This check will ensure 'root_metadata' has the appropriate number of objects 
-  # and object types, and that all dict keys are properly named.
-  # Raises tuf.FormatError.
-  tuf.formats.ROOT_SCHEMA.check_match(root_metadata)
+    # Does 'root_metadata' have the correct object format?
+    # This check will ensure 'root_metadata' has the appropriate number of objects 
+    # and object types, and that all dict keys are properly named.
+    # Raises tuf.FormatError.
+    tuf.formats.ROOT_SCHEMA.check_match(root_metadata)
 
-  # Clear the role database.
-  _roledb_dict.clear()
+    # Clear the role database.
+    self._roledb_dict.clear()
 
-  # Iterate through the roles found in 'root_metadata'
-  # and add them to '_roledb_dict'.  Duplicates are avoided.
-  for rolename, roleinfo in root_metadata['roles'].items():
-    try:
-      add_role(rolename, roleinfo)
-    # tuf.Error raised if the parent role of 'rolename' does not exist.  
-    except tuf.Error, e:
-      logger.error(e)
-      raise
+    # Iterate through the roles found in 'root_metadata'
+    # and add them to the database.  Duplicates are avoided.
+    for rolename, roleinfo in root_metadata['roles'].items():
+      try:
+        self.add_role(rolename, roleinfo)
+      # tuf.Error raised if the parent role of 'rolename' does not exist.  
+      except tuf.Error, e:
+        logger.error(e)
+        raise
 
 
 
 
 
-def add_role(rolename, roleinfo, require_parent=True):
-  """
-  <Purpose>
-    Add to the role database the 'roleinfo' associated with 'rolename'.
+  def add_role(self, rolename, roleinfo, require_parent=True):
+    """
+    <Purpose>
+      Add to the role database the 'roleinfo' associated with 'rolename'.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-    roleinfo:
-      An object representing the role associated with 'rolename', conformant to
-      ROLE_SCHEMA.  'roleinfo' has the form: 
-      {'keyids': ['34345df32093bd12...'],
-       'threshold': 1}
+      roleinfo:
+        An object representing the role associated with 'rolename', conformant to
+        ROLE_SCHEMA.  'roleinfo' has the form: 
+        {'keyids': ['34345df32093bd12...'],
+         'threshold': 1}
 
-      The 'target' role has an additional 'paths' key.  Its value is a list of
-      strings representing the path of the target file(s).
+        The 'target' role has an additional 'paths' key.  Its value is a list of
+        strings representing the path of the target file(s).
 
-    require_parent:
-      A boolean indicating whether to check for a delegating role.  add_role()
-      will raise an exception if this parent role does not exist.
+      require_parent:
+        A boolean indicating whether to check for a delegating role.  add_role()
+        will raise an exception if this parent role does not exist.
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' or 'roleinfo' does not have the correct
-    object format.
+    <Exceptions>
+      tuf.FormatError, if 'rolename' or 'roleinfo' does not have the correct
+      object format.
 
-    tuf.RoleAlreadyExistsError, if 'rolename' has already been added.
+      tuf.RoleAlreadyExistsError, if 'rolename' has already been added.
 
-    tuf.InvalidNameError, if 'rolename' is improperly formatted.
+      tuf.InvalidNameError, if 'rolename' is improperly formatted.
 
-  <Side Effects>
-    The role database is modified.
+    <Side Effects>
+      The role database is modified.
 
-  <Returns>
-    None.
+    <Returns>
+      None.
 
-  """
+    """
 
-  # Does 'rolename' have the correct object format?
-  # This check will ensure 'rolename' has the appropriate number of objects 
-  # and object types, and that all dict keys are properly named.
-  tuf.formats.ROLENAME_SCHEMA.check_match(rolename)
+    # Does 'rolename' have the correct object format?
+    # This check will ensure 'rolename' has the appropriate number of objects 
+    # and object types, and that all dict keys are properly named.
+    tuf.formats.ROLENAME_SCHEMA.check_match(rolename)
 
-  # Does 'roleinfo' have the correct object format?
-  tuf.formats.ROLE_SCHEMA.check_match(roleinfo)
+    # Does 'roleinfo' have the correct object format?
+    tuf.formats.ROLE_SCHEMA.check_match(roleinfo)
 
-  # Does 'require_parent' have the correct format?
-  tuf.formats.TOGGLE_SCHEMA.check_match(require_parent)
+    # Does 'require_parent' have the correct format?
+    tuf.formats.TOGGLE_SCHEMA.check_match(require_parent)
 
-  # Raises tuf.InvalidNameError.
-  _validate_rolename(rolename)
+    # Raises tuf.InvalidNameError.
+    _validate_rolename(rolename)
 
-  if rolename in _roledb_dict:
-    raise tuf.RoleAlreadyExistsError('Role already exists: '+rolename)
+    if rolename in self._roledb_dict:
+      raise tuf.RoleAlreadyExistsError('Role already exists: '+rolename)
 
-  # Make sure that the delegating role exists. This should be just a
-  # sanity check and not a security measure.
-  if require_parent and '/' in rolename:
-    # Get parent role.  'a/b/c/d' --> 'a/b/c'. 
-    parent_role = '/'.join(rolename.split('/')[:-1])
+    # Make sure that the delegating role exists. This should be just a
+    # sanity check and not a security measure.
+    if require_parent and '/' in rolename:
+      # Get parent role.  'a/b/c/d' --> 'a/b/c'. 
+      parent_role = '/'.join(rolename.split('/')[:-1])
 
-    if parent_role not in _roledb_dict:
-      raise tuf.Error('Parent role does not exist: '+parent_role)
+      if parent_role not in self._roledb_dict:
+        raise tuf.Error('Parent role does not exist: '+parent_role)
 
-  _roledb_dict[rolename] = roleinfo
+    self._roledb_dict[rolename] = roleinfo
 
 
 
 
 
-def get_parent_rolename(rolename):
-  """
-  <Purpose>
-    Return the name of the parent role for 'rolename'.
-    Given the rolename 'a/b/c/d', return 'a/b/c'.
-    Given 'a', return ''.
+  def get_parent_rolename(self, rolename):
+    """
+    <Purpose>
+      Return the name of the parent role for 'rolename'.
+      Given the rolename 'a/b/c/d', return 'a/b/c'.
+      Given 'a', return ''.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format.
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format.
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
+    <Side Effects>
+      None.
 
-  <Returns>
-    A string representing the name of the parent role.
+    <Returns>
+      A string representing the name of the parent role.
 
-  """
+    """
 
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
 
-  parts = rolename.split('/')
-  parent_rolename = '/'.join(parts[:-1])
+    parts = rolename.split('/')
+    parent_rolename = '/'.join(parts[:-1])
 
-  return parent_rolename
+    return parent_rolename
 
 
 
 
 
-def get_all_parent_roles(rolename):
-  """
-  <Purpose>
-    Return a list of roles that are parents of 'rolename'.
-    Given the rolename 'a/b/c/d', return the list:
-    ['a', 'a/b', 'a/b/c'].
+  def get_all_parent_roles(self, rolename):
+    """
+    <Purpose>
+      Return a list of roles that are parents of 'rolename'.
+      Given the rolename 'a/b/c/d', return the list:
+      ['a', 'a/b', 'a/b/c'].
 
-    Given 'a', return ['a'].
+      Given 'a', return ['a'].
   
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format. 
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format. 
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is improperly formatted.
+      tuf.InvalidNameError, if 'rolename' is improperly formatted.
 
-  <Side Effects>
-    None.
+    <Side Effects>
+      None.
 
-  <Returns>
-    A list containing all the parent roles.
+    <Returns>
+      A list containing all the parent roles.
 
-  """
+    """
     
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
 
-  # List of parent roles returned.
-  parent_roles = []
+    # List of parent roles returned.
+    parent_roles = []
 
-  parts = rolename.split('/')
+    parts = rolename.split('/')
 
-  # Append the first role to the list.
-  parent_roles.append(parts[0])
+    # Append the first role to the list.
+    parent_roles.append(parts[0])
 
-  # The 'roles_added' string contains the roles already added.  If 'a' and 'a/b'
-  # have been added to 'parent_roles', 'roles_added' would contain 'a/b'
-  roles_added = parts[0]
+    # The 'roles_added' string contains the roles already added.  If 'a' and 'a/b'
+    # have been added to 'parent_roles', 'roles_added' would contain 'a/b'
+    roles_added = parts[0]
 
-  # Add each subsequent role to the previous string (with a '/' separator).
-  # This only goes to -1 because we only want to return the parents (so we
-  # ignore the last element).
-  for next_role in parts[1:-1]:
-    parent_roles.append(roles_added+'/'+next_role)
-    roles_added = roles_added+'/'+next_role
+    # Add each subsequent role to the previous string (with a '/' separator).
+    # This only goes to -1 because we only want to return the parents (so we
+    # ignore the last element).
+    for next_role in parts[1:-1]:
+      parent_roles.append(roles_added+'/'+next_role)
+      roles_added = roles_added+'/'+next_role
 
-  return parent_roles
+    return parent_roles
 
 
 
 
 
-def role_exists(rolename):
-  """
-  <Purpose>
-    Verify whether 'rolename' is stored in the role database.
+  def role_exists(self, rolename):
+    """
+    <Purpose>
+      Verify whether 'rolename' is stored in the role database.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format.
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
+    <Side Effects>
+      None.
 
-  <Returns>
-    Boolean.  True if 'rolename' is found in the role database, False otherwise.
+    <Returns>
+      Boolean.  True if 'rolename' is found in the role database, False otherwise.
 
-  """
+    """
 
-  # Raise tuf.FormatError, tuf.InvalidNameError.
-  try: 
-    _check_rolename(rolename)
-  except (tuf.FormatError, tuf.InvalidNameError):
-    raise
-  except tuf.UnknownRoleError:
-    return False
+    # Raise tuf.FormatError, tuf.InvalidNameError.
+    try: 
+      self._check_rolename(rolename)
+    except (tuf.FormatError, tuf.InvalidNameError):
+      raise
+    except tuf.UnknownRoleError:
+      return False
   
-  return True
+    return True
 
 
 
 
 
-def remove_role(rolename):
-  """
-  <Purpose>
-    Remove 'rolename', including its delegations.
+  def remove_role(self, rolename):
+    """
+    <Purpose>
+      Remove 'rolename', including its delegations.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format.
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format.
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    A role, or roles, may be removed from the role database.
+    <Side Effects>
+      A role, or roles, may be removed from the role database.
 
-  <Returns>
-    None.
+    <Returns>
+      None.
   
-  """
+    """
  
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
   
-  remove_delegated_roles(rolename)
-  if rolename in _roledb_dict:
-    del _roledb_dict[rolename]
+    self.remove_delegated_roles(rolename)
+    if rolename in self._roledb_dict:
+      del self._roledb_dict[rolename]
 
 
 
 
 
-def remove_delegated_roles(rolename):
-  """
-  <Purpose>
-    Remove a role's delegations (leaving the rest of the role alone).
-    All levels of delegation are removed, not just the directly delegated roles.
-    If 'rolename' is 'a/b/c' and the role database contains
-    ['a/b/c/d/e', 'a/b/c/d', 'a/b/c', 'a/b', 'a'], return
-    ['a/b/c', 'a/b', 'a'].
-
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
-
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format. 
+  def remove_delegated_roles(self, rolename):
+    """
+    <Purpose>
+      Remove a role's delegations (leaving the rest of the role alone).
+      All levels of delegation are removed, not just the directly delegated roles.
+      If 'rolename' is 'a/b/c' and the role database contains
+      ['a/b/c/d/e', 'a/b/c/d', 'a/b/c', 'a/b', 'a'], return
+      ['a/b/c', 'a/b', 'a'].
+
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
+
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format. 
    
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    Role(s) from the role database may be deleted.
+    <Side Effects>
+      Role(s) from the role database may be deleted.
 
-  <Returns>
-    None.
+    <Returns>
+      None.
 
-  """
+    """
   
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
 
-  # Ensure that we only care about delegated roles!
-  rolename_with_slash = rolename + '/'
-  for name in get_rolenames():
-    if name.startswith(rolename_with_slash):
-      del _roledb_dict[name]
+    # Ensure that we only care about delegated roles!
+    rolename_with_slash = rolename + '/'
+    for name in self.get_rolenames():
+      if name.startswith(rolename_with_slash):
+        del self._roledb_dict[name]
 
 
 
 
 
-def get_rolenames():
-  """
-  <Purpose>
-    Return a list of the rolenames found in the role database.
+  def get_rolenames(self):
+    """
+    <Purpose>
+      Return a list of the rolenames found in the role database.
 
-  <Arguments>
-    None.
+    <Arguments>
+      None.
 
-  <Exceptions>
-    None.
+    <Exceptions>
+      None.
 
-  <Side Effects>
-    None.
+    <Side Effects>
+      None.
   
-  <Returns>
-    A list of rolenames.
+    <Returns>
+      A list of rolenames.
 
-  """
+    """
   
-  return _roledb_dict.keys()
+    return self._roledb_dict.keys()
 
 
 
 
 
-def get_role_keyids(rolename):
-  """
-  <Purpose>
-    Return a list of the keyids associated with 'rolename'.
-    Keyids are used as identifiers for keys (e.g., rsa key).
-    A list of keyids are associated with each rolename.
-    Signing a metadata file, such as 'root.txt' (Root role),
-    involves signing or verifying the file with a list of
-    keys identified by keyid.
+  def get_role_keyids(self, rolename):
+    """
+    <Purpose>
+      Return a list of the keyids associated with 'rolename'.
+      Keyids are used as identifiers for keys (e.g., rsa key).
+      A list of keyids are associated with each rolename.
+      Signing a metadata file, such as 'root.txt' (Root role),
+      involves signing or verifying the file with a list of
+      keys identified by keyid.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format. 
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format. 
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
+    <Side Effects>
+      None.
 
-  <Returns>
-    A list of keyids.
+    <Returns>
+      A list of keyids.
 
-  """
+    """
   
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
 
-  roleinfo = _roledb_dict[rolename]
+    roleinfo = self._roledb_dict[rolename]
   
-  return roleinfo['keyids']
+    return roleinfo['keyids']
 
 
 
 
 
-def get_role_threshold(rolename):
+  def get_role_threshold(self, rolename):
+    """
+    <Purpose>
+      Return the threshold value of the role associated with 'rolename'.
+
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
+
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format. 
+
+      tuf.UnknownRoleError, if 'rolename' cannot be found in in the role database.
+
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A threshold integer value.
+
+    """
+
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
+
+    roleinfo = self._roledb_dict[rolename]
+  
+    return roleinfo['threshold']
+
+
+
+
+
+  def get_role_paths(self, rolename):
+    """
+    <Purpose>
+      Return the paths of the role associated with 'rolename'.
+
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
+
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format.
+
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A list of paths. 
+
+    """
+
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
+
+    roleinfo = self._roledb_dict[rolename]
+  
+    # Paths won't exist for non-target roles.
+    try:
+      return roleinfo['paths']
+    except KeyError:
+      return list()
+
+
+
+
+
+  def get_delegated_rolenames(self, rolename):
+    """
+    <Purpose>
+      Return the delegations of a role.  If 'rolename' is 'a/b/c'
+      and the role database contains ['a/b/c/d', 'a/b/c/d/e', 'a/b/c'], 
+      return ['a/b/c/d', 'a/b/c/d/e']
+
+    <Arguments>
+      rolename:
+        An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
+        (e.g., 'root', 'release', 'timestamp').
+
+    <Exceptions>
+      tuf.FormatError, if 'rolename' does not have the correct object format.
+
+      tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
+
+      tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A list of rolenames. Note that the rolenames are *NOT* sorted by order of
+      delegation!
+
+    """
+
+    # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
+    self._check_rolename(rolename)
+
+    # The list of delegated roles to be returned. 
+    delegated_roles = []
+
+    # Ensure that we only care about delegated roles!
+    rolename_with_slash = rolename + '/'
+    for name in self.get_rolenames():
+      if name.startswith(rolename_with_slash):
+        delegated_roles.append(name)
+  
+    return delegated_roles
+
+
+
+
+
+  def clear_roledb(self):
+    """
+    <Purpose>
+      Reset the roledb database.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+
+    """
+
+    self._roledb_dict.clear()
+
+
+
+
+
+  def _check_rolename(self, rolename):
+    """
+    Raise tuf.FormatError if 'rolename' does not match
+    'tuf.formats.ROLENAME_SCHEMA', tuf.UnknownRoleError if 'rolename' is not
+    found in the role database, or tuf.InvalidNameError if 'rolename' is
+    not formatted correctly.
+
+    """
+  
+    # Does 'rolename' have the correct object format?
+    # This check will ensure 'rolename' has the appropriate number of objects 
+    # and object types, and that all dict keys are properly named.
+    tuf.formats.ROLENAME_SCHEMA.check_match(rolename)
+
+    # Raises tuf.InvalidNameError.
+    _validate_rolename(rolename)
+  
+    if rolename not in self._roledb_dict:
+      raise tuf.UnknownRoleError('Role name does not exist: '+rolename)
+
+
+
+
+
+# The default role database, on which the module-level functions below
+# operate.  Code that deals with several repositories at once, such as
+# tuf.client.updater.Updater, owns a RoleDB instead.
+_default_roledb = RoleDB()
+_roledb_dict = _default_roledb._roledb_dict
+
+
+
+
+
+def create_roledb_from_root_metadata(root_metadata):
   """
-  <Purpose>
-    Return the threshold value of the role associated with 'rolename'.
+  Call RoleDB.create_roledb_from_root_metadata() on the default role database.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+  """
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format. 
+  return _default_roledb.create_roledb_from_root_metadata(root_metadata)
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
 
-  <Returns>
-    A threshold integer value.
 
+def add_role(rolename, roleinfo, require_parent=True):
   """
+  Call RoleDB.add_role() on the default role database.
 
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+  """
 
-  roleinfo = _roledb_dict[rolename]
-  
-  return roleinfo['threshold']
+  return _default_roledb.add_role(rolename,
+                                  roleinfo, require_parent=require_parent)
 
 
 
 
 
-def get_role_paths(rolename):
+def get_parent_rolename(rolename):
   """
-  <Purpose>
-    Return the paths of the role associated with 'rolename'.
+  Call RoleDB.get_parent_rolename() on the default role database.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+  """
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format.
+  return _default_roledb.get_parent_rolename(rolename)
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
 
-  <Returns>
-    A list of paths. 
 
+def get_all_parent_roles(rolename):
   """
+  Call RoleDB.get_all_parent_roles() on the default role database.
 
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+  """
 
-  roleinfo = _roledb_dict[rolename]
-  
-  # Paths won't exist for non-target roles.
-  try:
-    return roleinfo['paths']
-  except KeyError:
-    return list()
+  return _default_roledb.get_all_parent_roles(rolename)
 
 
 
 
 
-def get_delegated_rolenames(rolename):
+def role_exists(rolename):
   """
-  <Purpose>
-    Return the delegations of a role.  If 'rolename' is 'a/b/c'
-    and the role database contains ['a/b/c/d', 'a/b/c/d/e', 'a/b/c'], 
-    return ['a/b/c/d', 'a/b/c/d/e']
+  Call RoleDB.role_exists() on the default role database.
 
-  <Arguments>
-    rolename:
-      An object representing the role's name, conformant to 'ROLENAME_SCHEMA'
-      (e.g., 'root', 'release', 'timestamp').
+  """
 
-  <Exceptions>
-    tuf.FormatError, if 'rolename' does not have the correct object format.
+  return _default_roledb.role_exists(rolename)
 
-    tuf.UnknownRoleError, if 'rolename' cannot be found in the role database.
 
-    tuf.InvalidNameError, if 'rolename' is incorrectly formatted.
 
-  <Side Effects>
-    None.
 
-  <Returns>
-    A list of rolenames. Note that the rolenames are *NOT* sorted by order of
-    delegation!
 
+def remove_role(rolename):
   """
+  Call RoleDB.remove_role() on the default role database.
 
-  # Raises tuf.FormatError, tuf.UnknownRoleError, or tuf.InvalidNameError.
-  _check_rolename(rolename)
+  """
 
-  # The list of delegated roles to be returned. 
-  delegated_roles = []
+  return _default_roledb.remove_role(rolename)
 
-  # Ensure that we only care about delegated roles!
-  rolename_with_slash = rolename + '/'
-  for name in get_rolenames():
-    if name.startswith(rolename_with_slash):
-      delegated_roles.append(name)
-  
-  return delegated_roles
 
 
 
 
+def remove_delegated_roles(rolename):
+  """
+  Call RoleDB.remove_delegated_roles() on the default role database.
 
-def clear_roledb():
   """
-  <Purpose>
-    Reset the roledb database.
 
-  <Arguments>
-    None.
+  return _default_roledb.remove_delegated_roles(rolename)
+
 
-  <Exceptions>
-    None.
 
-  <Side Effects>
-    None.
 
-  <Returns>
-    None.
 
+def get_rolenames():
   """
+  Call RoleDB.get_rolenames() on the default role database.
 
-  _roledb_dict.clear()
+  """
 
+  return _default_roledb.get_rolenames()
 
 
 
 
-def _check_rolename(rolename):
+
+def get_role_keyids(rolename):
   """
-  Raise tuf.FormatError if 'rolename' does not match
-  'tuf.formats.ROLENAME_SCHEMA', tuf.UnknownRoleError if 'rolename' is not
-  found in the role database, or tuf.InvalidNameError if 'rolename' is
-  not formatted correctly.
+  Call RoleDB.get_role_keyids() on the default role database.
 
   """
-  
-  # Does 'rolename' have the correct object format?
-  # This check will ensure 'rolename' has the appropriate number of objects 
-  # and object types, and that all dict keys are properly named.
-  tuf.formats.ROLENAME_SCHEMA.check_match(rolename)
 
-  # Raises tuf.InvalidNameError.
-  _validate_rolename(rolename)
-  
-  if rolename not in _roledb_dict:
-    raise tuf.UnknownRoleError('Role name does not exist: '+rolename)
+  return _default_roledb.get_role_keyids(rolename)
+
+
+
+
+
+def get_role_threshold(rolename):
+  """
+  Call RoleDB.get_role_threshold() on the default role database.
+
+  """
+
+  return _default_roledb.get_role_threshold(rolename)
+
+
+
+
+
+def get_role_paths(rolename):
+  """
+  Call RoleDB.get_role_paths() on the default role database.
+
+  """
+
+  return _default_roledb.get_role_paths(rolename)
+
+
+
+
+
+def get_delegated_rolenames(rolename):
+  """
+  Call RoleDB.get_delegated_rolenames() on the default role database.
+
+  """
+
+  return _default_roledb.get_delegated_rolenames(rolename)
+
+
+
+
+
+def clear_roledb():
+  """
+  Call RoleDB.clear_roledb() on the default role database.
+
+  """
+
+  return _default_roledb.clear_roledb()
 
 
 
@@ -42,7 +42,7 @@ import tuf.keydb
 import tuf.roledb
 
 
-def get_signature_status(signable, role=None):
+def get_signature_status(signable, role=None, keydb=None, roledb=None):
   """
   <Purpose>
     Return a dictionary representing the status of the signatures listed
@@ -65,6 +65,14 @@ def get_signature_status(signable, role=None):
     role:
       TUF role (e.g., 'root', 'targets', 'release').
 
+    keydb:
+      The key database in which the keys of the signatures are looked up, a
+      'tuf.keydb.KeyDB' object.  If None, the default 'tuf.keydb'.
+
+    roledb:
+      The role database in which 'role' is looked up, a 'tuf.roledb.RoleDB'
+      object.  If None, the default 'tuf.roledb'.
+
   <Exceptions>
     tuf.FormatError, if 'signable' does not have the correct format.
 
@@ -85,6 +93,13 @@ def get_signature_status(signable, role=None):
   # Raise 'tuf.FormatError' if the check fails.
   tuf.formats.SIGNABLE_SCHEMA.check_match(signable)
 
+  # The module-level functions of 'tuf.keydb' and 'tuf.roledb' operate on
+  # their default databases.
+  if keydb is None:
+    keydb = tuf.keydb
+  if roledb is None:
+    roledb = tuf.roledb
+
   # The signature status dictionary returned.
   signature_status = {}
 
@@ -118,7 +133,7 @@ def get_signature_status(signable, role=None):
 
     # Identify unrecognized key.
     try:
-      key = tuf.keydb.get_key(keyid)
+      key = keydb.get_key(keyid)
     except tuf.UnknownKeyError:
       unknown_sigs.append(keyid)
       continue
@@ -135,7 +150,7 @@ def get_signature_status(signable, role=None):
       if role is not None:
         try:
           # Identify unauthorized key. 
-          if keyid not in tuf.roledb.get_role_keyids(role):
+          if keyid not in roledb.get_role_keyids(role):
             untrusted_sigs.append(keyid)
             continue
         # Unknown role, re-raise exception. 
@@ -151,7 +166,7 @@ def get_signature_status(signable, role=None):
   # if we were given an invalid role.
   if role is not None:
     try:
-      threshold = tuf.roledb.get_role_threshold(role)
+      threshold = roledb.get_role_threshold(role)
     except tuf.UnknownRoleError:
       raise
   else:
@@ -171,7 +186,7 @@ def get_signature_status(signable, role=None):
 
 
 
-def verify(signable, role):
+def verify(signable, role, keydb=None, roledb=None):
   """
   <Purpose> 
     Verify whether the authorized signatures of 'signable' meet the minimum
@@ -187,6 +202,12 @@ def verify(signable, role):
     role:
       TUF role (e.g., 'root', 'targets', 'release').
 
+    keydb:
+      The key database to use.  See get_signature_status().
+
+    roledb:
+      The role database to use.  See get_signature_status().
+
   <Exceptions>
     tuf.UnknownRoleError, if 'role' is not recognized.
 
@@ -207,7 +228,7 @@ def verify(signable, role):
   # Retrieve the signature status.  tuf.sig.get_signature_status() raises
   # tuf.UnknownRoleError
   # tuf.FormatError
-  status = get_signature_status(signable, role)
+  status = get_signature_status(signable, role, keydb, roledb)
   
   # Retrieve the role's threshold and the authorized keys of 'status'
   threshold = status['threshold']
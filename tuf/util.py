@@ -15,17 +15,24 @@
   Provides utility services.  This module supplies utility functions such as:
   get_file_details() that computes the length and hash of a file, import_json
   that tries to import a working json module, load_json_* functions, and a
-  TempFile class that generates a file-like object for temporary storage, etc.
+  TempFile class that generates a file-like object for temporary storage,
+  make_delta() and apply_delta() for metadata deltas, etc.
 
 """
 
 
 import os
 import sys
+import stat
+import errno
+import bz2
 import gzip
+import zlib
 import shutil
+import difflib
 import logging
 import tempfile
+import cStringIO
 
 import tuf
 import tuf.hash
@@ -37,6 +44,58 @@ import tuf.formats
 logger = logging.getLogger('tuf.util')
 
 
+def _read_umask():
+  """Return the file mode creation mask of the process.  Linux reports it in
+  '/proc/self/status'.  Elsewhere it can only be read by setting it, which
+  changes it for the whole process for a moment, so it is only read once, on
+  import, before any thread of the library creates files."""
+
+  try:
+    status_file = open('/proc/self/status')
+    try:
+      for line in status_file:
+        if line.startswith('Umask:'):
+          return int(line.split()[1], 8)
+    finally:
+      status_file.close()
+  except (IOError, ValueError, IndexError):
+    pass
+
+  umask = os.umask(0)
+  os.umask(umask)
+  return umask
+
+
+# The file mode creation mask of the process.  A temporary file that is
+# renamed into place, where no file was, is given the permissions a newly
+# created file would get.
+_umask = _read_umask()
+
+# xz compression is optional.  The 'lzma' module is in the standard library of
+# Python 3.3 and later; earlier versions need the 'backports.lzma' package.
+try:
+  import lzma
+except ImportError:
+  try:
+    from backports import lzma
+  except ImportError:
+    logger.debug('lzma could not be imported.  xz compression is disabled.')
+    lzma = None
+
+# The compression algorithms supported for metadata, and the extensions of
+# the files compressed with them (e.g., 'release.txt.gz').
+COMPRESSION_EXTENSIONS = {'gzip': 'gz', 'bzip2': 'bz2'}
+if lzma is not None:
+  COMPRESSION_EXTENSIONS['xz'] = 'xz'
+
+# The size of the pieces of compressed data that are fed, one at a time, to a
+# decompressor that cannot be told how much data to return (i.e., all but
+# zlib's), when the decompressed data has a required length.  A few bytes of
+# a bzip2 or xz block may expand to megabytes, so the pieces are small; the
+# data decompressed past the required length is then at most a block or so.
+_DECOMPRESSION_PIECE_SIZE = 256 #bytes
+
+
 class TempFile(object):
   """
   <Purpose>
@@ -52,14 +111,14 @@ class TempFile(object):
   def _default_temporary_directory(self, prefix):
     """__init__ helper."""
     try:
-      self.temporary_file = tempfile.NamedTemporaryFile(prefix=prefix)
+      return tempfile.NamedTemporaryFile(prefix=prefix)
     except OSError, err:
       logger.critical('Temp file in '+temp_dir+'failed: '+repr(err))
       raise tuf.Error(err)
 
 
 
-  def __init__(self, prefix='tuf_temp_'):
+  def __init__(self, prefix='tuf_temp_', spool_size=None):
     """
     <Purpose>
       Initializes TempFile.
@@ -68,6 +127,11 @@ class TempFile(object):
       prefix:
         A string argument to be used with tempfile.NamedTemporaryFile function.
 
+      spool_size:
+        If not None, the file is kept in memory until it grows larger than
+        'spool_size' bytes, and only then moved to a file on disk.  This
+        spares small files a round trip to disk.
+
     <Exceptions>
       tuf.Error on failure to load temp dir.
 
@@ -79,17 +143,49 @@ class TempFile(object):
     self._compression = None
     # If compression is set then the original file is saved in 'self._orig_file'.
     self._orig_file = None
+    # Data that has been written but not yet handed to 'self.temporary_file',
+    # and its length.  See write().
+    self._write_buffer = []
+    self._write_buffer_length = 0
+    self._prefix = prefix
+    self._spool_size = spool_size
+    # The decompressor that decompresses the data as it is written, if any,
+    # the file that receives the decompressed data, and the number of bytes
+    # decompressed so far.  See start_decompression().
+    self._decompressor = None
+    self._decompressed_file = None
+    self._decompressed_length = 0
+    # The length the decompressed data must not exceed, if any, the length
+    # of the data decompressed so far, and the error that stopped
+    # decompression, if the data is invalid.
+    self._decompressed_required_length = None
+    self._decompressed_output_length = 0
+    self._decompression_error = None
+
+    # While 'self._spooled' is True, 'self.temporary_file' is an in-memory
+    # file.  See _write_buffered_data().
+    if spool_size is not None:
+      self._spooled = True
+      self.temporary_file = cStringIO.StringIO()
+    else:
+      self._spooled = False
+      self.temporary_file = self._named_temporary_file(prefix)
+
+
+
+  def _named_temporary_file(self, prefix):
+    """__init__ helper that creates and returns a temporary file on disk."""
+
     temp_dir = tuf.conf.temporary_directory
     if  temp_dir is not None and isinstance(temp_dir, str):
       try:
-        self.temporary_file = tempfile.NamedTemporaryFile(prefix=prefix,
-                                                          dir=temp_dir)
+        return tempfile.NamedTemporaryFile(prefix=prefix, dir=temp_dir)
       except OSError, err:
         logger.error('Temp file in '+temp_dir+' failed: '+repr(err))
         logger.error('Will attempt to use system default temp dir.')
-        self._default_temporary_directory(prefix)
+        return self._default_temporary_directory(prefix)
     else:
-      self._default_temporary_directory(prefix)
+      return self._default_temporary_directory(prefix)
 
 
 
@@ -110,29 +206,45 @@ class TempFile(object):
 
     """
 
+    # Buffered writes count towards the length of the file.
+    self.flush()
+
     # Even if we read a compressed file with the gzip standard library module,
     # the original file will remain compressed.
-    return os.stat(self.temporary_file.name).st_size
+    if self._orig_file is not None:
+      original_file = self._orig_file
+    else:
+      original_file = self.temporary_file
+
+    if self._spooled:
+      return _memory_file_length(original_file)
+    else:
+      return os.stat(original_file.name).st_size
 
 
 
-  def flush(self):
+  def flush(self, fsync=False):
     """
     <Purpose>
       Flushes buffered output for the file.
 
     <Arguments>
-      None.
+      fsync:
+        Boolean argument, if set to 'True', the file is also synced to disk
+        after it is flushed.  A file that is kept in memory is not synced.
 
     <Exceptions>
-      None.
+      OSError, if the file could not be synced.
 
     <Return>
       None.
 
     """
 
+    self._write_buffered_data()
     self.temporary_file.flush()
+    if fsync and not self._spooled:
+      os.fsync(self.temporary_file.fileno())
 
 
 
@@ -154,6 +266,8 @@ class TempFile(object):
 
     """
 
+    self._write_buffered_data()
+
     if size is None:
       self.temporary_file.seek(0)
       data = self.temporary_file.read()
@@ -169,7 +283,8 @@ class TempFile(object):
   def write(self, data, auto_flush=True):
     """
     <Purpose>
-      Writes a data string to the file.
+      Writes a data string to the file.  Unless 'auto_flush' is set, the data
+      is buffered in memory, up to 'tuf.conf.TEMPFILE_BUFFER_SIZE' bytes.
 
     <Arguments>
       data:
@@ -177,27 +292,85 @@ class TempFile(object):
 
       auto_flush:
         Boolean argument, if set to 'True', all data will be flushed from
-        internal buffer.
+        internal buffer.  Set it to 'False' when writing many small chunks;
+        they are flushed together when the buffer fills up, or by flush().
 
     <Exceptions>
-      None.
+      tuf.DownloadLengthMismatchError: If the file is being decompressed, and
+      its decompressed data is longer than the required length given to
+      start_decompression().  'data' is then not written.
 
     <Return>
       None.
 
     """
 
-    self.temporary_file.write(data)
+    # Data is decompressed as soon as it is written, but only in order.
+    if self._decompressor is not None:
+      position = self.temporary_file.tell() + self._write_buffer_length
+      if position == self._decompressed_length:
+        self._decompress(data)
+      else:
+        self._stop_decompression()
+
+    # Small writes are collected in 'self._write_buffer', which is written to
+    # 'self.temporary_file' in one go when it fills up, or on flush().  Data
+    # that would fill the buffer by itself is written directly.
+    if not self._write_buffer and \
+       len(data) >= tuf.conf.TEMPFILE_BUFFER_SIZE:
+      self.temporary_file.write(data)
+      self._rollover()
+    else:
+      self._write_buffer.append(data)
+      self._write_buffer_length += len(data)
+      if self._write_buffer_length >= tuf.conf.TEMPFILE_BUFFER_SIZE:
+        self._write_buffered_data()
+
     if auto_flush:
       self.flush()
 
 
 
+  def _write_buffered_data(self):
+    """Write the data in the write buffer to 'self.temporary_file'."""
+
+    if self._write_buffer:
+      if len(self._write_buffer) == 1:
+        data = self._write_buffer[0]
+      else:
+        data = ''.join(self._write_buffer)
+      del self._write_buffer[:]
+      self._write_buffer_length = 0
+      self.temporary_file.write(data)
+      self._rollover()
+
+
+
+  def _rollover(self, force=False):
+    """Move an in-memory file that has outgrown its spool size to disk."""
+
+    if self._spooled and self._orig_file is None:
+      memory_file = self.temporary_file
+      # Only copy the data of the in-memory file when it is moved to disk.
+      if force or _memory_file_length(memory_file) > self._spool_size:
+        position = memory_file.tell()
+        self.temporary_file = self._named_temporary_file(self._prefix)
+        self._spooled = False
+        self.temporary_file.write(memory_file.getvalue())
+        self.temporary_file.seek(position)
+        memory_file.close()
+
+
+
   def move(self, destination_path):
     """
     <Purpose>
-      Copies 'self.temporary_file' to a non-temp file at 'destination_path' and
-      closes 'self.temporary_file' so that it is removed.
+      Moves 'self.temporary_file' to a non-temp file at 'destination_path'.
+      If the temporary file is on the same filesystem as 'destination_path',
+      it is atomically renamed into place.  Otherwise, or if the file is kept
+      in memory, it is copied to 'destination_path' and closed so that it is
+      removed.  Any existing file at 'destination_path' is replaced, and its
+      permissions are kept.
 
     <Arguments>
       destination_path:
@@ -212,6 +385,30 @@ class TempFile(object):
     """
 
     self.flush()
+
+    # Renaming a file does not write its data a second time.  Only a
+    # 'tempfile.NamedTemporaryFile' can be told not to remove its file on
+    # close.
+    if hasattr(self.temporary_file, 'delete'):
+      try:
+        # Keep the permissions of the file being replaced, as copying into it
+        # does.
+        try:
+          mode = stat.S_IMODE(os.stat(destination_path).st_mode)
+        except OSError:
+          mode = 0666 & ~_umask
+        os.chmod(self.temporary_file.name, mode)
+        os.rename(self.temporary_file.name, destination_path)
+      except OSError, err:
+        logger.debug('Could not rename '+repr(self.temporary_file.name)+
+                     ' to '+repr(destination_path)+': '+repr(err)+
+                     '.  Copying it instead.')
+      else:
+        # The file now belongs to 'destination_path'.
+        self.temporary_file.delete = False
+        self.close_temp_file()
+        return
+
     self.seek(0)
     destination_file = open(destination_path, 'wb')
     shutil.copyfileobj(self.temporary_file, destination_file)
@@ -241,18 +438,235 @@ class TempFile(object):
 
     """
 
+    self._write_buffered_data()
     self.temporary_file.seek(*args)
 
 
 
-  def decompress_temp_file_object(self, compression):
+  def tell(self):
+    """
+    <Purpose>
+      Return file's current position.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Return>
+      The current position, in bytes, in the (decompressed) file.
+
+    """
+
+    self._write_buffered_data()
+    return self.temporary_file.tell()
+
+
+
+  def truncate(self, size=None):
+    """
+    <Purpose>
+      Truncate the file to at most 'size' bytes.  If 'size' is not specified,
+      the file is truncated at its current position.  This is used to discard
+      the data of an interrupted download that cannot be resumed.
+
+    <Arguments>
+      size:
+        The size, in bytes, to truncate the file to.
+
+    <Exceptions>
+      None.
+
+    <Return>
+      None.
+
+    """
+
+    self._write_buffered_data()
+
+    # Decompressed data cannot be taken back.
+    if size is None:
+      if self.temporary_file.tell() < self._decompressed_length:
+        self._stop_decompression()
+      self.temporary_file.truncate()
+    else:
+      if size < self._decompressed_length:
+        self._stop_decompression()
+      # An in-memory file can neither grow by truncation nor keep its
+      # position, so a file that is to grow is moved to disk first.
+      if self._spooled and size > _memory_file_length(self.temporary_file):
+        self._rollover(force=True)
+      position = self.temporary_file.tell()
+      self.temporary_file.truncate(size)
+      self.temporary_file.seek(position)
+
+
+
+  def start_decompression(self, compression, required_length=None):
+    """
+    <Purpose>
+      Decompress the data of a compressed file as it is written, e.g., while
+      it is being downloaded, rather than all at once once it is complete.
+      decompress_temp_file_object() must still be called once the file is
+      complete; it then has nothing left to do.  If data is written anywhere
+      but right after the data decompressed so far (e.g., a download is
+      restarted from the first byte), decompression is simply stopped and the
+      file is decompressed all at once by decompress_temp_file_object().
+
+    <Arguments>
+      compression:
+        A string indicating the type of compression that was used to compress
+        the file.  It must be a key of 'tuf.util.COMPRESSION_EXTENSIONS'.
+
+      required_length:
+        The trusted length of the decompressed file, if known.  The signed
+        length of a compressed file only bounds the compressed data, so a
+        small file could otherwise decompress to enough data to fill the disk
+        before its hashes are checked.
+
+    <Exceptions>
+      tuf.FormatError: If the arguments are improperly formatted.
+
+      tuf.Error: If an invalid compression is given, or if the file is already
+      decompressed.
+
+      tuf.DownloadLengthMismatchError: If the data written so far decompresses
+      to more than 'required_length' bytes.
+
+    <Side Effects>
+      The data written so far is decompressed.
+
+    <Return>
+      None.
+
+    """
+
+    # Does 'compression' have the correct format?
+    # Raise 'tuf.FormatError' if there is a mismatch.
+    tuf.formats.NAME_SCHEMA.check_match(compression)
+    if required_length is not None:
+      tuf.formats.LENGTH_SCHEMA.check_match(required_length)
+
+    if self._orig_file is not None:
+      raise tuf.Error('Can only set compression on a TempFile once.')
+
+    self._stop_decompression()
+    self._compression = compression
+    self._decompressed_required_length = required_length
+    self._decompressor = _make_decompressor(compression)
+    self._decompressed_file = self._new_decompressed_file()
+
+    # Catch up with the data written so far.
+    self.flush()
+    position = self.temporary_file.tell()
+    self.temporary_file.seek(0)
+    self._decompress_rest_of_file()
+    self.temporary_file.seek(position)
+
+
+
+  def _new_decompressed_file(self):
+    """Return a file for the decompressed data, in memory if the compressed
+    data is."""
+
+    if self._spooled:
+      return cStringIO.StringIO()
+    else:
+      return self._named_temporary_file(self._prefix)
+
+
+
+  def _decompress(self, data):
+    """Decompress the next 'data' of the file, or stop decompression if the
+    data is invalid.  decompress_temp_file_object() reports the error.  Raise
+    'tuf.DownloadLengthMismatchError' as soon as the decompressed data is
+    longer than its required length."""
+
+    try:
+      if self._decompressed_required_length is None:
+        decompressed_data = self._decompressor.decompress(data)
+        self._decompressed_output_length += len(decompressed_data)
+        self._decompressed_file.write(decompressed_data)
+      else:
+        self._decompress_up_to_required_length(data)
+    except tuf.DownloadLengthMismatchError:
+      self._stop_decompression()
+      raise
+    except Exception, exception:
+      logger.debug('Stopped decompressing: '+repr(exception))
+      self._stop_decompression()
+      self._decompression_error = exception
+    else:
+      self._decompressed_length += len(data)
+
+
+
+  def _decompress_up_to_required_length(self, data):
+    """Decompress 'data', but raise 'tuf.DownloadLengthMismatchError' before
+    much more than the required length of the file is decompressed."""
+
+    required_length = self._decompressed_required_length
+
+    # A zlib decompressor returns at most 'max_length' bytes, and keeps the
+    # rest of its input in 'unconsumed_tail'.  Other decompressors are fed
+    # small pieces of 'data', and checked after each.
+    bounded = hasattr(self._decompressor, 'unconsumed_tail')
+    piece_size = _DECOMPRESSION_PIECE_SIZE
+    if bounded:
+      piece_size = max(len(data), 1)
+
+    for start in range(0, len(data), piece_size):
+      piece = data[start:start+piece_size]
+      if bounded:
+        remaining_length = required_length - self._decompressed_output_length
+        decompressed_data = \
+          self._decompressor.decompress(piece, remaining_length + 1)
+      else:
+        decompressed_data = self._decompressor.decompress(piece)
+
+      self._decompressed_output_length += len(decompressed_data)
+      if self._decompressed_output_length > required_length:
+        raise tuf.DownloadLengthMismatchError(required_length,
+                                              self._decompressed_output_length)
+      self._decompressed_file.write(decompressed_data)
+
+
+
+  def _decompress_rest_of_file(self):
+    """Decompress the data of the file from its current position on."""
+
+    while self._decompressor is not None:
+      data = self.temporary_file.read(tuf.conf.CHUNK_SIZE)
+      if not data:
+        break
+      self._decompress(data)
+
+
+
+  def _stop_decompression(self):
+    """Discard the data decompressed so far."""
+
+    if self._decompressed_file is not None:
+      self._decompressed_file.close()
+    self._decompressor = None
+    self._decompressed_file = None
+    self._decompressed_length = 0
+    self._decompressed_output_length = 0
+    self._decompression_error = None
+
+
+
+  def decompress_temp_file_object(self, compression, required_length=None):
     """
     <Purpose>
       To decompress a compressed temp file object.  Decompression is performed
       on a temp file object that is compressed, this occurs after downloading
       a compressed file.  For instance if a compressed version of some meta
       file in the repository is downloaded, the temp file containing the
-      compressed meta file will be decompressed using this function.
+      compressed meta file will be decompressed using this function.  If
+      start_decompression() was called before the file was written, the data
+      is already decompressed.
       Note that after calling this method, write() can no longer be called.
 
                             meta.txt.gz
@@ -266,15 +680,23 @@ class TempFile(object):
     <Arguments>
       compression:
         A string indicating the type of compression that was used to compress
-        a file.  Only gzip is allowed.
+        a file.  It must be a key of 'tuf.util.COMPRESSION_EXTENSIONS', i.e.,
+        'gzip', 'bzip2' or, if lzma is available, 'xz'.
+
+      required_length:
+        The trusted length of the decompressed file, if known.  It replaces
+        the one given to start_decompression(), if any.
 
     <Exceptions>
-      tuf.FormatError: If 'compression' is improperly formatted.
+      tuf.FormatError: If the arguments are improperly formatted.
 
       tuf.Error: If an invalid compression is given.
 
       tuf.DecompressionError: If the compression failed for any reason.
 
+      tuf.DownloadLengthMismatchError: If the file decompresses to more than
+      'required_length' bytes.  Decompression stops as soon as it does.
+
     <Side Effects>
       'self._orig_file' is used to store the original data of 'temporary_file'.
 
@@ -286,23 +708,58 @@ class TempFile(object):
     # Does 'compression' have the correct format?
     # Raise 'tuf.FormatError' if there is a mismatch.
     tuf.formats.NAME_SCHEMA.check_match(compression)
+    if required_length is not None:
+      tuf.formats.LENGTH_SCHEMA.check_match(required_length)
     
     if self._orig_file is not None:
       raise tuf.Error('Can only set compression on a TempFile once.')
 
-    if compression != 'gzip':
-      raise tuf.Error('Only gzip compression is supported.')
-
-    self.seek(0)
-    self._compression = compression
-    self._orig_file = self.temporary_file
+    # Decompress whatever has not been decompressed as it was written.  The
+    # decompressor checks the compression while it is created, so that an
+    # unsupported compression raises 'tuf.Error'.
+    if required_length is not None and \
+       required_length != self._decompressed_required_length:
+      self._stop_decompression()
+      self._decompressed_required_length = required_length
+    if self._decompressor is None or compression != self._compression:
+      self._stop_decompression()
+      self._decompressor = _make_decompressor(compression)
+      self._decompressed_file = self._new_decompressed_file()
+    self.flush()
+    self.temporary_file.seek(self._decompressed_length)
+    self._decompress_rest_of_file()
 
     try:
-      self.temporary_file = gzip.GzipFile(fileobj=self.temporary_file,
-                                          mode='rb')
+      if self._decompressor is None:
+        # The data is invalid; raise the error of the decompressor.
+        if self._decompression_error is not None:
+          raise self._decompression_error
+        raise tuf.Error('Invalid '+compression+' data.')
+      # Only a zlib decompressor may hold back decompressed data.
+      decompressed_data = ''
+      if hasattr(self._decompressor, 'flush'):
+        decompressed_data = self._decompressor.flush()
     except Exception, exception:
+      self._stop_decompression()
       raise tuf.DecompressionError(exception)
 
+    self._decompressed_output_length += len(decompressed_data)
+    required_length = self._decompressed_required_length
+    if required_length is not None and \
+       self._decompressed_output_length > required_length:
+      observed_length = self._decompressed_output_length
+      self._stop_decompression()
+      raise tuf.DownloadLengthMismatchError(required_length, observed_length)
+    self._decompressed_file.write(decompressed_data)
+
+    self.temporary_file.seek(0)
+    self._decompressed_file.seek(0)
+    self._compression = compression
+    self._orig_file = self.temporary_file
+    self.temporary_file = self._decompressed_file
+    self._decompressor = None
+    self._decompressed_file = None
+
 
 
 
@@ -335,6 +792,25 @@ class TempFile(object):
     # file object.
     if self._orig_file is not None:
       self._orig_file.close()
+    self._stop_decompression()
+
+
+
+
+
+def _make_decompressor(compression):
+  """Return a new incremental decompressor for 'compression', a key of
+  'COMPRESSION_EXTENSIONS'.  Raise 'tuf.Error' if it is not supported."""
+
+  if compression == 'gzip':
+    # Expect a gzip header and trailer around the deflate stream.
+    return zlib.decompressobj(16+zlib.MAX_WBITS)
+  elif compression == 'bzip2':
+    return bz2.BZ2Decompressor()
+  elif compression == 'xz' and lzma is not None:
+    return lzma.LZMADecompressor()
+  else:
+    raise tuf.Error('Unsupported compression: '+repr(compression))
 
 
 
@@ -386,6 +862,20 @@ def get_file_details(filepath):
 
 
 
+def _memory_file_length(memory_file):
+  """Return the length of the in-memory 'memory_file', without copying it."""
+
+  position = memory_file.tell()
+  memory_file.seek(0, os.SEEK_END)
+  length = memory_file.tell()
+  memory_file.seek(position)
+
+  return length
+
+
+
+
+
 def ensure_parent_dir(filename):
   """
   <Purpose>
@@ -404,7 +894,8 @@ def ensure_parent_dir(filename):
 
   <Side Effects>
     A directory is created whenever the parent directory of 'filename' does not
-    exist.
+    exist.  A directory created concurrently (e.g., by another thread storing
+    a sibling file) is not an error.
 
   <Return>
     None.
@@ -418,7 +909,57 @@ def ensure_parent_dir(filename):
   # Split 'filename' into head and tail, check if head exists.
   directory = os.path.split(filename)[0]
   if directory and not os.path.exists(directory):
-    os.makedirs(directory, 0700)
+    try:
+      os.makedirs(directory, 0700)
+    except OSError, err:
+      if err.errno != errno.EEXIST or not os.path.isdir(directory):
+        raise
+
+
+
+
+
+def link_or_copy_file(source, destination, hardlink=True):
+  """
+  <Purpose>
+    Hardlink 'source' to 'destination', or copy it if 'hardlink' is False or
+    hardlinks are not supported (e.g., 'destination' is on another
+    filesystem).  An existing 'destination' is removed first, so that a file
+    that 'destination' was hardlinked to is never written through.
+
+  <Arguments>
+    source:
+      The path of the file to link or copy.
+
+    destination:
+      The path of the new file.
+
+    hardlink:
+      Whether to try to hardlink the file.
+
+  <Exceptions>
+    IOError, OSError:
+      If 'source' could not be copied.
+
+  <Side Effects>
+    'destination' is created, or replaced.
+
+  <Returns>
+    None.
+
+  """
+
+  if os.path.exists(destination):
+    os.remove(destination)
+
+  if hardlink:
+    try:
+      os.link(source, destination)
+      return
+    except (AttributeError, OSError), e:
+      logger.debug('Could not hardlink '+repr(source)+': '+str(e))
+
+  shutil.copyfile(source, destination)
 
 
 
@@ -571,6 +1112,12 @@ def load_json_file(filepath):
   if filepath.endswith('.gz'):
     logger.debug('gzip.open('+str(filepath)+')')
     fileobject = gzip.open(filepath)
+  elif filepath.endswith('.bz2'):
+    logger.debug('bz2.BZ2File('+str(filepath)+')')
+    fileobject = bz2.BZ2File(filepath)
+  elif filepath.endswith('.xz') and lzma is not None:
+    logger.debug('lzma.LZMAFile('+str(filepath)+')')
+    fileobject = lzma.LZMAFile(filepath)
   else:
     logger.debug('open('+str(filepath)+')')
     fileobject = open(filepath)
@@ -581,3 +1128,87 @@ def load_json_file(filepath):
     fileobject.close()
 
 
+
+
+
+def make_delta(old_data, new_data):
+  """
+  <Purpose>
+    Compute the edits that turn 'old_data', the contents of a metadata file,
+    into 'new_data', the contents of its next version.  Metadata files are
+    written with one JSON value per line, so the edits are line-based, and
+    small if few values changed.  See 'tuf.formats.DELTA_SCHEMA'.
+
+  <Arguments>
+    old_data:
+      A string containing the old version of the file.
+
+    new_data:
+      A string containing the new version of the file.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    None.
+
+  <Return>
+    A list of edits, in the format of the 'edits' of
+    'tuf.formats.DELTA_SCHEMA'.
+
+  """
+
+  old_lines = old_data.splitlines(True)
+  new_lines = new_data.splitlines(True)
+  matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+
+  edits = []
+  for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+    if tag != 'equal':
+      edits.append({'start': old_start, 'end': old_end,
+                    'lines': new_lines[new_start:new_end]})
+
+  return edits
+
+
+
+def apply_delta(old_data, edits):
+  """
+  <Purpose>
+    Apply the 'edits' computed by make_delta() to 'old_data'.
+
+  <Arguments>
+    old_data:
+      A string containing the old version of a metadata file.
+
+    edits:
+      A list of edits, in the format of the 'edits' of
+      'tuf.formats.DELTA_SCHEMA'.
+
+  <Exceptions>
+    tuf.Error: If the edits do not apply to 'old_data'.
+
+  <Side Effects>
+    None.
+
+  <Return>
+    A string containing the new version of the metadata file.
+
+  """
+
+  old_lines = old_data.splitlines(True)
+  new_lines = []
+  position = 0
+  for edit in edits:
+    if not position <= edit['start'] <= edit['end'] <= len(old_lines):
+      raise tuf.Error('The edits of the delta do not apply.')
+    new_lines.extend(old_lines[position:edit['start']])
+    new_lines.extend(edit['lines'])
+    position = edit['end']
+  new_lines.extend(old_lines[position:])
+
+  new_data = ''.join(new_lines)
+  # Lines loaded from a JSON delta are unicode strings.
+  if isinstance(new_data, unicode):
+    new_data = new_data.encode('utf-8')
+  return new_data